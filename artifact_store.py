@@ -0,0 +1,87 @@
+"""
+步驟間交換大型資料的 artifact 目錄 (引擎端)。
+
+每次執行一個目錄：
+    artifacts/<時間>_<流程>_<pid>_<實例>/<名稱>
+
+步驟以 workflow_task.create_artifact / publish_artifact 寫入具名的檔案，
+之後的步驟以 open_artifact 取得唯讀的記憶體映射 (mmap)，直接共用作業系統的頁面快取，
+不必再讀檔複製與重新解析。目錄路徑經由環境變數 WORKFLOW_ARTIFACTS 傳給任務。
+
+執行結束 (不論成功或失敗) 後刪除整個目錄。程式中斷時目錄保留，
+由檢查點繼續執行時沿用，已完成步驟的 artifact 不必重新產生；
+沒有任何檢查點引用、也沒有被執行中的程式鎖住的目錄，在下一次執行開始時清除。
+"""
+import os
+import re
+import shutil
+import time
+
+from file_utils import try_lock
+
+ARTIFACTS_ENV = "WORKFLOW_ARTIFACTS"
+LOCK_FILE = ".lock"
+
+
+class ArtifactStore:
+    """
+    一個實例的 artifact 目錄；執行期間持有目錄中 .lock 的檔案鎖，清除過期目錄時不會刪到執行中的流程。
+    path 為既有的目錄 (由檢查點繼續執行) 時沿用，否則建立新目錄。
+    """
+
+    def __init__(self, root, instance, path=None):
+        if path is None or not os.path.isdir(path):
+            flow = re.sub(r"[^\w.-]", "_", instance.flow_key)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}_{flow}_{os.getpid()}_{instance.id}"
+            path = os.path.join(root, name)
+            os.makedirs(path, exist_ok=True)
+        self.path = os.path.abspath(path)
+        self.lock_file = open(os.path.join(self.path, LOCK_FILE), "a")
+        if not try_lock(self.lock_file):
+            self.lock_file.close()
+            raise OSError(f"{self.path} is in use by another run")
+
+    def names(self):
+        """目前已發佈的 artifact 名稱"""
+        return sorted(name for name in os.listdir(self.path) if not name.startswith("."))
+
+    def size(self):
+        """已發佈的 artifact 合計位元組數"""
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in self.names())
+
+    def close(self):
+        """執行結束：釋放檔案鎖並刪除目錄"""
+        self.lock_file.close()
+        remove(self.path)
+
+
+def remove(path):
+    """刪除 artifact 目錄；Windows 上仍被映射的檔案無法刪除，留待下次清除"""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def sweep(root, keep=()):
+    """刪除 root 下沒有被執行中的程式鎖住、也不在 keep 中的 artifact 目錄 (中斷且不再繼續的執行)，回傳刪除的數量"""
+    keep = {os.path.abspath(path) for path in keep if path}
+    removed = 0
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        path = os.path.abspath(entry.path)
+        if not entry.is_dir() or path in keep:
+            continue
+        lock_path = os.path.join(path, LOCK_FILE)
+        if not os.path.exists(lock_path):
+            # 另一個程式剛建立目錄、尚未取得鎖
+            continue
+        try:
+            with open(lock_path, "a") as f:
+                if not try_lock(f):
+                    continue
+        except OSError:
+            continue
+        remove(path)
+        removed += 1
+    return removed
@@ -0,0 +1,404 @@
+"""
+引擎與 UI 熱點路徑的效能測試。
+
+    python benchmarks/bench.py                          # 全部執行，結果寫到 benchmarks/results.json
+    python benchmarks/bench.py --only engine --only draw
+    python benchmarks/bench.py --save-baseline          # 以本次結果作為基準
+    python benchmarks/bench.py --threshold 0.25         # 比基準差超過 25% 視為退步 (結束代碼 1)
+
+量測項目：
+- engine：各 executor 的每步驟固定成本 (依序執行) 與每秒步驟數 (平行執行)、步驟輸出的讀取速度
+- log：log_to_view -> LogPump -> write_log 每秒可顯示的行數
+- draw：draw_workflow 與 set_node_states 在 10/100/1000/5000 個步驟時的延遲
+- zoom：縮放與平移一次的成本
+- startup：main.py 從啟動到第一個畫面完成的時間
+
+需要畫面的項目在 Linux 上若沒有 DISPLAY，會自動啟動 Xvfb；找不到 Xvfb 時略過並在結果中註明。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from config_loader import FlowConfig
+from engine import WorkflowEngine
+from flow_graph import FlowGraph
+from model import WorkflowModel
+
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+GROUPS = ["engine", "log", "draw", "zoom", "startup"]
+DRAW_SIZES = [10, 100, 1000, 5000]
+ZOOM_SIZES = [1000, 5000]
+FLOW_WIDTH = 10 # 合成流程每層的步驟數
+
+
+def synthetic_steps(count, module="noop", executor="process", width=FLOW_WIDTH, args=()):
+    """count 個步驟，每層 width 個，每個步驟相依於上一層同位置的步驟；width=1 即為依序執行"""
+    steps = []
+    for i in range(count):
+        step = {"name": f"Step {i+1}", "module": module, "executor": executor, "depends_on": [i + 1 - width] if i >= width else []}
+        if args:
+            step["args"] = list(args)
+        steps.append(step)
+    return steps
+
+
+class Results:
+    def __init__(self):
+        self.values = {}
+        self.skipped = {}
+
+    def add(self, name, value, unit, better="lower"):
+        self.values[name] = {"value": round(value, 3), "unit": unit, "better": better}
+        print(f"  {name:<44} {value:>12.3f} {unit}")
+
+    def skip(self, group, reason):
+        self.skipped[group] = reason
+        print(f"  {group}: skipped ({reason})")
+
+    def to_json(self):
+        return {
+            "meta": {
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "results": self.values,
+            "skipped": self.skipped,
+        }
+
+
+# --- 引擎 ---
+
+def _bench_model(work_dir):
+    model = WorkflowModel()
+    model.python_path = sys.executable
+    model.log_dir = os.path.join(work_dir, "logs")
+    model.cache_dir = os.path.join(work_dir, "cache")
+    return model
+
+
+def _run_flow(model, engine, steps, log_dir):
+    """以合成步驟執行一次流程，回傳 (秒數, 摘要)"""
+    model.use_flow(FlowConfig("bench", {"description": "", "steps": steps}))
+    model.log_dir = log_dir
+    instance = model.create_instance({})
+    started = time.perf_counter()
+    summary = engine.run(instance)
+    elapsed = time.perf_counter() - started
+    if summary["status"] != "success":
+        raise RuntimeError(f"Benchmark flow failed: {summary['status']}")
+    return elapsed, summary
+
+
+def bench_engine(results, work_dir):
+    executors = ["process", "worker", "async"]
+    if os.name != "nt":
+        executors.insert(2, "fork")
+    sequential_steps, parallel_steps = 30, 200
+
+    model = _bench_model(work_dir)
+    model.max_parallel_steps = 8
+    model.max_concurrent_flows = 1
+    model.worker_pool_size = 8
+    lines = [0]
+
+    def count_lines(instance, message):
+        lines[0] += message.count("\n")
+
+    engine = WorkflowEngine(model, log=count_lines)
+    cwd = os.getcwd()
+    # 引擎以 tasks/<module>.py 尋找腳本
+    os.chdir(BENCH_DIR)
+    try:
+        for executor in executors:
+            # 先跑一次讓 worker 池 / fork server 就緒，量測的是穩定狀態
+            _run_flow(model, engine, synthetic_steps(model.max_parallel_steps, executor=executor), os.path.join(work_dir, "warmup"))
+            elapsed, _ = _run_flow(model, engine, synthetic_steps(sequential_steps, executor=executor, width=1), os.path.join(work_dir, "logs"))
+            results.add(f"engine.{executor}.step_overhead", elapsed / sequential_steps * 1000, "ms")
+            elapsed, _ = _run_flow(model, engine, synthetic_steps(parallel_steps, executor=executor), os.path.join(work_dir, "logs"))
+            results.add(f"engine.{executor}.steps_per_sec", parallel_steps / elapsed, "steps/s", better="higher")
+
+        line_count = 200000
+        lines[0] = 0
+        elapsed, _ = _run_flow(model, engine, synthetic_steps(1, module="chatty", args=[str(line_count)]), os.path.join(work_dir, "logs"))
+        results.add("engine.output_lines_per_sec", lines[0] / elapsed, "lines/s", better="higher")
+    finally:
+        os.chdir(cwd)
+        engine.shutdown()
+
+
+# --- 需要畫面的項目 ---
+
+class VirtualDisplay:
+    """Linux 上沒有 DISPLAY 時啟動 Xvfb；其他情況不做任何事"""
+
+    def __init__(self):
+        self.process = None
+        self.available = True
+        self.reason = ""
+
+    def __enter__(self):
+        if not sys.platform.startswith("linux") or os.environ.get("DISPLAY"):
+            return self
+        xvfb = shutil.which("Xvfb")
+        if not xvfb:
+            self.available = False
+            self.reason = "no DISPLAY and Xvfb is not installed"
+            return self
+        read_fd, write_fd = os.pipe()
+        # -displayfd：由 Xvfb 自行挑選空閒的編號，就緒後寫回該編號
+        self.process = subprocess.Popen([xvfb, "-displayfd", str(write_fd), "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                                        pass_fds=[write_fd], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            display = f.readline().strip()
+        if not display:
+            self.available = False
+            self.reason = f"Xvfb failed to start (exit code {self.process.wait()})"
+            return self
+        os.environ["DISPLAY"] = f":{display}"
+        return self
+
+    def __exit__(self, *exc):
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+            os.environ.pop("DISPLAY", None)
+
+
+class Gui:
+    """實際的 Tk 視窗 + MVP，與 main.py 組裝方式相同"""
+
+    def __init__(self, work_dir):
+        import tkinter as tk
+        from presenter import WorkflowPresenter
+        from view import WorkflowView
+
+        self.root = tk.Tk()
+        self.root.geometry("1100x750")
+        self.presenter = WorkflowPresenter(self.root)
+        self.model = _bench_model(work_dir)
+        cwd = os.getcwd()
+        # view 以相對路徑載入 configs/icon.png
+        os.chdir(ROOT_DIR)
+        try:
+            self.view = WorkflowView(self.root, self.presenter)
+        finally:
+            os.chdir(cwd)
+        self.presenter.init_app(self.model, self.view)
+        self.view.stop_welcome_animation()
+        self.root.update()
+
+    def flush(self):
+        """處理完所有待辦的重繪與 after_idle (例如可視範圍同步)"""
+        self.root.update_idletasks()
+
+    def draw(self, count):
+        graph = FlowGraph(synthetic_steps(count))
+        self.view.reset_view_state()
+        self.view.draw_workflow(graph, graph.initial_states(0))
+        self.flush()
+        return graph
+
+    def close(self):
+        self.presenter.engine.shutdown()
+        self.root.destroy()
+
+
+def _median_ms(action, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def bench_log(results, gui):
+    line_count = 200000
+    buffer = gui.model.log_buffer
+    target = buffer.end_seq + line_count
+    line = "[12:00:00] [1] " + "x" * 60 + "\n"
+
+    def produce():
+        for _ in range(line_count):
+            gui.presenter.log_to_view(None, line)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    started = time.perf_counter()
+    producer.start()
+    # 與 mainloop 相同：由 Tk 事件迴圈執行 LogPump 的週期性批次寫入
+    while buffer.end_seq < target:
+        gui.root.update()
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    producer.join()
+    results.add("log.lines_per_sec", line_count / elapsed, "lines/s", better="higher")
+
+
+def bench_draw(results, gui, repeat):
+    for count in DRAW_SIZES:
+        graph = FlowGraph(synthetic_steps(count))
+        results.add(f"draw.draw_workflow.{count}", _median_ms(lambda: gui.draw(count), repeat), "ms")
+
+        finished = ["finished"] * count
+        pending = graph.initial_states(0)
+        flip = [False]
+
+        def update_states():
+            flip[0] = not flip[0]
+            gui.view.set_node_states(finished if flip[0] else pending)
+            gui.flush()
+
+        results.add(f"draw.set_node_states.{count}", _median_ms(update_states, repeat), "ms")
+
+
+def bench_zoom(results, gui, repeat):
+    canvas = gui.view.canvas
+    for count in ZOOM_SIZES:
+        gui.draw(count)
+        x, y = canvas.winfo_width() // 2, canvas.winfo_height() // 2
+        direction = [1]
+
+        def zoom():
+            # 交替放大與縮小，倍率維持在同一範圍
+            direction[0] = -direction[0]
+            gui.view._on_zoom(types.SimpleNamespace(num=0, delta=120 * direction[0], x=x, y=y))
+            gui.flush()
+
+        results.add(f"zoom.zoom.{count}", _median_ms(zoom, repeat), "ms")
+
+        gui.view._start_pan(types.SimpleNamespace(x=x, y=y))
+        offset = [0]
+
+        def pan():
+            offset[0] = 200 - offset[0]
+            gui.view._do_pan(types.SimpleNamespace(x=x + offset[0], y=y + offset[0]))
+            gui.flush()
+
+        results.add(f"zoom.pan.{count}", _median_ms(pan, repeat), "ms")
+
+
+STARTUP_SCRIPT = """
+import sys, time, tkinter
+started = float(sys.argv[1])
+def first_frame(self, n=0):
+    # 取代 mainloop：畫面第一次完成繪製後回報時間並結束
+    self.update()
+    print(time.time() - started)
+tkinter.Misc.mainloop = first_frame
+import runpy
+runpy.run_path("main.py", run_name="__main__")
+"""
+
+
+def bench_startup(results, repeat):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, repr(time.time())], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]) * 1000)
+    results.add("startup.main_first_frame", statistics.median(samples), "ms")
+
+
+# --- 與基準比較 ---
+
+def compare(results, baseline, threshold):
+    """列出與基準的差異，回傳退步的項目名稱"""
+    regressions = []
+    print(f"\nCompared with baseline ({baseline['meta'].get('created', '?')}), threshold {threshold:.0%}:")
+    for name, current in results.values.items():
+        base = baseline["results"].get(name)
+        if not base or not base["value"]:
+            continue
+        change = (current["value"] - base["value"]) / base["value"]
+        # 越低越好的項目變大、越高越好的項目變小才算退步
+        worse = change if current["better"] == "lower" else -change
+        flag = "REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"  {name:<44} {base['value']:>12.3f} -> {current['value']:>12.3f} {current['unit']:<8} {change:+7.1%} {flag}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python benchmarks/bench.py", description="Benchmark the engine and UI hot paths.")
+    parser.add_argument("--only", metavar="GROUP", action="append", choices=GROUPS, help=f"run only these groups ({', '.join(GROUPS)}; repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per latency measurement (median is reported)")
+    parser.add_argument("--output", metavar="PATH", default=DEFAULT_RESULTS, help="where to write the JSON results")
+    parser.add_argument("--baseline", metavar="PATH", default=DEFAULT_BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression (default 0.2)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    groups = args.only or GROUPS
+    results = Results()
+
+    with tempfile.TemporaryDirectory(prefix="workflow-bench-") as work_dir:
+        if "engine" in groups:
+            print("engine")
+            bench_engine(results, work_dir)
+
+        gui_groups = [group for group in ("log", "draw", "zoom", "startup") if group in groups]
+        if gui_groups:
+            with VirtualDisplay() as display:
+                if not display.available:
+                    for group in gui_groups:
+                        results.skip(group, display.reason)
+                else:
+                    if {"log", "draw", "zoom"} & set(gui_groups):
+                        gui = Gui(work_dir)
+                        try:
+                            for group in ("log", "draw", "zoom"):
+                                if group in gui_groups:
+                                    print(group)
+                                    if group == "log":
+                                        bench_log(results, gui)
+                                    elif group == "draw":
+                                        bench_draw(results, gui, args.repeat)
+                                    else:
+                                        bench_zoom(results, gui, args.repeat)
+                        finally:
+                            gui.close()
+                    if "startup" in gui_groups:
+                        print("startup")
+                        bench_startup(results, args.repeat)
+
+    data = results.to_json()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
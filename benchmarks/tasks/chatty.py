@@ -0,0 +1,6 @@
+# 效能測試用：輸出大量日誌行的步驟，行數由第一個參數指定
+import sys
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+for i in range(count):
+    print(f"line {i:07d} " + "x" * 60)
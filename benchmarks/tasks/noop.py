@@ -0,0 +1 @@
+# 效能測試用：什麼都不做的步驟 (量測每個步驟的固定成本)
@@ -0,0 +1,425 @@
+"""
+設定檔 (configs/ 下的流程設定與 global_config.json) 的統一讀取入口。
+
+流程設定有兩種存放方式：
+- 分片：configs/flows/index.json 記錄各流程的 key、標題、描述與步驟數，
+  每個流程的內容存在 configs/flows/<key>.json，選取流程時才讀取
+- 單一檔案 (舊格式)：configs/config.json 存放所有流程；只有執行 python -m config_loader migrate 時才轉換為分片
+  (共用設定目錄時，仍在使用舊版程式的同事只讀得到 config.json)
+
+- 解析結果以 (路徑, 修改時間, 大小) 快取，檔案沒有變動時只需一次 stat，不重新讀取與解析
+  (設定放在網路磁碟時，讀檔比 stat 慢得多)
+- 流程另外快取驗證過的 FlowConfig (含相依圖)，同一份設定不會重複驗證
+- 寫入一律先寫暫存檔再改名
+
+GUI、命令列與設定視窗共用同一個 ConfigLoader (get_loader())。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+from file_utils import try_lock, write_json_atomic
+from flow_graph import FlowGraph
+
+CONFIG_FILE = "config.json"
+GLOBAL_CONFIG_FILE = "global_config.json"
+TIMEOUT_POLICIES = ("abort", "continue")
+STEP_DEFAULT_KEYS = ("timeout", "idle_timeout", "on_timeout") # 可在流程層級設定預設值的步驟欄位
+MAP_ITEM_SOURCES = ("items", "items_file", "items_artifact") # map 步驟的輸入清單來源 (擇一)
+PLACEMENTS = ("local", "remote", "any") # 步驟執行位置的簡寫 (另可用物件指定 agent / tags)
+FLOWS_DIR = "flows"
+# Windows 保留的裝置名稱 (不論副檔名)，不能當作檔名
+RESERVED_NAMES = {"CON", "PRN", "AUX", "NUL", *(f"COM{n}" for n in range(1, 10)), *(f"LPT{n}" for n in range(1, 10))}
+FLOW_INDEX_FILE = os.path.join(FLOWS_DIR, "index.json")
+STORE_LOCK_FILE = "flows.lock" # 更新流程設定期間持有的檔案鎖 (跨程式、跨共用同一設定目錄的電腦)
+STORE_LOCK_TIMEOUT_S = 10
+
+
+def config_dir():
+    """設定檔目錄：打包後為執行檔同級的 configs，開發時為程式所在目錄的 configs"""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(os.path.dirname(sys.executable), 'configs')
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configs')
+
+
+def flow_file(key):
+    """
+    流程內容的檔名 (相對於設定目錄)；key 中檔名不允許的字元以 %XX 表示，
+    開頭的 "."、結尾的 "." 與空白，以及 Windows 保留名稱 (CON、NUL 等) 的第一個字元也以 %XX 表示。
+    """
+    name = quote(key, safe=" ")
+    if name.startswith(".") or name.split(".")[0].rstrip(" ").upper() in RESERVED_NAMES:
+        name = f"%{ord(name[0]):02X}" + name[1:]
+    if name.endswith((".", " ")):
+        name = name[:-1] + f"%{ord(name[-1]):02X}"
+    return os.path.join(FLOWS_DIR, name + ".json")
+
+
+def file_collisions(keys):
+    """
+    在不分大小寫的檔案系統 (Windows、macOS 預設) 上會對應到同一個檔案的 key，
+    回傳 [[key, ...], ...]；例如 "Daily" 與 "daily"。
+    """
+    groups = {}
+    for key in keys:
+        groups.setdefault(flow_file(key).casefold(), []).append(key)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _check_collisions(keys):
+    collisions = file_collisions(keys)
+    if collisions:
+        listed = "; ".join(" / ".join(f"'{key}'" for key in group) for group in collisions)
+        raise ValueError(f"Flow keys that differ only in case would share a file on Windows: {listed}. Rename one of them.")
+
+
+def flow_summary(data):
+    """索引中一個流程的摘要"""
+    steps = data.get("steps") if isinstance(data, dict) else None
+    return {"title": data.get("title", "") if isinstance(data, dict) else "",
+            "description": data.get("description", "") if isinstance(data, dict) else "",
+            "steps": len(steps) if isinstance(steps, list) else 0}
+
+
+def _check_limits(data, where):
+    """檢查 timeout / idle_timeout (正數秒) 與 on_timeout 的設定"""
+    for name in ("timeout", "idle_timeout"):
+        value = data.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"{where}: \"{name}\" must be a positive number of seconds")
+    policy = data.get("on_timeout")
+    if policy is not None and policy not in TIMEOUT_POLICIES:
+        raise ValueError(f"{where}: \"on_timeout\" must be one of {', '.join(TIMEOUT_POLICIES)}")
+
+
+def _check_map(step, where):
+    """檢查 map 步驟 (每個輸入項目執行一次腳本) 的設定"""
+    spec = step["map"]
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: \"map\" must be an object")
+    sources = [name for name in MAP_ITEM_SOURCES if name in spec]
+    if len(sources) != 1:
+        raise ValueError(f"{where}: \"map\" needs exactly one of {', '.join(MAP_ITEM_SOURCES)}")
+    if "items" in spec and not isinstance(spec["items"], list):
+        raise ValueError(f"{where}: \"map.items\" must be a list")
+    for name in ("items_file", "items_artifact"):
+        if name in spec and not (isinstance(spec[name], str) and spec[name]):
+            raise ValueError(f"{where}: \"map.{name}\" must be a non-empty string")
+    for name, minimum in (("parallel", 1), ("retries", 0), ("max_failures", 0)):
+        value = spec.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < minimum):
+            raise ValueError(f"{where}: \"map.{name}\" must be an integer >= {minimum}")
+    delay = spec.get("retry_delay")
+    if delay is not None and (isinstance(delay, bool) or not isinstance(delay, (int, float)) or delay < 0):
+        raise ValueError(f"{where}: \"map.retry_delay\" must be a number of seconds >= 0")
+    if step.get("executor") == "async":
+        raise ValueError(f"{where}: map steps run on the process, worker or fork executor, not async")
+    if step.get("cache"):
+        raise ValueError(f"{where}: map steps cannot use \"cache\"")
+
+
+def _check_placement(step, where):
+    """檢查步驟的執行位置 (本機或遠端 worker agent)"""
+    placement = step["placement"]
+    if isinstance(placement, str):
+        if placement not in PLACEMENTS:
+            raise ValueError(f"{where}: \"placement\" must be one of {', '.join(PLACEMENTS)} or an object")
+    elif isinstance(placement, dict):
+        unknown = set(placement) - {"agent", "tags", "local"}
+        if unknown:
+            raise ValueError(f"{where}: unknown \"placement\" key(s): {', '.join(sorted(unknown))}")
+        agent = placement.get("agent")
+        if agent is not None and not (isinstance(agent, str) and agent
+                                      or isinstance(agent, list) and agent and all(isinstance(name, str) for name in agent)):
+            raise ValueError(f"{where}: \"placement.agent\" must be an agent name or a list of names")
+        tags = placement.get("tags")
+        if tags is not None and not (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)):
+            raise ValueError(f"{where}: \"placement.tags\" must be a list of strings")
+        if not isinstance(placement.get("local", False), bool):
+            raise ValueError(f"{where}: \"placement.local\" must be true or false")
+    else:
+        raise ValueError(f"{where}: \"placement\" must be one of {', '.join(PLACEMENTS)} or an object")
+    if placement != "local" and step.get("executor") == "async":
+        raise ValueError(f"{where}: steps on remote agents cannot use the async executor")
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FlowConfig:
+    """驗證過的流程設定 (唯讀)：原始內容、步驟與相依圖；設定有誤時建構子拋出 ValueError"""
+
+    def __init__(self, key, data):
+        if not isinstance(data, dict) or not isinstance(data.get("steps"), list):
+            raise ValueError("the flow has no \"steps\" list")
+        for n, step in enumerate(data["steps"], 1):
+            if not isinstance(step, dict):
+                raise ValueError(f"Step {n} is not an object")
+            _check_limits(step, f"Step {n}")
+            if "map" in step:
+                _check_map(step, f"Step {n}")
+            if "placement" in step:
+                _check_placement(step, f"Step {n}")
+        _check_limits(data, "Flow")
+        self.key = key
+        self.data = data
+        self.description = data.get("description", "")
+        self.steps = data["steps"]
+        self.graph = FlowGraph(self.steps)
+
+
+def diff_flows(old, new):
+    """比較兩份流程索引，回傳 (新增的 key, 刪除的 key, 摘要有變動的 key)"""
+    added = [key for key in new if key not in old]
+    removed = [key for key in old if key not in new]
+    changed = [key for key, summary in new.items() if key in old and old[key] != summary]
+    return added, removed, changed
+
+
+def diff_steps(old_steps, new_steps):
+    """兩份步驟清單中內容不同、新增或刪除的步驟索引"""
+    count = max(len(old_steps), len(new_steps))
+    return {i for i in range(count) if i >= len(old_steps) or i >= len(new_steps) or old_steps[i] != new_steps[i]}
+
+
+class ConfigLoader:
+    def __init__(self, directory=None):
+        self.directory = directory or config_dir()
+        self.lock = threading.Lock()
+        self.files = {} # 路徑 -> (簽章, 解析結果)
+        self.flows = {} # 流程 key -> FlowConfig
+        self.legacy_index = (None, None) # (config.json 的解析結果, 由它產生的索引)
+        self.write_lock = threading.Lock() # 同一時間只有一個執行緒更新流程設定 (跨程式另以 flows.lock 鎖定)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self, name, default=None):
+        """
+        讀取設定檔並回傳解析結果；檔案不存在時回傳 default。
+
+        回傳的物件與快取共用，呼叫端不可修改 (需要編輯時先 copy.deepcopy)。
+        """
+        path = self.path(name)
+        try:
+            signature = _signature(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.files.pop(path, None)
+            return default
+        with self.lock:
+            cached = self.files.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self.lock:
+            self.files[path] = (signature, data)
+        return data
+
+    def save(self, name, data):
+        """寫入設定檔 (暫存檔 + 改名)；下次 load 時重新解析"""
+        path = self.path(name)
+        os.makedirs(self.directory, exist_ok=True)
+        write_json_atomic(path, data)
+        with self.lock:
+            self.files.pop(path, None)
+
+    def remove(self, name):
+        """刪除設定檔 (不存在時忽略)"""
+        path = self.path(name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.files.pop(path, None)
+
+    @contextmanager
+    def store_lock(self):
+        """
+        更新流程設定 (索引或 config.json) 期間持有：本程式內以 write_lock，其他程式以 flows.lock 的檔案鎖。
+        鎖內重新讀取索引再寫回，同時儲存的其他人的變更不會遺失；等不到鎖時拋出 OSError。
+        """
+        with self.write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(STORE_LOCK_FILE), "a") as f:
+                deadline = time.monotonic() + STORE_LOCK_TIMEOUT_S
+                while not try_lock(f):
+                    if time.monotonic() > deadline:
+                        raise OSError(f"{self.path(STORE_LOCK_FILE)} is held by another program, try saving again")
+                    time.sleep(0.1)
+                # 另一個程式剛寫入的檔案可能與快取的簽章相同 (修改時間精度不足)，一律重新讀取
+                with self.lock:
+                    self.files.pop(self.path(FLOW_INDEX_FILE), None)
+                    self.files.pop(self.path(CONFIG_FILE), None)
+                yield
+
+    def is_sharded(self):
+        return os.path.exists(self.path(FLOW_INDEX_FILE))
+
+    def flow_index(self):
+        """
+        流程索引 {key: {"title", "description", "steps"}} (依顯示順序)；只讀取索引，不讀取流程內容。
+        舊格式時由 config.json 產生。回傳的物件與快取共用，不可修改。
+        """
+        index = self.load(FLOW_INDEX_FILE)
+        if index is not None:
+            return index
+        flows = self.load(CONFIG_FILE, {})
+        with self.lock:
+            source, index = self.legacy_index
+            if source is flows:
+                return index
+        index = {key: flow_summary(data) for key, data in flows.items()}
+        with self.lock:
+            self.legacy_index = (flows, index)
+        return index
+
+    def flow_data(self, key):
+        """key 流程的原始內容 (第一次使用時才讀檔)，不存在時回傳 None；回傳的物件不可修改"""
+        if key not in self.flow_index():
+            return None
+        if self.is_sharded():
+            return self.load(flow_file(key))
+        return self.load(CONFIG_FILE, {}).get(key)
+
+    def flow(self, key):
+        """
+        key 流程的 FlowConfig，不存在時回傳 None。
+
+        檔案沒有變動時 flow_data 回傳同一個物件，因此以流程內容的物件身分判斷是否需要重新驗證。
+        """
+        data = self.flow_data(key)
+        if data is None:
+            return None
+        with self.lock:
+            cached = self.flows.get(key)
+            if cached is not None and cached.data is data:
+                return cached
+        flow = FlowConfig(key, data)
+        with self.lock:
+            self.flows[key] = flow
+        return flow
+
+    def save_flows(self, flows, deleted=(), order=None):
+        """
+        儲存有變動的流程：flows 為 {key: 內容}，每個流程各自寫入自己的檔案，其餘流程的檔案不動；
+        deleted 中的流程刪除；order 為索引中 key 的順序 (省略時保持原順序，新流程排在最後)。
+
+        流程檔先寫，索引最後寫，中途當機時最多只有索引中的摘要過時。
+        仍為單一 config.json 時整份改寫 config.json (不自動轉換為分片)。
+        """
+        with self.store_lock():
+            if not self.is_sharded():
+                self._save_single_file(flows, deleted, order)
+                return
+            index = dict(self.flow_index())
+            _check_collisions(list(index) + [key for key in flows if key not in index])
+            for key, data in flows.items():
+                self.save(flow_file(key), data)
+                index[key] = flow_summary(data)
+            for key in deleted:
+                if key not in flows:
+                    index.pop(key, None)
+                    self.remove(flow_file(key))
+            if order is not None:
+                index = {**{key: index[key] for key in order if key in index}, **index}
+            self.save(FLOW_INDEX_FILE, index)
+
+    def _save_single_file(self, flows, deleted, order):
+        # 呼叫端持有 store_lock；鎖內重新讀取，同時儲存的其他人修改的流程不會被覆蓋
+        data = dict(self.load(CONFIG_FILE, {}))
+        data.update(flows)
+        for key in deleted:
+            if key not in flows:
+                data.pop(key, None)
+        if order is not None:
+            data = {**{key: data[key] for key in order if key in data}, **data}
+        self.save(CONFIG_FILE, data)
+
+    def migrate(self):
+        """
+        將單一 config.json 轉換為分片 (已是分片時不做任何事)，回傳轉換的流程數。
+        原檔改名為 config.json.bak 保留。有 key 只差大小寫時不轉換，拋出 ValueError。
+        """
+        with self.store_lock():
+            return self._migrate()
+
+    def _migrate(self):
+        # 呼叫端持有 store_lock
+        if self.is_sharded():
+            return 0
+        flows = self.load(CONFIG_FILE, {})
+        _check_collisions(flows)
+        os.makedirs(self.path(FLOWS_DIR), exist_ok=True)
+        for key, data in flows.items():
+            self.save(flow_file(key), data)
+        # 索引寫入後才視為分片；在此之前當機仍繼續使用 config.json
+        self.save(FLOW_INDEX_FILE, {key: flow_summary(data) for key, data in flows.items()})
+        if os.path.exists(self.path(CONFIG_FILE)):
+            os.replace(self.path(CONFIG_FILE), self.path(CONFIG_FILE + ".bak"))
+            with self.lock:
+                self.files.pop(self.path(CONFIG_FILE), None)
+        return len(flows)
+
+    def rebuild_index(self):
+        """依 flows/ 下的流程檔重新產生索引 (直接編輯流程檔後使用)，回傳流程數"""
+        with self.store_lock():
+            index = self.flow_index() if self.is_sharded() else {}
+            names = sorted(name for name in os.listdir(self.path(FLOWS_DIR))
+                           if name.endswith(".json") and name != os.path.basename(FLOW_INDEX_FILE))
+            keys = [unquote(name[:-len(".json")]) for name in names]
+            # 保持原有順序，新找到的流程排在最後
+            ordered = [key for key in index if key in keys] + [key for key in keys if key not in index]
+            self.save(FLOW_INDEX_FILE, {key: flow_summary(self.load(flow_file(key), {})) for key in ordered})
+        return len(ordered)
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_loader():
+    """整個程式共用的 ConfigLoader"""
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            _loader = ConfigLoader()
+        return _loader
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m config_loader", description="Maintain the flow configuration storage.")
+    parser.add_argument("command", choices=["migrate", "reindex"],
+                        help="migrate: split configs/config.json into one file per flow; "
+                             "reindex: rebuild configs/flows/index.json from the flow files")
+    args = parser.parse_args(argv)
+    loader = get_loader()
+    if args.command == "migrate":
+        if loader.is_sharded():
+            print(f"Already using {FLOW_INDEX_FILE}")
+            return 0
+        try:
+            count = loader.migrate()
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+        print(f"Migrated {count} flow(s) to {loader.path(FLOWS_DIR)}")
+    else:
+        if not os.path.isdir(loader.path(FLOWS_DIR)):
+            print(f"error: {loader.path(FLOWS_DIR)} does not exist (run migrate first)", file=sys.stderr)
+            return 1
+        print(f"Indexed {loader.rebuild_index()} flow(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
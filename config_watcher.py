@@ -0,0 +1,118 @@
+"""
+監看 configs/ 目錄，設定檔被其他工具或同事修改時通知呼叫端。
+
+每隔 poll_s 秒比對一次目錄內所有 .json 的 (修改時間, 大小)，成本只有幾次 stat。
+Linux 上另外使用 inotify，本機的修改會立即喚醒比對，不必等到下一輪；
+網路磁碟上其他電腦的修改不會產生 inotify 事件，仍由定期比對發現。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+
+# inotify 事件 (見 <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+DEBOUNCE_S = 0.2 # 一次存檔可能觸發多個事件，等待這段時間後才比對
+
+
+def snapshot(directory):
+    """目錄 (含子目錄) 內所有 .json 的 {相對路徑: (修改時間, 大小)}"""
+    result = {}
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                result[os.path.relpath(path, directory)] = (st.st_mtime_ns, st.st_size)
+    return result
+
+
+class _Inotify:
+    """以 ctypes 呼叫 libc 的 inotify (不需要額外套件)；無法使用時建構子拋出 OSError"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        for root, dirs, files in os.walk(directory):
+            if libc.inotify_add_watch(self.fd, os.fsencode(root), mask) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {root}")
+
+    def wait(self, timeout):
+        """等待事件或逾時，回傳是否有事件"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """
+    在背景執行緒監看設定目錄；有檔案新增、修改或刪除時呼叫 on_change(變動的相對路徑集合)。
+    on_change 在監看執行緒上呼叫，GUI 需自行交給主執行緒處理。
+    """
+
+    def __init__(self, directory, on_change, poll_s=2.0):
+        self.directory = directory
+        self.on_change = on_change
+        self.poll_s = max(0.1, float(poll_s))
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last = snapshot(directory) if os.path.isdir(directory) else {}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        inotify = None
+        if sys.platform.startswith("linux") and os.path.isdir(self.directory):
+            try:
+                inotify = _Inotify(self.directory)
+            except (OSError, AttributeError):
+                # 沒有 inotify (或 watch 數量已達上限)：只靠定期比對
+                inotify = None
+        try:
+            while not self.stop_event.is_set():
+                if inotify:
+                    if inotify.wait(self.poll_s):
+                        self.stop_event.wait(DEBOUNCE_S)
+                else:
+                    self.stop_event.wait(self.poll_s)
+                self.check()
+        finally:
+            if inotify:
+                inotify.close()
+
+    def check(self):
+        """比對目前與上次的快照，有變動時呼叫 on_change"""
+        current = snapshot(self.directory) if os.path.isdir(self.directory) else {}
+        changed = {name for name in current.keys() | self.last.keys() if current.get(name) != self.last.get(name)}
+        self.last = current
+        if changed:
+            self.on_change(changed)
@@ -0,0 +1,1002 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from artifact_store import ARTIFACTS_ENV, ArtifactStore, sweep as sweep_artifacts
+from task_launcher import TaskLauncher
+from remote_agents import AgentPool, RemoteTask
+from worker_agent import load_secret
+from log_archive import RunLogWriter
+from run_journal import RunJournal, discard as discard_journal, incomplete_runs
+from step_cache import StepCache
+from task_events import EventServer, StepEvents
+from step_profile import PROFILE_FILE, top_functions, format_rows
+
+PROFILE_TOP = 10 # 步驟結束後在日誌中列出的函式數
+EVENTS_FILE = "events.jsonl" # 步驟事件紀錄 (存在該步驟的日誌封存目錄)
+MAP_ERROR_ITEMS = 5 # map 步驟失敗時錯誤訊息最多列出幾個項目
+WATCHDOG_INTERVAL_S = 0.5 # 逾時檢查的間隔
+APP_DIR = os.path.dirname(os.path.abspath(__file__)) # 任務可 import 這裡的 workflow_task
+
+
+def _noop(*args):
+    pass
+
+
+class Slots:
+    """可調整上限的計數號誌 (所有實例共用的併發上限)"""
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self.in_use = 0
+        self.cond = threading.Condition()
+
+    def set_limit(self, limit):
+        with self.cond:
+            self.limit = max(1, int(limit))
+            self.cond.notify_all()
+
+    def acquire(self, cancelled=None):
+        """等待空位；等待期間 cancelled() 為真時放棄並回傳 False"""
+        with self.cond:
+            while self.in_use >= self.limit:
+                if cancelled and cancelled():
+                    return False
+                self.cond.wait(0.2)
+            self.in_use += 1
+            return True
+
+    def try_acquire(self):
+        """不等待；有空位時佔用並回傳 True"""
+        with self.cond:
+            if self.in_use >= self.limit:
+                return False
+            self.in_use += 1
+            return True
+
+    def release(self):
+        with self.cond:
+            self.in_use -= 1
+            self.cond.notify()
+
+
+class StepTimeout(RuntimeError):
+    """步驟超過 timeout / idle_timeout 而被強制結束；policy 為 on_timeout 設定 (abort / continue)"""
+
+    def __init__(self, message, policy):
+        super().__init__(message)
+        self.policy = policy
+
+
+class StepStopped(RuntimeError):
+    """步驟 (map) 因實例被中止或其他步驟失敗而沒有跑完所有項目；不算失敗，繼續執行時重新執行"""
+
+
+class _Watch:
+    """一個受監看的步驟：開始時間、最後一次輸出的時間，以及逾時原因 (未逾時為 None)"""
+
+    def __init__(self, task, timeout, idle_timeout):
+        self.task = task
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.started = self.last_output = time.monotonic()
+        self.reason = None
+
+    def touch(self):
+        self.last_output = time.monotonic()
+
+    def expired(self, now):
+        if self.timeout and now - self.started >= self.timeout:
+            return f"timed out after {self.timeout:g}s"
+        if self.idle_timeout and now - self.last_output >= self.idle_timeout:
+            return f"produced no output for {self.idle_timeout:g}s"
+        return None
+
+
+class Watchdog:
+    """
+    監看執行中步驟的 timeout (總執行時間) 與 idle_timeout (連續沒有輸出的時間)。
+
+    所有實例共用一個背景執行緒；超過上限時記下原因並強制結束該步驟的整個進程樹，
+    讀取輸出的迴圈因此結束，由引擎依 on_timeout 決定中止或繼續。
+    """
+
+    def __init__(self, log=None):
+        self.log = log or _noop
+        self.watches = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, task, timeout, idle_timeout):
+        """開始監看；沒有設定上限時回傳 None"""
+        if not timeout and not idle_timeout:
+            return None
+        entry = _Watch(task, timeout, idle_timeout)
+        with self.lock:
+            self.watches.add(entry)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return entry
+
+    def unwatch(self, entry):
+        if entry is not None:
+            with self.lock:
+                self.watches.discard(entry)
+
+    def _run(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL_S)
+            now = time.monotonic()
+            with self.lock:
+                expired = [(entry, entry.expired(now)) for entry in self.watches]
+                expired = [(entry, reason) for entry, reason in expired if reason]
+                for entry, reason in expired:
+                    entry.reason = reason
+                    self.watches.discard(entry)
+            for entry, reason in expired:
+                try:
+                    entry.task.kill_tree()
+                except Exception as e:
+                    self.log(None, f"[{time.strftime('%H:%M:%S')}] [WARN] Could not kill a timed-out step: {e}\n")
+
+
+def task_environment(instance):
+    """
+    傳給任務的環境變數：WORKFLOW_INSTANCE、WORKFLOW_PARAMS (JSON)、每個參數的 WORKFLOW_PARAM_<KEY>、
+    artifact 目錄 WORKFLOW_ARTIFACTS，以及讓腳本能 import workflow_task 的 PYTHONPATH
+    """
+    env = {
+        "WORKFLOW_INSTANCE": str(instance.id),
+        "WORKFLOW_PARAMS": json.dumps(instance.params, ensure_ascii=False),
+        "PYTHONPATH": os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])),
+    }
+    if instance.artifacts:
+        env[ARTIFACTS_ENV] = instance.artifacts.path
+    for key, value in instance.params.items():
+        env["WORKFLOW_PARAM_" + re.sub(r"\W", "_", str(key)).upper()] = str(value)
+    return env
+
+
+def task_arguments(step, params):
+    """步驟的 "args" 範本 (例如 ["--site", "{site}"]) 代入實例參數"""
+    args = []
+    for template in step.get("args", []):
+        try:
+            args.append(str(template).format(**params))
+        except (KeyError, IndexError) as e:
+            raise ValueError(f"Step argument '{template}' uses unknown parameter {e}") from None
+    return args
+
+
+def map_items(spec, params, artifacts=None):
+    """
+    map 步驟的輸入項目：inline 的 "items"、"items_file" (路徑可代入實例參數)
+    或上游步驟發佈的 "items_artifact"；檔案內容為 JSON 清單，或每行一個項目。
+    """
+    if "items" in spec:
+        return list(spec["items"])
+    if "items_file" in spec:
+        try:
+            path = spec["items_file"].format(**params)
+        except (KeyError, IndexError) as e:
+            raise ValueError(f"map.items_file '{spec['items_file']}' uses unknown parameter {e}") from None
+    else:
+        if artifacts is None:
+            raise ValueError("map.items_artifact needs the artifact directory, which is disabled")
+        path = os.path.join(artifacts.path, spec["items_artifact"])
+        if not os.path.exists(path):
+            raise ValueError(f"artifact '{spec['items_artifact']}' was not published by an upstream step")
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError(f"{path} does not contain a JSON list")
+        return items
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def item_environment(item, index, count):
+    """map 步驟傳給每個項目的環境變數：WORKFLOW_ITEM (JSON)、WORKFLOW_ITEM_INDEX (從 0 開始) 與 WORKFLOW_ITEM_COUNT"""
+    return {
+        "WORKFLOW_ITEM": json.dumps(item, ensure_ascii=False),
+        "WORKFLOW_ITEM_INDEX": str(index),
+        "WORKFLOW_ITEM_COUNT": str(count),
+    }
+
+
+class _MapTasks:
+    """map 步驟執行中的所有項目 (放在 instance.running_tasks)，中止或逾時處理時一併結束"""
+
+    def __init__(self):
+        self.tasks = set()
+        self.lock = threading.Lock()
+
+    def add(self, task):
+        with self.lock:
+            self.tasks.add(task)
+
+    def discard(self, task):
+        with self.lock:
+            self.tasks.discard(task)
+
+    def terminate(self):
+        with self.lock:
+            tasks = list(self.tasks)
+        for task in tasks:
+            task.terminate()
+
+    def kill_tree(self):
+        with self.lock:
+            tasks = list(self.tasks)
+        for task in tasks:
+            task.kill_tree()
+
+
+class WorkflowEngine:
+    """
+    流程執行引擎 (不依賴 tkinter)。
+
+    GUI (presenter.py) 與命令列 (run_flow.py) 共用同一套排程邏輯。
+    每次執行是一個 FlowInstance，可由多個執行緒同時呼叫 run()；
+    所有實例共用步驟啟動器，以及步驟數 (max_parallel_steps) 與實例數 (max_concurrent_flows) 的上限。
+    執行過程透過回呼通知呼叫端，第一個參數皆為實例：
+    - log(instance, message)：日誌文字 (可能從任何執行緒呼叫；instance 為 None 代表非特定實例)
+    - on_status(instance)：實例狀態變化 (queued / running / 結束)
+    - on_states(instance, states)：開始執行前的整組節點狀態
+    - on_state(instance, idx, state)：單一節點狀態變化
+    - on_step_start(instance, idx)：步驟開始執行
+    - on_step_error(instance, idx, message)：步驟失敗 (含逾時且 on_timeout 為 abort)
+    - on_step_event(instance, idx, event)：任務經由事件通道送出的事件 (進度、計數、指標等，見 task_events.py)
+    """
+
+    def __init__(self, model, log=None, on_status=None, on_states=None, on_state=None, on_step_start=None, on_step_error=None,
+                 on_step_event=None):
+        self.model = model
+        self.log = log or _noop
+        self.on_status = on_status or _noop
+        self.on_states = on_states or _noop
+        self.on_state = on_state or _noop
+        self.on_step_start = on_step_start or _noop
+        self.on_step_error = on_step_error or _noop
+        self.on_step_event = on_step_event or _noop
+        self.launcher = None # 步驟啟動器 (含常駐 worker 池)，所有實例共用並跨多次執行重複使用
+        self.launcher_key = None
+        self.launcher_lock = threading.Lock()
+        self.step_cache = None # 步驟結果快取
+        self.step_slots = Slots(model.max_parallel_steps)
+        self.run_slots = Slots(model.max_concurrent_flows)
+        self.watchdog = Watchdog(self.log)
+        self.event_server = None # 任務事件通道，第一個步驟開始時建立
+        self.event_server_lock = threading.Lock()
+        self.agent_pool = None # 遠端 worker agent，第一個 placement 不是 local 的步驟開始時建立
+        self.agent_pool_key = None
+        self.agent_pool_lock = threading.Lock()
+
+    def set_step_state(self, instance, idx, state):
+        instance.step_states[idx] = state
+        self.on_state(instance, idx, state)
+
+    def set_status(self, instance, status):
+        instance.status = status
+        self.on_status(instance)
+
+    def get_launcher(self):
+        """取得步驟啟動器；直譯器或 worker 池設定變更時重建"""
+        key = (self.model.python_path, self.model.worker_pool_size, self.model.worker_max_tasks, tuple(self.model.preload_modules))
+        with self.launcher_lock:
+            if self.launcher is None or self.launcher_key != key:
+                if self.launcher:
+                    self.launcher.shutdown()
+                self.launcher = TaskLauncher(*key, log=lambda message: self.log(None, message))
+                self.launcher_key = key
+            return self.launcher
+
+    def get_event_server(self):
+        """取得任務事件通道；無法建立時回傳 None (步驟照常執行，只是沒有事件)"""
+        with self.event_server_lock:
+            if self.event_server is None:
+                try:
+                    self.event_server = EventServer()
+                except OSError as e:
+                    self.log(None, f"[{time.strftime('%H:%M:%S')}] [WARN] Task events disabled: {e}\n")
+                    self.event_server = False
+            return self.event_server or None
+
+    def get_agent_pool(self):
+        """取得遠端 agent 池；agent 清單或密鑰檔設定變更時重建 (執行中的遠端步驟不受影響)"""
+        key = (json.dumps(self.model.agents, sort_keys=True), self.model.agent_secret_file)
+        with self.agent_pool_lock:
+            if self.agent_pool is None or self.agent_pool_key != key:
+                self.agent_pool = AgentPool(self.model.agents, load_secret(self.model.agent_secret_file or None))
+                self.agent_pool_key = key
+            return self.agent_pool
+
+    def get_step_cache(self):
+        if self.step_cache is None or (self.step_cache.cache_dir, self.step_cache.max_bytes) != (self.model.cache_dir, self.model.cache_max_bytes):
+            self.step_cache = StepCache(self.model.cache_dir, self.model.cache_max_bytes)
+        return self.step_cache
+
+    def stop(self, instance):
+        """不再啟動新步驟 (執行中的步驟會跑完)"""
+        instance.stop_requested = True
+
+    def terminate_running(self, instance):
+        """強制結束該實例所有執行中的步驟"""
+        for task in list(instance.running_tasks.values()):
+            task.terminate()
+
+    def shutdown(self):
+        if self.event_server:
+            self.event_server.close()
+            self.event_server = None
+        if self.launcher:
+            self.launcher.shutdown()
+            self.launcher = None
+            self.launcher_key = None
+
+    def run(self, instance):
+        """執行一個實例，回傳執行摘要 (dict)；超過同時執行的實例數上限時先排隊"""
+        self.step_slots.set_limit(self.model.max_parallel_steps)
+        self.run_slots.set_limit(self.model.max_concurrent_flows)
+        self.set_status(instance, "queued")
+        started = time.time()
+        if not self.run_slots.acquire(lambda: instance.stop_requested):
+            # 排隊時就被中止
+            self.set_status(instance, "stopped")
+            return self._summary(instance, None, started, {})
+        try:
+            return self._run(instance)
+        finally:
+            self.run_slots.release()
+
+    def _run(self, instance):
+        self.set_status(instance, "running")
+        instance.active_lines = set() # 重置動畫線條，避免殘留上一回的狀態
+        instance.step_stats = {}
+        instance.step_profiles = {}
+        instance.step_events = {}
+        started = time.time()
+        instance.started_at = started
+
+        graph = instance.graph
+        start_idx = instance.selected_start_idx
+        targets = instance.run_targets()
+        instance.step_states = instance.initial_step_states()
+        instance.step_states[start_idx] = "pending"
+        # 從中斷的執行繼續：已完成的步驟直接視為完成
+        resumed = instance.completed_steps & set(targets)
+        for i in resumed:
+            instance.step_states[i] = "finished"
+        # 清除上一次執行留下的節點狀態 (之後只推送單一節點的變化)
+        self.on_states(instance, list(instance.step_states))
+
+        try:
+            instance.run_log = RunLogWriter(self.model.log_dir, instance.flow_key, instance.steps, self.model.log_segment_bytes, instance.params)
+        except OSError as e:
+            instance.run_log = None
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] [WARN] Run log archive disabled: {e}\n")
+        run_id = instance.run_log.run_id if instance.run_log else None
+        instance.artifacts = self._open_artifacts(instance)
+        instance.journal = None
+        if self.model.journal_dir:
+            try:
+                instance.journal = RunJournal(self.model.journal_dir, instance)
+            except OSError as e:
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [WARN] Run checkpoints disabled: {e}\n")
+        if instance.resumed_from:
+            # 新的檢查點已包含先前完成的步驟，舊檔不再需要
+            discard_journal(instance.resumed_from)
+            instance.resumed_from = None
+        if resumed:
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] Resuming: {len(resumed)} step(s) already finished are skipped\n")
+
+        done = set(resumed) # 已成功的步驟
+        blocked = set() # 因連接線被斬斷而不執行的步驟
+        submitted = set(resumed)
+        errors = {} # 步驟索引 -> 錯誤訊息
+        timeouts = {} # 步驟索引 -> 逾時原因 (含 on_timeout 為 continue 而繼續執行的步驟)
+        halted = threading.Event() # 已有步驟失敗，尚在等待空位的步驟不再執行
+
+        def deps_of(i):
+            # 子圖以外的上游步驟視為已完成
+            return [d for d in graph.deps[i] if d in targets]
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.model.max_parallel_steps)) as pool:
+                running = {} # future -> 步驟索引
+                while True:
+                    if not instance.stop_requested and not errors:
+                        for i in graph.order:
+                            if i not in targets or i in submitted or i in blocked:
+                                continue
+                            deps = deps_of(i)
+                            if not all(d in done for d in deps):
+                                continue
+                            cut = [d for d in deps if (d, i) in instance.disabled_lines]
+                            if cut:
+                                blocked.add(i)
+                                self.log(instance, f"[{time.strftime('%H:%M:%S')}] Process stopped at step {i+1} because the line from step {cut[0]+1} was cut off.\n")
+                                continue
+
+                            submitted.add(i)
+                            if instance.steps[i].get("executor") == "async":
+                                # async 步驟在共用的事件迴圈上執行，不佔用執行緒
+                                future = self.get_launcher().get_async_loop().submit(self.run_step_async(instance, i, deps, halted))
+                            else:
+                                future = pool.submit(self.run_step, instance, i, deps, halted)
+                            running[future] = i
+
+                    if not running:
+                        break
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        i = running.pop(future)
+                        try:
+                            state = future.result()
+                            if state is None:
+                                # 等待空位時被中止，步驟沒有執行
+                                continue
+                            done.add(i)
+                            self.set_step_state(instance, i, state)
+                            self._journal_finish(instance, i, state, done=True)
+                            if instance.run_log:
+                                instance.run_log.record_step(i, status=state, stats=instance.step_stats.get(i))
+                        except StepStopped as e:
+                            self.log(instance, f"[{time.strftime('%H:%M:%S')}] [WARN] Step {i+1} {e}\n")
+                            self.set_step_state(instance, i, "pending")
+                            self._journal_finish(instance, i, "stopped")
+                            if instance.run_log:
+                                instance.run_log.record_step(i, status="stopped", error=str(e), stats=instance.step_stats.get(i))
+                        except StepTimeout as e:
+                            timeouts[i] = str(e)
+                            timestamp = time.strftime('%H:%M:%S')
+                            self.set_step_state(instance, i, "timeout")
+                            self._journal_finish(instance, i, "timeout", done=e.policy == "continue")
+                            if instance.run_log:
+                                instance.run_log.record_step(i, status="timeout", error=str(e), stats=instance.step_stats.get(i))
+                            if e.policy == "continue":
+                                # 視為已完成，下游步驟照常執行
+                                done.add(i)
+                                self.log(instance, f"[{timestamp}] [WARN] Step {i+1} {e}, continuing (on_timeout: continue)\n")
+                            else:
+                                halted.set()
+                                errors[i] = str(e)
+                                self.log(instance, f"[{timestamp}] [ERROR] Step {i+1} {e}, flow aborted\n")
+                                self.on_step_error(instance, i, str(e))
+                        except Exception as e:
+                            halted.set()
+                            errors[i] = str(e)
+                            timestamp = time.strftime('%H:%M:%S')
+                            self.log(instance, f"[{timestamp}] [ERROR] Step {i+1} failed: {str(e)}\n")
+                            # 立即反應錯誤節點顏色 (紅色)
+                            self.set_step_state(instance, i, "error")
+                            self._journal_finish(instance, i, "error")
+                            if instance.run_log:
+                                instance.run_log.record_step(i, status="error", error=str(e), stats=instance.step_stats.get(i))
+                            self.on_step_error(instance, i, str(e))
+        finally:
+            if errors:
+                # 只因逾時而中止時另外標示，與腳本本身失敗區分
+                status = "timeout" if all(i in timeouts for i in errors) else "error"
+            elif instance.stop_requested:
+                status = "stopped"
+            elif blocked:
+                status = "cut"
+            else:
+                status = "success"
+            if instance.run_log:
+                instance.run_log.close(status)
+                instance.run_log = None
+            if instance.journal:
+                instance.journal.close(status)
+                instance.journal = None
+            if instance.artifacts:
+                self._close_artifacts(instance)
+
+        if instance.stop_requested:
+            # 提示流程已停止
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] Process stopped by user after {len(done)} step(s)\n")
+
+        summary = self._summary(instance, run_id, started, {**timeouts, **errors})
+        summary["status"] = status
+        instance.summary = summary
+        self.set_status(instance, status)
+        return summary
+
+    def _summary(self, instance, run_id, started, errors):
+        finished_at = time.time()
+        return {
+            "instance": instance.id,
+            "flow": instance.flow_key,
+            "label": instance.label,
+            "params": instance.params,
+            "run_id": run_id,
+            "status": instance.status,
+            "start_step": instance.selected_start_idx + 1,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finished_at)),
+            "duration_s": round(finished_at - started, 3),
+            "steps": [
+                {
+                    "step": i + 1,
+                    "name": step.get("name", ""),
+                    "module": step.get("module", ""),
+                    "state": instance.step_states[i],
+                    **({"error": errors[i]} if i in errors else {}),
+                    **({"stats": instance.step_stats[i]} if i in instance.step_stats else {}),
+                    **({"events": instance.step_events[i]} if instance.step_events.get(i) else {}),
+                }
+                for i, step in enumerate(instance.steps)
+            ],
+        }
+
+    def run_step(self, instance, i, deps, halted):
+        """
+        於 worker 執行緒中執行單一步驟，回傳節點狀態 (finished / cached)，失敗時拋出例外 (逾時為 StepTimeout)。
+        先等待全域的步驟空位；等待期間實例被中止或已有步驟失敗時回傳 None。
+        map 步驟本身不佔用空位，改由每個執行中的項目各佔一個 (見 _run_map_step)。
+        """
+        slotted = "map" not in instance.steps[i]
+        if slotted and not self.step_slots.acquire(lambda: instance.stop_requested or halted.is_set()):
+            return None
+        if not slotted and (instance.stop_requested or halted.is_set()):
+            return None
+        try:
+            instance.active_lines.update((d, i) for d in deps)
+            instance.step_stats[i] = {"started": round(time.time(), 3)}
+            if instance.journal:
+                instance.journal.step_started(i)
+            self.set_step_state(instance, i, "running")
+            self.on_step_start(instance, i)
+            return self._run_step(instance, i, halted)
+        finally:
+            if slotted:
+                self.step_slots.release()
+
+    async def run_step_async(self, instance, i, deps, halted):
+        """run_step 的 async 版本 ("executor": "async")，在 AsyncLoop 上執行"""
+        while not self.step_slots.try_acquire():
+            if instance.stop_requested or halted.is_set():
+                return None
+            await asyncio.sleep(0.05)
+        try:
+            instance.active_lines.update((d, i) for d in deps)
+            instance.step_stats[i] = {"started": round(time.time(), 3)}
+            if instance.journal:
+                instance.journal.step_started(i)
+            self.set_step_state(instance, i, "running")
+            self.on_step_start(instance, i)
+
+            loop = asyncio.get_running_loop()
+            step = instance.steps[i]
+            script_path = os.path.join("tasks", f"{step['module']}.py")
+            profile = self._profile_path(instance, i)
+            # 雜湊與複製檔案會阻塞，交給預設的執行緒池
+            fingerprint, cached = await loop.run_in_executor(None, self._check_cache, instance, i, script_path, profile)
+            if cached:
+                self._finish_stats(instance, i, cached=True)
+                return "cached"
+
+            events, events_env = self._open_events(instance, i)
+            try:
+                task = self.get_launcher().start_async(script_path, task_arguments(step, instance.params),
+                                                       {**task_environment(instance), **events_env}, profile)
+            except Exception:
+                self._close_events(instance, i, events, events_env)
+                raise
+            instance.running_tasks[i] = task
+            watch = self._watch(instance, i, task)
+            step_log = instance.run_log.open_step(i) if instance.run_log else None
+            output_bytes = 0
+
+            def on_lines(lines):
+                nonlocal output_bytes
+                if watch:
+                    watch.touch()
+                output_bytes += sum(len(line.encode("utf-8")) + 1 for line in lines)
+                # 一個讀取區塊的所有行合併成一筆日誌，減少送往 UI 的次數
+                if step_log:
+                    for line in lines:
+                        step_log.write(line + "\n")
+                timestamp = time.strftime('%H:%M:%S')
+                self.log(instance, "".join(f"[{timestamp}] [{i+1}] {line.strip()}\n" for line in lines))
+
+            return_code = None
+            try:
+                return_code = await task.run(on_lines)
+            finally:
+                self.watchdog.unwatch(watch)
+                instance.running_tasks.pop(i, None)
+                self._finish_stats(instance, i, exit_code=return_code, output_bytes=output_bytes, **task.usage)
+                if step_log:
+                    step_log.close()
+                self._close_events(instance, i, events, events_env)
+            self._check_timeout(instance, i, watch)
+            return await loop.run_in_executor(None, self._finish_step, instance, i, return_code, fingerprint, profile)
+        finally:
+            self.step_slots.release()
+
+    def _run_map_step(self, instance, i, halted=None):
+        """
+        map 步驟：每個輸入項目執行一次腳本，最多同時 map.parallel 個 (預設 max_parallel_steps)；
+        每次執行項目時佔用一個全域的步驟空位，所有步驟合計仍不超過 max_parallel_steps。
+        失敗 (含逾時) 的項目重試 map.retries 次；重試後仍失敗的項目超過 map.max_failures 時
+        不再啟動新的項目，步驟失敗。各項目的進度合併為節點的進度。
+        """
+        step = instance.steps[i]
+        spec = step["map"]
+        script_path = os.path.join("tasks", f"{step['module']}.py")
+        if instance.profile or step.get("profile"):
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] Profile skipped: map steps are not profiled\n")
+        items = map_items(spec, instance.params, instance.artifacts)
+        total = len(items)
+        retries = spec.get("retries", 0)
+        retry_delay = spec.get("retry_delay", 0)
+        max_failures = spec.get("max_failures", 0)
+        parallel = max(1, min(spec.get("parallel", self.model.max_parallel_steps), total))
+        self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] Running {total} item(s), {parallel} at a time\n")
+
+        group = _MapTasks()
+        instance.running_tasks[i] = group
+        step_log = instance.run_log.open_step(i) if instance.run_log else None
+        events = StepEvents(os.path.join(instance.run_log.step_dir(i), EVENTS_FILE) if instance.run_log else None)
+        instance.step_events[i] = events.summary
+        server = self.get_event_server()
+        lock = threading.Lock() # 保護以下的彙總、日誌檔與事件紀錄 (多個項目同時執行)
+        results = {} # 項目索引 -> 最後一次的結束碼
+        fractions = {} # 執行中項目回報的進度
+        totals = {"output_bytes": 0, "retried": 0}
+        agents = set() # 執行過項目的遠端 agent
+        last_progress = [0.0]
+        failed_out = threading.Event() # 失敗的項目已超過上限
+
+        def cancelled():
+            return instance.stop_requested or failed_out.is_set() or (halted is not None and halted.is_set())
+
+        def report_progress(force=False):
+            # 呼叫端持有 lock
+            now = time.monotonic()
+            if not force and now - last_progress[0] < 0.1:
+                return
+            last_progress[0] = now
+            finished = len(results)
+            failed = sum(1 for code in results.values() if code != 0)
+            message = f"{finished}/{total} items" + (f", {failed} failed" if failed else "")
+            event = {"type": "progress", "value": (finished + sum(fractions.values())) / total if total else 1.0, "message": message}
+            events.add(event)
+            self.on_step_event(instance, i, event)
+
+        def item_events(n):
+            if server is None:
+                return {}
+
+            def on_event(event):
+                with lock:
+                    if event["type"] == "progress":
+                        value = event.get("value")
+                        if isinstance(value, (int, float)) and not isinstance(value, bool):
+                            fractions[n] = min(max(float(value), 0.0), 1.0)
+                            report_progress()
+                        return
+                    events.add({**event, "item": n})
+                self.on_step_event(instance, i, event)
+            return server.register(on_event)
+
+        def run_once(n):
+            item = items[n]
+            args = task_arguments(step, {**instance.params, "item": item, "item_index": n})
+            env = item_events(n)
+            try:
+                task = self._start_task(instance, i, script_path, args,
+                                        {**task_environment(instance), **item_environment(item, n, total), **env},
+                                        cancelled=cancelled, label=f"{i+1} #{n+1}")
+            except Exception:
+                if env:
+                    server.unregister(env)
+                raise
+            group.add(task)
+            if isinstance(task, RemoteTask):
+                with lock:
+                    agents.add(task.agent.name)
+            watch = self._watch(instance, i, task)
+            output_bytes = 0
+            try:
+                for line in task.lines():
+                    if watch:
+                        watch.touch()
+                    output_bytes += len(line.encode("utf-8"))
+                    if step_log:
+                        with lock:
+                            step_log.write(f"[#{n+1}] " + (line if line.endswith("\n") else line + "\n"))
+                    self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1} #{n+1}] {line.strip()}\n")
+            finally:
+                return_code = task.wait()
+                self.watchdog.unwatch(watch)
+                group.discard(task)
+                if env:
+                    server.unregister(env)
+                with lock:
+                    totals["output_bytes"] += output_bytes
+                    for name, value in task.usage.items():
+                        totals[name] = max(totals.get(name, 0), value) if name == "max_rss_kb" else round(totals.get(name, 0) + value, 3)
+            if watch and watch.reason:
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1} #{n+1}] [WARN] Item {watch.reason}\n")
+                return return_code or -1
+            return return_code
+
+        def run_item(n):
+            return_code = None
+            for attempt in range(retries + 1):
+                if cancelled():
+                    return
+                if attempt:
+                    self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1} #{n+1}] Item failed (exit code {return_code}), "
+                                       f"retry {attempt}/{retries}\n")
+                    with lock:
+                        totals["retried"] += 1
+                    if retry_delay and failed_out.wait(retry_delay) or cancelled():
+                        return
+                if not self.step_slots.acquire(cancelled):
+                    return
+                try:
+                    return_code = run_once(n)
+                except Exception as e:
+                    self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1} #{n+1}] [ERROR] {e}\n")
+                    return_code = -1
+                finally:
+                    self.step_slots.release()
+                if return_code == 0:
+                    break
+            with lock:
+                fractions.pop(n, None)
+                results[n] = return_code
+                if sum(1 for code in results.values() if code != 0) > max_failures:
+                    failed_out.set()
+                report_progress(force=True)
+
+        try:
+            if total:
+                with ThreadPoolExecutor(max_workers=parallel) as pool:
+                    for future in [pool.submit(run_item, n) for n in range(total)]:
+                        future.result()
+        finally:
+            instance.running_tasks.pop(i, None)
+            if step_log:
+                step_log.close()
+            events.close()
+
+        failed = {n: code for n, code in sorted(results.items()) if code != 0}
+        completed = len(results) - len(failed)
+        self._finish_stats(instance, i, exit_code=0 if len(failed) <= max_failures and len(results) == total else 1,
+                           items=total, failed_items=len(failed), retried_items=totals.pop("retried"), **totals,
+                           **({"agents": sorted(agents)} if agents else {}))
+        if instance.run_log:
+            instance.run_log.record_step(i, events=events.summary,
+                                         items={"total": total, "finished": completed,
+                                                "failed": [{"index": n, "item": items[n], "exit_code": code} for n, code in failed.items()]})
+        listed = ", ".join(f"#{n+1} (exit {code})" for n, code in list(failed.items())[:MAP_ERROR_ITEMS])
+        if len(failed) > max_failures:
+            raise RuntimeError(f"{len(failed)} of {total} item(s) failed: {listed}" + (" ..." if len(failed) > MAP_ERROR_ITEMS else ""))
+        if len(results) < total:
+            raise StepStopped(f"stopped after {len(results)} of {total} item(s)")
+        if failed:
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] {len(failed)} item(s) failed "
+                               f"(allowed up to {max_failures}): {listed}\n")
+        return "finished"
+
+    def _check_cache(self, instance, i, script_path, profile=None):
+        """回傳 (指紋, 是否已從快取還原)；步驟未宣告 cache 或要 profile 時指紋為 None"""
+        step = instance.steps[i]
+        if not step.get("cache") or profile:
+            # profile 需要實際執行腳本，不從快取還原
+            return None, False
+        step_cache = self.get_step_cache()
+        try:
+            fingerprint = step_cache.fingerprint(step, script_path, self.model.python_path, instance.params,
+                                                 task_arguments(step, instance.params))
+            if step_cache.restore(fingerprint):
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] Inputs unchanged, outputs restored from cache ({fingerprint[:12]})\n")
+                return fingerprint, True
+            return fingerprint, False
+        except OSError as e:
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] Step cache skipped: {e}\n")
+            return None, False
+
+    def _open_artifacts(self, instance):
+        """
+        建立本次執行的 artifact 目錄 (由檢查點繼續執行時沿用原本的目錄)，失敗時回傳 None。
+        同時清除中斷且不再繼續的執行留下的目錄。
+        """
+        timestamp = time.strftime('%H:%M:%S')
+        try:
+            keep = [run.get("artifacts") for run in incomplete_runs(self.model.journal_dir)] if self.model.journal_dir else []
+            sweep_artifacts(self.model.artifact_dir, keep)
+            store = ArtifactStore(self.model.artifact_dir, instance, instance.artifacts_from)
+        except OSError as e:
+            self.log(instance, f"[{timestamp}] [WARN] Artifacts disabled: {e}\n")
+            return None
+        if instance.artifacts_from and store.path != os.path.abspath(instance.artifacts_from):
+            self.log(instance, f"[{timestamp}] [WARN] Artifacts of the interrupted run are gone; skipped steps did not republish them\n")
+        instance.artifacts_from = None
+        return store
+
+    def _close_artifacts(self, instance):
+        """執行結束時刪除 artifact 目錄"""
+        store, instance.artifacts = instance.artifacts, None
+        try:
+            names = store.names()
+            size = store.size()
+        except OSError:
+            names, size = [], 0
+        store.close()
+        if names:
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] Removed {len(names)} artifact(s), {size / 1024 / 1024:.1f} MB\n")
+
+    def _open_events(self, instance, i):
+        """登記步驟的事件通道，回傳 (StepEvents, 傳給任務的環境變數)；通道無法使用時為 (None, {})"""
+        server = self.get_event_server()
+        if server is None:
+            return None, {}
+        events = StepEvents(os.path.join(instance.run_log.step_dir(i), EVENTS_FILE) if instance.run_log else None)
+        instance.step_events[i] = events.summary
+
+        def on_event(event):
+            try:
+                events.add(event)
+            except OSError as e:
+                events.path = None
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] Could not record task events: {e}\n")
+            self.on_step_event(instance, i, event)
+        return events, server.register(on_event)
+
+    def _close_events(self, instance, i, events, env):
+        """步驟結束：收完剩餘的事件後關閉通道，彙總記錄到 run.json"""
+        if events is None:
+            return
+        if self.event_server and env:
+            self.event_server.unregister(env)
+        events.close()
+        if events.summary and instance.run_log:
+            instance.run_log.record_step(i, events=events.summary)
+
+    def _start_task(self, instance, i, script_path, args, env, profile=None, cancelled=None, label=None):
+        """
+        依步驟的 placement 在遠端 worker agent 或本機 (依 executor) 啟動任務；
+        label 為日誌中的步驟編號 (map 項目為 "3 #2")，cancelled 為等待空閒 agent 時的中止條件。
+        """
+        step = instance.steps[i]
+        label = label or f"{i+1}"
+        placement = step.get("placement", "local")
+        if placement != "local":
+            def warn(message):
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{label}] [WARN] {message}\n")
+            task = self.get_agent_pool().start(placement, script_path, args, env, cancelled or (lambda: instance.stop_requested), warn)
+            if task is not None:
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{label}] Running on agent {task.agent.name}\n")
+                return task
+        return self.get_launcher().start(step, script_path, args, env, profile)
+
+    def _journal_finish(self, instance, i, state, done=False):
+        """步驟結束寫入檢查點；done 為下游可以執行 (繼續執行時跳過這一步)"""
+        if instance.journal:
+            instance.journal.step_finished(i, state, instance.step_stats.get(i, {}).get("exit_code"), done)
+
+    def _watch(self, instance, i, task):
+        """依步驟 (或流程預設) 的 timeout / idle_timeout 交給 watchdog 監看"""
+        return self.watchdog.watch(task, instance.step_setting(i, "timeout"), instance.step_setting(i, "idle_timeout"))
+
+    def _check_timeout(self, instance, i, watch):
+        """步驟是被 watchdog 強制結束時拋出 StepTimeout"""
+        if watch is None or watch.reason is None:
+            return
+        instance.step_stats[i]["timed_out"] = watch.reason
+        raise StepTimeout(watch.reason, instance.step_setting(i, "on_timeout", "abort"))
+
+    def _finish_stats(self, instance, i, **fields):
+        """記錄步驟結束時的遙測：耗時、CPU 時間、峰值記憶體、輸出位元組數與結束碼"""
+        stats = instance.step_stats[i]
+        finished = time.time()
+        stats.update(finished=round(finished, 3), wall_s=round(finished - stats["started"], 3), **fields)
+
+    def _profile_path(self, instance, i):
+        """步驟要 profile 時回傳 .pstats 的路徑 (存在該步驟的日誌封存目錄)，否則回傳 None"""
+        if not (instance.profile or instance.steps[i].get("profile")):
+            return None
+        if not instance.run_log:
+            self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] Profile skipped: the run log archive is disabled\n")
+            return None
+        step_dir = instance.run_log.step_dir(i)
+        os.makedirs(step_dir, exist_ok=True)
+        return os.path.abspath(os.path.join(step_dir, PROFILE_FILE))
+
+    def _report_profile(self, instance, i, profile):
+        """在日誌列出 profile 中自身耗時最多的函式，並記錄到 run.json"""
+        timestamp = time.strftime('%H:%M:%S')
+        if not os.path.exists(profile):
+            # 腳本在寫出 profile 前就被強制結束
+            self.log(instance, f"[{timestamp}] [{i+1}] [WARN] No profile was written\n")
+            return
+        try:
+            rows = top_functions([profile], PROFILE_TOP)
+        except Exception as e:
+            self.log(instance, f"[{timestamp}] [{i+1}] [WARN] Could not read profile: {e}\n")
+            return
+        instance.step_profiles[i] = rows
+        lines = [f"[{timestamp}] [{i+1}] Profile saved to {profile}, top functions by own time:\n"]
+        lines += [f"[{timestamp}] [{i+1}]   {line}\n" for line in format_rows(rows)]
+        self.log(instance, "".join(lines))
+        if instance.run_log:
+            instance.run_log.record_step(i, profile={"file": PROFILE_FILE, "top": rows})
+
+    def _finish_step(self, instance, i, return_code, fingerprint, profile=None):
+        """檢查結束碼並把輸出存入快取，回傳 "finished"；失敗時拋出例外"""
+        if profile:
+            # 失敗的步驟也列出 profile
+            self._report_profile(instance, i, profile)
+        if return_code != 0:
+            raise RuntimeError(f"Script execution failed, exit code: {return_code}")
+
+        if fingerprint:
+            try:
+                self.get_step_cache().store(fingerprint, instance.steps[i], instance.flow_key)
+            except OSError as e:
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] Could not cache step outputs: {e}\n")
+        return "finished"
+
+    def _run_step(self, instance, i, halted=None):
+        step = instance.steps[i]
+        if "map" in step:
+            return self._run_map_step(instance, i, halted)
+        script_path = os.path.join("tasks", f"{step['module']}.py")
+        profile = self._profile_path(instance, i)
+        fingerprint, cached = self._check_cache(instance, i, script_path, profile)
+        if cached:
+            self._finish_stats(instance, i, cached=True)
+            return "cached"
+
+        # 依步驟的 executor 設定啟動：全新子進程 (預設) 或常駐 worker；實例參數經由環境變數與 "args" 傳入
+        events, events_env = self._open_events(instance, i)
+        try:
+            task = self._start_task(instance, i, script_path, task_arguments(step, instance.params),
+                                    {**task_environment(instance), **events_env}, profile)
+        except Exception:
+            self._close_events(instance, i, events, events_env)
+            raise
+        if isinstance(task, RemoteTask):
+            instance.step_stats[i]["agent"] = task.agent.name
+            if profile:
+                self.log(instance, f"[{time.strftime('%H:%M:%S')}] [{i+1}] [WARN] Profile skipped: steps on remote agents are not profiled\n")
+                profile = None
+        instance.running_tasks[i] = task
+        watch = self._watch(instance, i, task)
+        step_log = instance.run_log.open_step(i) if instance.run_log else None
+        output_bytes = 0
+
+        try:
+            # 讀取輸出
+            for line in task.lines():
+                if watch:
+                    watch.touch()
+                output_bytes += len(line.encode("utf-8"))
+                if step_log:
+                    step_log.write(line if line.endswith("\n") else line + "\n")
+                # 修正：line 本身帶有 \n，strip() 後再由 log 處理
+                timestamp = time.strftime('%H:%M:%S')
+                self.log(instance, f"[{timestamp}] [{i+1}] {line.strip()}\n")
+        finally:
+            return_code = task.wait()
+            self.watchdog.unwatch(watch)
+            instance.running_tasks.pop(i, None)
+            self._finish_stats(instance, i, exit_code=return_code, output_bytes=output_bytes, **task.usage)
+            if step_log:
+                step_log.close()
+            self._close_events(instance, i, events, events_env)
+
+        self._check_timeout(instance, i, watch)
+        return self._finish_step(instance, i, return_code, fingerprint, profile)
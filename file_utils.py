@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+
+# 目前的 umask (mkstemp 建立的檔案權限為 0600，改名前改回一般檔案的權限，共用目錄中其他人才讀得到)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+if os.name == 'nt':
+    import msvcrt
+
+    def try_lock(f):
+        """嘗試取得檔案的獨占鎖 (不等待)，成功回傳 True；檔案關閉時自動釋放"""
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+else:
+    import fcntl
+
+    def try_lock(f):
+        """嘗試取得檔案的獨占鎖 (不等待)，成功回傳 True；檔案關閉時自動釋放"""
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+
+def write_json_atomic(path, data):
+    """
+    先寫到同目錄中唯一命名的暫存檔，fsync 後再改名：中途當機或斷電不會留下損毀或空白的檔案，
+    多個程式 (例如共用設定目錄的其他電腦) 同時寫入同一個檔案也不會互相覆蓋暫存檔。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path, default=None):
+    """讀取 JSON；檔案不存在或內容損毀時回傳 default"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
@@ -0,0 +1,127 @@
+class FlowGraph:
+    """
+    流程步驟的相依圖 (DAG)。
+
+    每個步驟可在 config.json 中宣告 `depends_on`：
+    - 未宣告：預設依賴上一個步驟 (維持原本的線性流程)
+    - 空陣列 []：沒有任何依賴，可與其他步驟同時執行
+    - 陣列內容可為步驟編號 (從 1 開始，與畫布顯示一致)，或步驟的 `id` / `module` 名稱
+
+    邊 (edge) 以 (來源索引, 目標索引) 表示，也就是畫布上的連接線。
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self._keys = self._step_key_map()
+        self.deps = [self._resolve_deps(i, step) for i, step in enumerate(steps)]
+        self.children = [[] for _ in steps]
+        for i, deps in enumerate(self.deps):
+            for d in deps:
+                self.children[d].append(i)
+        self.order = self._topological_order()
+        self.levels = self._compute_levels()
+
+    @property
+    def edges(self):
+        """所有連接線 (來源, 目標)"""
+        return [(d, i) for i in range(len(self.steps)) for d in self.deps[i]]
+
+    def _step_key_map(self):
+        keys = {}
+        for i, step in enumerate(self.steps):
+            key = step.get("id") or step.get("module")
+            if key:
+                keys.setdefault(key, []).append(i)
+        return keys
+
+    def _resolve_deps(self, idx, step):
+        if "depends_on" not in step:
+            return [idx - 1] if idx > 0 else []
+
+        raw = step["depends_on"]
+        if isinstance(raw, (str, int)):
+            raw = [raw]
+
+        deps = []
+        for ref in raw:
+            try:
+                dep = self.resolve(ref)
+            except ValueError as e:
+                raise ValueError(f"Step {idx+1} depends on {e}") from None
+            if dep == idx:
+                raise ValueError(f"Step {idx+1} depends on itself")
+            if dep not in deps:
+                deps.append(dep)
+        return deps
+
+    def resolve(self, ref):
+        """步驟編號 (從 1 開始) 或 `id` / `module` 名稱 -> 步驟索引"""
+        if isinstance(ref, int):
+            if not 1 <= ref <= len(self.steps):
+                raise ValueError(f"unknown step number {ref}")
+            return ref - 1
+        matches = self._keys.get(ref, [])
+        if not matches:
+            raise ValueError(f"unknown step '{ref}'")
+        if len(matches) > 1:
+            raise ValueError(f"ambiguous step '{ref}' (matches several steps; give them an 'id')")
+        return matches[0]
+
+    def _topological_order(self):
+        """Kahn 演算法，同層時以原始順序為準；有循環則拋出錯誤"""
+        indegree = [len(deps) for deps in self.deps]
+        ready = [i for i, n in enumerate(indegree) if n == 0]
+        order = []
+        while ready:
+            ready.sort()
+            i = ready.pop(0)
+            order.append(i)
+            for c in self.children[i]:
+                indegree[c] -= 1
+                if indegree[c] == 0:
+                    ready.append(c)
+        if len(order) != len(self.steps):
+            cycle = [i + 1 for i, n in enumerate(indegree) if n > 0]
+            raise ValueError(f"Circular dependency between steps {cycle}")
+        return order
+
+    def _compute_levels(self):
+        """每個步驟的層級 = 最長依賴路徑長度 (用於畫布排版)"""
+        levels = [0] * len(self.steps)
+        for i in self.order:
+            for d in self.deps[i]:
+                levels[i] = max(levels[i], levels[d] + 1)
+        return levels
+
+    def run_targets(self, start_idx):
+        """從 start_idx 開始執行時要跑的步驟：從第一步開始為整個流程，否則為起點及其所有下游步驟"""
+        if not self.steps:
+            return set()
+        if start_idx == 0:
+            # 流程可能有多個無依賴的起點，從頭執行時全部都要跑
+            return set(range(len(self.steps)))
+        return self.descendants(start_idx)
+
+    def initial_states(self, start_idx):
+        """尚未執行時各節點的狀態"""
+        targets = self.run_targets(start_idx)
+        states = []
+        for i in range(len(self.steps)):
+            if i == start_idx:
+                states.append("start")
+            elif i in targets:
+                states.append("pending")
+            else:
+                states.append("skipped")
+        return states
+
+    def descendants(self, idx):
+        """回傳 idx 本身及所有下游步驟 (從某節點開始執行時的子圖)"""
+        seen = {idx}
+        stack = [idx]
+        while stack:
+            for c in self.children[stack.pop()]:
+                if c not in seen:
+                    seen.add(c)
+                    stack.append(c)
+        return seen
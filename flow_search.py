@@ -0,0 +1,85 @@
+"""
+流程搜尋索引：依 key、標題與描述中的文字找流程 (流程選單的即時搜尋)。
+
+每個流程的文字拆成長度 1~3 的片段 (n-gram) 建立反向索引：
+- 查詢不超過 3 個字時，片段對應的流程集合就是結果
+- 較長的查詢取各個 3 字片段集合的交集 (由最小的集合開始)，再確認整段文字
+查詢成本與符合的流程數成正比，不必逐一掃描整個清單；
+流程新增、刪除或摘要變動時只更新該流程的片段。
+"""
+import re
+
+GRAM = 3
+_EMPTY = frozenset()
+
+
+def _grams(text):
+    return {text[i:i + n] for n in range(1, GRAM + 1) for i in range(len(text) - n + 1)}
+
+
+class FlowSearchIndex:
+    def __init__(self):
+        self.postings = {} # 片段 -> 流程 key 集合
+        self.texts = {} # 流程 key -> 小寫的搜尋文字
+        self.summaries = {} # 流程 key -> 建立索引時的摘要 (判斷是否需要重新索引)
+        self.keys = [] # 依清單順序的流程 key
+        self.positions = {} # 流程 key -> 清單順序
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _add(self, key, summary):
+        # 以換行分隔各欄位，查詢不會跨欄位比對
+        text = "\n".join([key, summary.get("title", ""), summary.get("description", "")]).lower()
+        self.texts[key] = text
+        self.summaries[key] = dict(summary) # 複本：呼叫端之後修改摘要時仍能比對出差異
+        for gram in _grams(text):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key):
+        for gram in _grams(self.texts.pop(key)):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+        del self.summaries[key]
+
+    def update(self, flow_index):
+        """依流程索引 {key: 摘要} 增量更新：只重新索引新增、刪除或摘要有變動的流程"""
+        for key in [key for key in self.summaries if key not in flow_index]:
+            self._remove(key)
+        for key, summary in flow_index.items():
+            old = self.summaries.get(key)
+            if old is summary or old == summary:
+                continue
+            if old is not None:
+                self._remove(key)
+            self._add(key, summary)
+        self.keys = list(flow_index)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+
+    def search(self, query, limit=50):
+        """
+        回傳 (符合的前 limit 個 key, 符合的總數)。
+        排序：key 開頭相符、某個詞開頭相符、其他位置相符，同一級依清單順序；空白查詢回傳清單開頭。
+        """
+        q = query.strip().lower()
+        if not q:
+            return self.keys[:limit], len(self.keys)
+        if len(q) <= GRAM:
+            matches = self.postings.get(q, _EMPTY)
+        else:
+            sets = sorted((self.postings.get(q[i:i + GRAM], _EMPTY) for i in range(len(q) - GRAM + 1)), key=len)
+            candidates = set(sets[0])
+            for keys in sets[1:]:
+                if not candidates:
+                    break
+                candidates &= keys
+            matches = [key for key in candidates if q in self.texts[key]]
+
+        word_start = re.compile(r"(?<!\w)" + re.escape(q))
+        def rank(key):
+            if key.lower().startswith(q):
+                return (0, self.positions[key])
+            return (1 if word_start.search(self.texts[key]) else 2, self.positions[key])
+        return sorted(matches, key=rank)[:limit], len(matches)
@@ -0,0 +1,119 @@
+"""
+Fork server (由 task_launcher.ForkServer 啟動，不直接執行，僅支援 POSIX)。
+
+啟動時先 import 設定中的重量級模組 (例如 pandas、sqlalchemy)，之後每個步驟
+fork 出一個全新子進程執行，透過 copy-on-write 共用已載入的模組，省去重複 import。
+
+協定：
+- argv[1]：控制 socket 的 fd (AF_UNIX / SOCK_DGRAM)，argv[2]：預載模組清單 (JSON)
+- 控制 socket 收到 {"id", "script", "cwd", "args", "env", "profile"} 加上一個 fd，子進程的 stdout/stderr 會接到該 fd
+- 回覆寫在 stdout，每行一個 JSON：{"ready", "failed"} / {"id", "pid"} / {"id", "exit", "usage"}
+- stdin 關閉 (engine 結束) 時 fork server 一併結束
+"""
+import importlib
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import traceback
+
+from task_worker import run_task, usage_fields
+
+
+def reply(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def run_child(ctrl, wakeup_fds, request, out_fd):
+    """子進程：接上輸出管線後執行腳本，以腳本的結束碼離開"""
+    exit_code = 1
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        ctrl.close()
+        for fd in wakeup_fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        os.dup2(out_fd, 1)
+        os.dup2(out_fd, 2)
+        os.close(out_fd)
+        sys.stderr = sys.stdout
+        exit_code = run_task(request["script"], request["cwd"], request.get("args", []), request.get("env"), request.get("profile"))
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def reap(children):
+    while children:
+        try:
+            # wait4 同時取得子進程的資源用量 (CPU 時間、峰值記憶體)
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            break
+        request_id = children.pop(pid, None)
+        if request_id is not None:
+            reply({"id": request_id, "exit": os.waitstatus_to_exitcode(status), "usage": usage_fields(rusage)})
+
+
+def main():
+    ctrl = socket.socket(fileno=int(sys.argv[1]))
+    preload = json.loads(sys.argv[2])
+
+    failed = {}
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            failed[name] = f"{type(e).__name__}: {e}"
+    reply({"ready": True, "failed": failed})
+
+    # 以 SIGCHLD + wakeup fd 得知子進程結束，不需要額外執行緒
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(ctrl, selectors.EVENT_READ)
+    selector.register(sys.stdin.fileno(), selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+
+    children = {} # pid -> request id
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is ctrl:
+                data, fds, _, _ = socket.recv_fds(ctrl, 65536, 1)
+                request = json.loads(data)
+                sys.stdout.flush()
+                pid = os.fork()
+                if pid == 0:
+                    run_child(ctrl, (wakeup_r, wakeup_w), request, fds[0])
+                os.close(fds[0])
+                children[pid] = request["id"]
+                reply({"id": request["id"], "pid": pid})
+            elif key.fileobj == wakeup_r:
+                try:
+                    while os.read(wakeup_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                reap(children)
+            elif not os.read(sys.stdin.fileno(), 512):
+                return
+
+
+if __name__ == "__main__":
+    main()
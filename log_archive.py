@@ -0,0 +1,361 @@
+"""
+每次執行的日誌封存。
+
+目錄結構：
+    logs/<run_id>/run.json                    執行資訊 (流程、開始/結束時間、結果)
+    logs/<run_id>/step_003/index.json         步驟的分段索引
+    logs/<run_id>/step_003/seg_0000.log.gz    已完成並壓縮的分段
+    logs/<run_id>/step_003/seg_0001.log       寫入中的分段
+
+每個分段超過 segment_bytes 即輪替，舊分段在背景壓縮。
+index.json 記錄每個分段的起始行號、行數，以及每 MARK_EVERY 行的位元組位移，
+檢視器以 mmap 分頁讀取，不必把整份日誌載入記憶體。
+壓縮分段讀取時解壓到 logs/.cache/<run_id>/；檢視器離開該次執行時刪除，
+另外開啟步驟時檢查總大小，超過 CACHE_MAX_BYTES 就刪除最久沒用的檔案。
+"""
+import gzip
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import read_json, write_json_atomic
+
+MARK_EVERY = 1000 # 每隔多少行記錄一次位元組位移
+CACHE_MAX_BYTES = 512 * 1024 * 1024 # 解壓快取 (logs/.cache) 的大小上限，超過時刪除最久沒用的分段
+
+
+class StepLogWriter:
+    """單一步驟的日誌寫入器 (只由該步驟的執行緒使用)"""
+
+    def __init__(self, run_log, step_dir, segment_bytes):
+        self.run_log = run_log
+        self.step_dir = step_dir
+        self.segment_bytes = segment_bytes
+        self.segments = []
+        self.lock = threading.Lock() # 保護 segments (背景壓縮會更新)
+        self.file = None
+        os.makedirs(step_dir, exist_ok=True)
+        self._open_segment()
+
+    def _open_segment(self):
+        first_line = 0
+        if self.segments:
+            first_line = self.segments[-1]["first_line"] + self.segments[-1]["lines"]
+        segment = {
+            "file": f"seg_{len(self.segments):04d}.log",
+            "first_line": first_line,
+            "lines": 0,
+            "bytes": 0,
+            "marks": [0],
+            "active": True,
+        }
+        with self.lock:
+            self.segments.append(segment)
+        self.segment = segment
+        self.file = open(os.path.join(self.step_dir, segment["file"]), "wb")
+        self._save_index()
+
+    def _close_segment(self):
+        self.file.close()
+        segment = self.segment
+        with self.lock:
+            segment["active"] = False
+        self._save_index()
+        self.run_log.compress_later(self, segment)
+
+    def write(self, line):
+        data = line.encode("utf-8")
+        segment = self.segment
+        if segment["bytes"] and segment["bytes"] + len(data) > self.segment_bytes:
+            self._close_segment()
+            self._open_segment()
+            segment = self.segment
+        self.file.write(data)
+        segment["bytes"] += len(data)
+        segment["lines"] += line.count("\n")
+        if segment["lines"] >= len(segment["marks"]) * MARK_EVERY:
+            segment["marks"].append(segment["bytes"])
+
+    def close(self):
+        if self.file and not self.file.closed:
+            self._close_segment()
+
+    def compress(self, segment):
+        """背景執行：把分段壓縮成 .gz 後刪除原檔"""
+        src = os.path.join(self.step_dir, segment["file"])
+        dst = src + ".gz"
+        with open(src, "rb") as f_in, gzip.open(dst, "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        with self.lock:
+            segment["file"] = os.path.basename(dst)
+            segment["compressed"] = True
+        self._save_index()
+        try:
+            os.remove(src)
+        except OSError:
+            # Windows 下檢視器可能正開著該檔；保留原檔，讀取端會優先使用 .gz
+            pass
+
+    def _save_index(self):
+        with self.lock:
+            segments = [dict(s) for s in self.segments]
+            write_json_atomic(os.path.join(self.step_dir, "index.json"), {"segments": segments})
+
+
+def _dir_name(flow_key):
+    """流程鍵值中不能出現在路徑裡的字元 (例如 / 與 :) 換成底線；真正的鍵值記錄在 run.json"""
+    return re.sub(r"[^\w.-]", "_", flow_key)
+
+
+class RunLogWriter:
+    """一次執行的日誌封存"""
+
+    def __init__(self, base_dir, flow_key, steps, segment_bytes=16 * 1024 * 1024, params=None):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"_{_dir_name(flow_key)}"
+        self.run_dir = os.path.join(base_dir, self.run_id)
+        os.makedirs(base_dir, exist_ok=True)
+        suffix = 1
+        while True:
+            # 同一秒內可能有多個實例開始執行，以 mkdir 本身判斷是否已被佔用
+            try:
+                os.mkdir(self.run_dir)
+                break
+            except FileExistsError:
+                suffix += 1
+                self.run_dir = os.path.join(base_dir, f"{self.run_id}_{suffix}")
+        self.run_id = os.path.basename(self.run_dir)
+        self.segment_bytes = segment_bytes
+        self.compressor = ThreadPoolExecutor(max_workers=1)
+        self.info = {
+            "run_id": self.run_id,
+            "flow": flow_key,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished": None,
+            "status": "running",
+            "params": params or {},
+            "steps": [{"name": step.get("name", ""), "module": step.get("module", "")} for step in steps],
+        }
+        self.lock = threading.Lock()
+        self._save_info()
+
+    def _save_info(self):
+        with self.lock:
+            write_json_atomic(os.path.join(self.run_dir, "run.json"), self.info)
+
+    def step_dir(self, idx):
+        return os.path.join(self.run_dir, f"step_{idx+1:03d}")
+
+    def open_step(self, idx):
+        return StepLogWriter(self, self.step_dir(idx), self.segment_bytes)
+
+    def record_step(self, idx, **fields):
+        """記錄步驟結果 (狀態、錯誤訊息等) 到 run.json"""
+        with self.lock:
+            self.info["steps"][idx].update(fields)
+        self._save_info()
+
+    def compress_later(self, step_writer, segment):
+        self.compressor.submit(step_writer.compress, segment)
+
+    def close(self, status):
+        self.info["finished"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.info["status"] = status
+        self._save_info()
+        # 壓縮留在背景完成，不阻塞 UI
+        self.compressor.shutdown(wait=False)
+
+
+class StepLogReader:
+    """以 mmap 分頁讀取單一步驟的封存日誌"""
+
+    def __init__(self, step_dir, cache_dir):
+        self.step_dir = step_dir
+        self.cache_dir = cache_dir
+        self.reload()
+
+    def reload(self):
+        index = read_json(os.path.join(self.step_dir, "index.json"), {"segments": []})
+        self.segments = index["segments"]
+        for segment in self.segments:
+            if segment.get("active"):
+                # 寫入中的分段：行數以實際內容為準
+                segment["lines"] = self._count_lines(segment)
+        self.total_lines = sum(s["lines"] for s in self.segments)
+
+    def _segment_path(self, segment):
+        path = os.path.join(self.step_dir, segment["file"])
+        if not segment.get("compressed"):
+            if os.path.exists(path):
+                return path
+            # 可能剛被背景壓縮
+            path += ".gz"
+            if not os.path.exists(path):
+                return None
+        # 壓縮分段先解壓到快取檔，之後同樣以 mmap 讀取
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_name = os.path.basename(self.step_dir) + "_" + os.path.basename(path)[:-3]
+        cache_path = os.path.join(self.cache_dir, cache_name)
+        if not os.path.exists(cache_path):
+            with gzip.open(path, "rb") as f_in, open(cache_path + ".tmp", "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            os.replace(cache_path + ".tmp", cache_path)
+        else:
+            # 以修改時間記錄最後使用時間 (atime 常被停用)，清除快取時保留最近用過的分段
+            os.utime(cache_path)
+        return cache_path
+
+    def _open_map(self, segment):
+        path = self._segment_path(segment)
+        if not path or os.path.getsize(path) == 0:
+            return None, None
+        f = open(path, "rb")
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _count_lines(self, segment):
+        f, mm = self._open_map(segment)
+        if mm is None:
+            return 0
+        try:
+            count, pos = 0, mm.find(b"\n")
+            while pos != -1:
+                count += 1
+                pos = mm.find(b"\n", pos + 1)
+            return count
+        finally:
+            mm.close()
+            f.close()
+
+    def read_lines(self, start, count):
+        """讀取第 start 行 (從 0 開始) 起最多 count 行"""
+        lines = []
+        for segment in self.segments:
+            if len(lines) >= count:
+                break
+            seg_end = segment["first_line"] + segment["lines"]
+            if start >= seg_end:
+                continue
+            local = max(0, start - segment["first_line"])
+            lines.extend(self._read_segment(segment, local, count - len(lines)))
+            start = seg_end
+        return lines
+
+    def _read_segment(self, segment, local_start, count):
+        f, mm = self._open_map(segment)
+        if mm is None:
+            return []
+        try:
+            # 從最近的位移標記開始往後找，不必從頭掃描整個分段
+            marks = segment.get("marks", [0])
+            mark_idx = min(local_start // MARK_EVERY, len(marks) - 1)
+            pos = marks[mark_idx]
+            for _ in range(local_start - mark_idx * MARK_EVERY):
+                pos = mm.find(b"\n", pos) + 1
+                if pos == 0:
+                    return []
+            lines = []
+            while len(lines) < count and pos < len(mm):
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = len(mm)
+                lines.append(mm[pos:end].decode("utf-8", errors="replace"))
+                pos = end + 1
+            return lines
+        finally:
+            mm.close()
+            f.close()
+
+
+class LogArchive:
+    """瀏覽 logs/ 底下的歷史執行"""
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.cache_dir = os.path.join(base_dir, ".cache")
+
+    def list_runs(self):
+        """由新到舊回傳各次執行的 run.json 內容"""
+        if not os.path.isdir(self.base_dir):
+            return []
+        runs = []
+        for name in sorted(os.listdir(self.base_dir), reverse=True):
+            info = read_json(os.path.join(self.base_dir, name, "run.json"))
+            if info:
+                info["run_id"] = name
+                runs.append(info)
+        return runs
+
+    def step_durations(self, flow_key, limit=20):
+        """該流程最近 limit 次執行中，每個步驟成功時的耗時：{(步驟索引, module): [秒數 (由新到舊)]}"""
+        durations = {}
+        if not os.path.isdir(self.base_dir):
+            return durations
+        found = 0
+        for name in sorted(os.listdir(self.base_dir), reverse=True):
+            # 目錄名稱為 <時間>_<流程>[_n]，先以名稱過濾，不必讀取其他流程的 run.json
+            if found >= limit or f"_{_dir_name(flow_key)}" not in name:
+                continue
+            info = read_json(os.path.join(self.base_dir, name, "run.json"))
+            if not info or info.get("flow") != flow_key:
+                continue
+            found += 1
+            for idx, step in enumerate(info.get("steps", [])):
+                stats = step.get("stats") or {}
+                if step.get("status") == "finished" and "wall_s" in stats:
+                    # 連同 module 作為鍵，流程步驟調整順序後不會對到別的步驟
+                    durations.setdefault((idx, step.get("module", "")), []).append(stats["wall_s"])
+        return durations
+
+    def list_steps(self, run_id):
+        """回傳 (步驟索引, 步驟目錄名稱)"""
+        run_dir = os.path.join(self.base_dir, run_id)
+        steps = []
+        for name in sorted(os.listdir(run_dir)):
+            if name.startswith("step_") and os.path.isdir(os.path.join(run_dir, name)):
+                steps.append((int(name[5:]) - 1, name))
+        return steps
+
+    def open_step(self, run_id, step_dir_name):
+        self.prune_cache(keep=run_id)
+        return StepLogReader(os.path.join(self.base_dir, run_id, step_dir_name), os.path.join(self.cache_dir, run_id))
+
+    def release_run(self, run_id):
+        """檢視器不再瀏覽該次執行：刪除它的解壓快取"""
+        shutil.rmtree(os.path.join(self.cache_dir, run_id), ignore_errors=True)
+
+    def prune_cache(self, max_bytes=CACHE_MAX_BYTES, keep=None):
+        """解壓快取超過 max_bytes 時，從最久沒用的檔案開始刪除 (keep 這次執行的檔案不刪)，回傳刪除的檔案數"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        keep_dir = os.path.join(self.cache_dir, keep) if keep else None
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            if keep_dir and os.path.dirname(path) == keep_dir:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # Windows 上仍被其他視窗映射的檔案
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            for name in os.listdir(self.cache_dir):
+                try:
+                    os.rmdir(os.path.join(self.cache_dir, name)) # 只刪除已清空的目錄
+                except OSError:
+                    pass
+        return removed
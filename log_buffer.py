@@ -0,0 +1,50 @@
+class LogBuffer:
+    """
+    固定容量的日誌環狀緩衝區。
+
+    只保留最新的 capacity 行，記憶體用量不會隨輸出量成長。
+    每一行有一個遞增的序號 (seq)，最舊一行的序號為 first_seq，
+    畫面以序號記住捲動位置，舊資料被覆蓋時也不會錯位。
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = max(1, int(capacity))
+        self.clear()
+
+    def clear(self):
+        self.lines = [None] * self.capacity
+        self.head = 0 # 最舊一行在 self.lines 中的位置
+        self.count = 0
+        self.first_seq = 0
+        self.partial = "" # 尚未收到換行的尾段
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def end_seq(self):
+        """下一行的序號"""
+        return self.first_seq + self.count
+
+    def _push(self, line):
+        if self.count < self.capacity:
+            self.lines[(self.head + self.count) % self.capacity] = line
+            self.count += 1
+        else:
+            # 已滿：覆蓋最舊的一行
+            self.lines[self.head] = line
+            self.head = (self.head + 1) % self.capacity
+            self.first_seq += 1
+
+    def append(self, text):
+        """加入一段文字，依換行拆成多行"""
+        parts = (self.partial + text).split("\n")
+        self.partial = parts.pop()
+        for line in parts:
+            self._push(line)
+
+    def get_range(self, start, count):
+        """取得第 start 行 (相對於最舊一行) 起最多 count 行"""
+        start = max(0, start)
+        end = min(self.count, start + count)
+        return [self.lines[(self.head + i) % self.capacity] for i in range(start, end)]
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import deque
+
+
+class LogPump:
+    """
+    讀取執行緒與 Tk 之間的日誌通道。
+
+    讀取執行緒呼叫 put() 放入佇列；Tk 端只有一個週期性的 after 回呼，
+    每個畫面週期把佇列批次取出後依 key (例如流程實例) 分組，每組呼叫一次 sink(text, key)。
+    佇列滿時依 overflow 設定處理：
+    - "block"：讓輸出端等待 (背壓)，子進程寫滿管線後自然放慢
+    - "drop"：丟棄最舊的行，並在日誌中回報丟棄的行數
+    """
+
+    def __init__(self, root, sink, frame_ms=50, frame_budget_ms=8, max_lines_per_frame=2000,
+                 queue_limit=10000, overflow="block"):
+        self.root = root
+        self.sink = sink
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.dropped = 0 # 尚未回報的丟棄行數
+        self.dropped_total = 0
+        self.after_id = None
+        self.configure(frame_ms, frame_budget_ms, max_lines_per_frame, queue_limit, overflow)
+
+    def configure(self, frame_ms=50, frame_budget_ms=8, max_lines_per_frame=2000, queue_limit=10000, overflow="block"):
+        if overflow not in ("block", "drop"):
+            raise ValueError(f"Unknown log overflow policy '{overflow}'")
+        with self.cond:
+            self.frame_ms = max(1, int(frame_ms))
+            self.frame_budget = frame_budget_ms / 1000
+            self.max_lines_per_frame = max(1, int(max_lines_per_frame))
+            self.queue_limit = max(1, int(queue_limit))
+            self.overflow = overflow
+            self.cond.notify_all()
+
+    def start(self):
+        if self.after_id is None:
+            self.after_id = self.root.after(self.frame_ms, self._drain)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def put(self, message, key=None):
+        """可從任何執行緒呼叫"""
+        with self.cond:
+            if len(self.queue) >= self.queue_limit:
+                if self.overflow == "drop":
+                    self.queue.popleft()
+                    self.dropped += 1
+                    self.dropped_total += 1
+                elif threading.current_thread() is not threading.main_thread():
+                    # Tk 主執行緒負責消化佇列，不能讓它自己等待
+                    while len(self.queue) >= self.queue_limit and self.overflow == "block":
+                        self.cond.wait()
+            self.queue.append((key, message))
+
+    def _drain(self):
+        deadline = time.perf_counter() + self.frame_budget
+        batches = {} # key -> 行 (dict 保留各 key 第一次出現的順序)
+        count = 0
+        with self.cond:
+            if self.dropped:
+                batches[None] = [f"[LOG] {self.dropped} line(s) dropped, output was faster than the UI could display\n"]
+                self.dropped = 0
+            while self.queue and count < self.max_lines_per_frame:
+                key, message = self.queue.popleft()
+                batches.setdefault(key, []).append(message)
+                count += 1
+                # 每 256 行檢查一次時間預算，避免計時本身成為負擔
+                if count % 256 == 0 and time.perf_counter() > deadline:
+                    break
+            self.cond.notify_all()
+        try:
+            for key, lines in batches.items():
+                self.sink("".join(lines), key)
+        finally:
+            # sink 拋出例外 (例如視窗關閉中的 TclError) 時仍繼續排程，否則佇列不再消化，block 模式下所有步驟都會卡住
+            self.after_id = self.root.after(self.frame_ms, self._drain)
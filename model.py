@@ -1,47 +1,241 @@
-import json
-import os
-import sys
+from config_loader import GLOBAL_CONFIG_FILE, STEP_DEFAULT_KEYS, diff_flows, diff_steps, get_loader
+from flow_graph import FlowGraph
+from run_journal import steps_digest
+from log_buffer import LogBuffer
+
+KEEP_FINISHED_INSTANCES = 50 # 已結束的實例最多保留幾個 (供切換檢視)
+
+def parse_params(items):
+    """["site=tpe", "date=2024-01-01"] -> {"site": "tpe", "date": "2024-01-01"}"""
+    params = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"Expected KEY=VALUE, got '{item}'")
+        params[key.strip()] = value
+    return params
+
+
+class FlowInstance:
+    """
+    一次流程執行 (實例)。
+
+    建立時複製流程、起點、斬斷的連接線與參數，之後編輯畫面的變動不影響執行中的實例。
+    每個實例有自己的節點狀態、日誌緩衝區與中止旗標，可同時執行多個。
+    """
+
+    def __init__(self, instance_id, flow_key, steps, graph, start_idx, disabled_lines, params, label, log_lines, profile=False,
+                 step_defaults=None, completed_steps=()):
+        self.id = instance_id
+        self.flow_key = flow_key
+        self.steps = steps
+        self.graph = graph
+        self.selected_start_idx = start_idx
+        self.disabled_lines = set(disabled_lines)
+        self.params = dict(params)
+        self.label = label
+        self.profile = profile # 所有步驟都以 cProfile 執行 (步驟也可個別設定 "profile")
+        self.step_defaults = dict(step_defaults or {}) # 流程層級的 timeout / idle_timeout / on_timeout
+        self.completed_steps = set(completed_steps) # 從中斷的執行繼續時，已完成而不再執行的步驟
+        self.resumed_from = None # 從中斷的執行繼續時，原本的檢查點檔案
+        self.status = "queued" # queued / running / success / error / timeout / stopped / cut
+        self.stop_requested = False
+        self.step_states = graph.initial_states(start_idx)
+        self.active_lines = set() # 通往執行中步驟的連接線
+        self.running_tasks = {} # 步驟索引 -> 執行中的任務
+        self.step_stats = {} # 步驟索引 -> 遙測 (開始 / 結束時間、耗時、CPU、峰值記憶體、輸出量、結束碼)
+        self.started_at = None
+        self.step_profiles = {} # 步驟索引 -> profile 中自身耗時最多的函式
+        self.step_events = {} # 步驟索引 -> 任務事件的彙總 (進度、計數、指標、artifact，見 task_events.py)
+        self.run_log = None # 本次執行的日誌封存
+        self.journal = None # 本次執行的檢查點日誌 (見 run_journal.py)
+        self.artifacts = None # 本次執行的 artifact 目錄 (見 artifact_store.py)
+        self.artifacts_from = None # 從中斷的執行繼續時，沿用的 artifact 目錄
+        self.log_buffer = LogBuffer(log_lines)
+        self.summary = None
+
+    @property
+    def is_running(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def title(self):
+        label = f" {self.label}" if self.label else ""
+        return f"#{self.id} {self.flow_key}{label}"
+
+    def run_targets(self):
+        return self.graph.run_targets(self.selected_start_idx)
+
+    def initial_step_states(self):
+        return self.graph.initial_states(self.selected_start_idx)
+
+    def step_setting(self, idx, name, default=None):
+        """步驟的設定值；步驟沒有設定時取流程層級的預設值"""
+        return self.steps[idx].get(name, self.step_defaults.get(name, default))
+
 
 class WorkflowModel:
     def __init__(self):
-        self.config = self.load_config_from_file()
+        self.loader = get_loader()
+        self.flow_index = self.load_flow_index() # 流程 key -> 摘要；流程內容在選取時才讀取
         self.global_config = self.load_global_config()
-        self.python_path = self.global_config.get("python_path", "python") # 預設使用系統 python
+        self.apply_global_config()
+        self.log_lines = self.global_config.get("log_buffer_lines", 10000) # 日誌區只保留最新的 N 行
+        self.editor_log_buffer = LogBuffer(self.log_lines)
+        self.log_buffer = self.editor_log_buffer # 日誌區目前顯示的緩衝區 (編輯畫面或某個實例)
+        self.current_flow_key = None
+        self.current_flow_data = None
         self.current_flow_steps = []
+        self.flow_graph = FlowGraph([])
         self.selected_start_idx = 0
-        self.is_running = False
-        self.stop_requested = False
-        self.disabled_lines = set()
-
-    def load_config_from_file(self):
-        if getattr(sys, 'frozen', False):
-            # 打包後：讀取執行檔同級目錄的configs目錄
-            base_path = os.path.join(os.path.dirname(sys.executable), 'configs')
-        else:
-            # 開發時：讀取腳本所在目錄的configs目錄
-            base_path = os.path.join(os.path.dirname(__file__),'configs')
-        
-        filename = os.path.join(base_path, "config.json")
-        if os.path.exists(filename):
-            with open(filename, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {}
-    
+        self.disabled_lines = set() # 被斬斷的連接線 (來源索引, 目標索引)
+        self.instances = {} # 實例編號 -> FlowInstance (依建立順序)
+        self.next_instance_id = 1
+        self.active_instance = None # 畫面上顯示的實例；None 代表編輯畫面
+
+    def apply_global_config(self):
+        """將 global_config 的內容套用為執行設定 (啟動時與設定視窗關閉後呼叫)"""
+        self.python_path = self.global_config.get("python_path", "python") # 預設使用系統 python
+        self.max_parallel_steps = self.global_config.get("max_parallel_steps", 4) # 所有實例合計可同時執行的步驟數上限
+        self.max_concurrent_flows = self.global_config.get("max_concurrent_flows", 4) # 可同時執行的流程實例數上限
+        # 常駐 worker 直譯器池 (步驟設定 "executor": "worker" 時使用)
+        self.worker_pool_size = self.global_config.get("worker_pool_size", self.max_parallel_steps)
+        self.worker_max_tasks = self.global_config.get("worker_max_tasks", 50) # 執行滿 N 個任務後回收
+        # fork server 啟動時預先 import 的模組 (步驟設定 "executor": "fork" 時使用)
+        self.preload_modules = self.global_config.get("preload_modules", [])
+        # 日誌輸出通道：每個畫面週期批次寫入一次，來不及消化時阻塞或丟棄
+        self.log_pump_settings = {
+            "frame_ms": self.global_config.get("log_frame_ms", 50),
+            "frame_budget_ms": self.global_config.get("log_frame_budget_ms", 8),
+            "max_lines_per_frame": self.global_config.get("log_max_lines_per_frame", 2000),
+            "queue_limit": self.global_config.get("log_queue_limit", 10000),
+            "overflow": self.global_config.get("log_overflow", "block"),
+        }
+        # 每次執行的日誌封存目錄與分段大小
+        self.log_dir = self.global_config.get("log_dir", "logs")
+        self.log_segment_bytes = self.global_config.get("log_segment_mb", 16) * 1024 * 1024
+        # 步驟結果快取 (步驟宣告 "cache" 時使用)
+        self.cache_dir = self.global_config.get("cache_dir", "cache")
+        self.cache_max_bytes = self.global_config.get("cache_max_mb", 1024) * 1024 * 1024
+        # 執行中流程的檢查點目錄 (程式中斷後可繼續執行)；空字串為停用
+        self.journal_dir = self.global_config.get("journal_dir", "runs")
+        # 步驟間交換資料的 artifact 目錄 (每次執行一個子目錄，結束後刪除)
+        self.artifact_dir = self.global_config.get("artifact_dir", "artifacts")
+        # 遠端 worker agent (步驟設定 "placement" 時使用)；密鑰檔為空字串時使用環境變數 WORKFLOW_AGENT_SECRET
+        self.agents = self.global_config.get("agents", [])
+        self.agent_secret_file = self.global_config.get("agent_secret_file", "")
+        # 設定目錄的比對間隔 (秒)；Linux 上本機修改另由 inotify 立即通知
+        self.config_poll_s = self.global_config.get("config_poll_s", 2)
+
+    def load_flow_index(self):
+        """流程索引 (key、標題、描述、步驟數)；檔案未變動時直接取用快取"""
+        return self.loader.flow_index()
+
     def load_global_config(self):
-        # 使用與 load_config_from_file 相同的邏輯
-        if getattr(sys, 'frozen', False):
-            base_path = os.path.join(os.path.dirname(sys.executable), 'configs')
-        else:
-            base_path = os.path.join(os.path.dirname(__file__), 'configs')
-            
-        filename = os.path.join(base_path, "global_config.json")
-        if os.path.exists(filename):
-            with open(filename, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {}
+        """全域設定 (configs/global_config.json)；檔案未變動時直接取用快取"""
+        return self.loader.load(GLOBAL_CONFIG_FILE, {})
+
+    def reload_config(self):
+        """
+        重新讀取設定檔 (未變動的檔案取自快取)，回傳 (全域設定是否變動, 新增, 刪除, {變動的流程: 變動的步驟索引})。
+        只比較流程索引與目前選取的流程內容，其他流程的內容仍等到選取時才讀取。
+        已建立的實例保留建立時的步驟與相依圖，不受影響。
+        """
+        index = self.load_flow_index()
+        global_config = self.load_global_config()
+        global_changed = global_config is not self.global_config
+        if global_changed:
+            self.global_config = global_config
+            self.apply_global_config()
+        added, removed, changed = ([], [], []) if index is self.flow_index else diff_flows(self.flow_index, index)
+        self.flow_index = index
+        changed = {key: set() for key in changed}
+        key = self.current_flow_key
+        if key is not None and key in index:
+            data = self.loader.flow_data(key)
+            if data is not None and data is not self.current_flow_data and data != self.current_flow_data:
+                changed[key] = diff_steps(self.current_flow_steps, data.get("steps") or [])
+        return global_changed, added, removed, changed
 
     def set_flow(self, flow_key):
-        if flow_key in self.config:
-            self.current_flow_steps = self.config[flow_key]["steps"]
-            return self.config[flow_key]
-        return None
\ No newline at end of file
+        # 取得驗證過的流程 (第一次選取時才讀取內容)，若設定有誤 (循環或未知步驟) 會拋出 ValueError
+        flow = self.loader.flow(flow_key)
+        if flow is None:
+            return None
+        return self.use_flow(flow)
+
+    def use_flow(self, flow):
+        """以驗證過的 FlowConfig 作為目前的流程，回傳流程內容"""
+        self.current_flow_key = flow.key
+        self.current_flow_data = flow.data
+        self.current_flow_steps = flow.steps
+        self.flow_graph = flow.graph
+        return flow.data
+
+    def clear_flow(self):
+        self.current_flow_key = None
+        self.current_flow_data = None
+        self.current_flow_steps = []
+        self.flow_graph = FlowGraph([])
+
+    def run_targets(self):
+        """本次要執行的步驟：從第一步開始為整個流程，否則為起點及其所有下游步驟"""
+        return self.flow_graph.run_targets(self.selected_start_idx)
+
+    def initial_step_states(self):
+        """尚未執行時各節點的狀態"""
+        return self.flow_graph.initial_states(self.selected_start_idx)
+
+    def param_sets(self, overrides=None):
+        """
+        目前流程要建立的實例參數：[(標籤, 參數)]。
+
+        流程可宣告預設的 "params"，以及 "param_sets" (每組建立一個實例)；
+        overrides (畫面或命令列輸入) 會覆蓋兩者。
+        """
+        flow = self.current_flow_data or {}
+        base = dict(flow.get("params", {}))
+        sets = flow.get("param_sets") or [{"label": "", "params": {}}]
+        return [(entry.get("label", ""), {**base, **entry.get("params", {}), **(overrides or {})}) for entry in sets]
+
+    def create_instance(self, params, label="", profile=False):
+        """以目前的流程、起點與斬斷的連接線建立一個實例"""
+        flow = self.current_flow_data or {}
+        instance = FlowInstance(self.next_instance_id, self.current_flow_key, self.current_flow_steps, self.flow_graph,
+                                self.selected_start_idx, self.disabled_lines, params, label, self.log_lines, profile,
+                                {key: flow[key] for key in STEP_DEFAULT_KEYS if key in flow})
+        self.instances[instance.id] = instance
+        self.next_instance_id += 1
+        # 已結束的實例只保留最新的幾個
+        finished = [i for i, inst in self.instances.items() if not inst.is_running and inst is not self.active_instance]
+        for instance_id in finished[:max(0, len(finished) - KEEP_FINISHED_INSTANCES)]:
+            del self.instances[instance_id]
+        return instance
+
+    def resume_instance(self, run):
+        """
+        由中斷執行的檢查點 (run_journal.incomplete_runs 的一筆) 建立實例：已完成的步驟不再執行。
+        流程已不存在、內容已修改或設定有誤時拋出 ValueError。
+        """
+        flow = self.loader.flow(run["flow"])
+        if flow is None:
+            raise ValueError(f"flow '{run['flow']}' no longer exists")
+        if steps_digest(flow.steps) != run["digest"]:
+            raise ValueError(f"the steps of flow '{run['flow']}' changed after the run started")
+        instance = FlowInstance(self.next_instance_id, flow.key, flow.steps, flow.graph, run["start_step"],
+                                {tuple(edge) for edge in run["disabled_lines"]}, run["params"], run["label"], self.log_lines,
+                                run["profile"], {key: flow.data[key] for key in STEP_DEFAULT_KEYS if key in flow.data},
+                                run["completed"])
+        instance.resumed_from = run["path"]
+        instance.artifacts_from = run.get("artifacts")
+        self.instances[instance.id] = instance
+        self.next_instance_id += 1
+        return instance
+
+    def running_instances(self):
+        return [instance for instance in self.instances.values() if instance.is_running]
+
+    def show_instance(self, instance):
+        """切換畫面顯示的實例 (None 為編輯畫面)"""
+        self.active_instance = instance
+        self.log_buffer = instance.log_buffer if instance else self.editor_log_buffer
@@ -1,12 +1,59 @@
 import threading
-import importlib
 import time
 import sys
-import os
 from tkinter import messagebox
-import subprocess
+import shlex
+import statistics
+from engine import WorkflowEngine
+from model import parse_params
+from log_pump import LogPump
+from log_archive import LogArchive
 from view_setting import SettingsView
 from view_help import HelpView
+from view_log_archive import LogArchiveView
+from config_watcher import ConfigWatcher
+from run_journal import discard, incomplete_runs
+
+HISTORY_RUNS = 20 # 節點提示中的耗時統計取最近幾次執行
+
+
+def format_seconds(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes < 60 else f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+def format_stats(stats):
+    """步驟遙測的一行摘要 (節點提示用)"""
+    if stats.get("cached"):
+        return f"this run: restored from cache in {format_seconds(stats['wall_s'])}"
+    parts = [f"this run: {format_seconds(stats['wall_s'])}"]
+    if "user_s" in stats:
+        parts.append(f"CPU {stats['user_s']:.1f}s user / {stats['sys_s']:.1f}s sys")
+    if "max_rss_kb" in stats:
+        parts.append(f"peak RSS {stats['max_rss_kb'] / 1024:.0f} MB")
+    parts.append(f"output {stats.get('output_bytes', 0) / 1024:.0f} KB")
+    parts.append(f"exit {stats.get('exit_code')}")
+    if "agent" in stats:
+        parts.append(f"on {stats['agent']}")
+    elif "agents" in stats:
+        parts.append(f"on {', '.join(stats['agents'])}")
+    return "  ·  ".join(parts)
+
+def format_events(summary):
+    """任務回報的進度、計數、指標與 artifact (節點提示用)"""
+    lines = []
+    if "progress" in summary:
+        message = summary.get("message")
+        lines.append(f"progress: {summary['progress']:.0%}" + (f"  ·  {message}" if message else ""))
+    values = {**summary.get("counters", {}), **summary.get("metrics", {})}
+    if values:
+        lines.append("  ·  ".join(f"{name}: {value:,}" if isinstance(value, int) else f"{name}: {value}" for name, value in values.items()))
+    artifacts = summary.get("artifacts")
+    if artifacts:
+        lines.append("artifacts: " + ", ".join(f"{name} ({(size or 0) / 1024 / 1024:.1f} MB)" for name, size in artifacts.items()))
+    return "\n".join(lines)
 
 class WorkflowPresenter:
     def __init__(self, root):
@@ -14,204 +61,351 @@ class WorkflowPresenter:
         self.model = None 
         self.view = None
         self.is_animating = False
-        self.active_line_idx = -1
-        self.current_process = None # 儲存當前子進程引用
-        self.current_step_index = -1 # 追蹤目前執行的步驟索引
+        self.engine = None # 流程執行引擎 (與命令列共用)
+        self.duration_history = {} # 流程 -> 歷次執行的步驟耗時 (見 LogArchive.step_durations)
+        self.timeline_after_id = None
+        self.config_watcher = None # 設定目錄被修改時熱重新載入
 
     def init_app(self, model, view):
         self.model = model
         self.view = view
-        self.view.combo['values'] = list(self.model.config.keys())
+        self.view.flow_picker.set_flows(self.model.flow_index)
+        self.log_pump = LogPump(self.view.root, self._write_log, **self.model.log_pump_settings)
+        self.log_pump.start()
+        self.engine = WorkflowEngine(self.model, log=self.log_to_view, on_status=self._on_status, on_states=self._on_states,
+                                     on_state=self._on_state, on_step_start=self._on_step_start, on_step_error=self._on_step_error,
+                                     on_step_event=self._on_step_event)
         self.view.start_welcome_animation()
+        # 監看執行緒只通知，重新載入在主執行緒進行
+        self.config_watcher = ConfigWatcher(self.model.loader.directory, lambda names: self.view.root.after(0, self.reload_config),
+                                            self.model.config_poll_s)
+        self.config_watcher.start()
+        # 上次程式或電腦中斷時未執行完的流程
+        self.view.root.after(500, self.offer_resume)
 
     def handle_flow_change(self, flow_key):
         self.view.stop_welcome_animation()
-        if self.model.is_running:
-            self.model.stop_requested = True
-        self.is_animating = False
-        data = self.model.set_flow(flow_key)
+        # 切換流程回到編輯畫面，執行中的實例不受影響
+        self.show_instance(None, redraw=False)
+        try:
+            data = self.model.set_flow(flow_key)
+        except ValueError as e:
+            self.model.clear_flow()
+            self.view.msg_desc.config(text="Please select a flow...")
+            self.view.draw_workflow(self.model.flow_graph, [])
+            messagebox.showerror("Error", f"Invalid flow '{flow_key}':\n{e}")
+            return
         if data:
             self.view.msg_desc.config(text=data["description"])
             self.model.selected_start_idx = 0
-            self.view.root.after(50, lambda: self.view.draw_workflow(self.model.current_flow_steps, 0))
+            self.model.disabled_lines = set() # 連接線以步驟索引為鍵，換流程後不再適用
+            self.view.root.after(50, self.draw_editor)
+
+    def draw_editor(self):
+        """繪製編輯畫面 (尚未執行的流程、起點與斬斷的連接線)"""
+        self.view.draw_workflow(self.model.flow_graph, self.model.initial_step_states(), self.model.disabled_lines)
 
     def handle_node_click(self, idx):
-        if not self.model.is_running:
+        if self.model.active_instance is None:
             self.model.selected_start_idx = idx
-            self.view.update_node_colors(-1, -1, idx)
+            self.view.set_node_states(self.model.initial_step_states())
 
     def handle_hover(self, event, idx, entering):
-        if self.model.is_running: return
-        if entering:
-            step = self.model.current_flow_steps[idx]
-            text = f"【 {step['name']} 】\nfunc: {step.get('overview', 'no description')}"
-            self.view.show_tooltip(event, text)
-        else:
+        if not entering:
             self.view.show_tooltip(event, None)
+            return
+        instance = self.model.active_instance
+        steps = instance.steps if instance else self.model.current_flow_steps
+        flow_key = instance.flow_key if instance else self.model.current_flow_key
+        step = steps[idx]
+        text = f"【 {step['name']} 】\nfunc: {step.get('overview', 'no description')}"
+        # 最近幾次成功執行的耗時 (由新到舊)
+        durations = self.step_durations(flow_key).get((idx, step.get("module", "")))
+        if durations:
+            text += f"\nlast: {format_seconds(durations[0])}  ·  median: {format_seconds(statistics.median(durations))} ({len(durations)} runs)"
+        stats = instance.step_stats.get(idx) if instance else None
+        if stats and "wall_s" in stats:
+            text += "\n" + format_stats(stats)
+        events = instance.step_events.get(idx) if instance else None
+        if events:
+            text += "\n" + format_events(dict(events))
+        top = instance.step_profiles.get(idx) if instance else None
+        if top:
+            text += "\nprofile: " + ", ".join(f"{row['function']} {row['own_s']:.2f}s" for row in top[:3])
+        self.view.show_tooltip(event, text)
+
+    def step_durations(self, flow_key):
+        """讀取並快取流程的歷次步驟耗時；實例結束後才重新讀取"""
+        if flow_key not in self.duration_history:
+            self.duration_history[flow_key] = LogArchive(self.model.log_dir).step_durations(flow_key, HISTORY_RUNS)
+        return self.duration_history[flow_key]
 
     def handle_run_click(self):
+        """以目前的流程與參數建立實例並開始執行 (流程宣告 param_sets 時每組一個實例)"""
         if not self.model.current_flow_steps: return
-        self.view.btn_run.config(state="disabled")
-        self.view.toggle_combobox_state(False)
-        threading.Thread(target=self.execute_workflow, daemon=True).start()
+        try:
+            overrides = parse_params(shlex.split(self.view.var_params.get()))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid params:\n{e}")
+            return
+        profile = self.view.var_profile.get()
+        instances = [self.model.create_instance(params, label, profile) for label, params in self.model.param_sets(overrides)]
+        for instance in instances:
+            threading.Thread(target=self.execute_workflow, args=(instance,), daemon=True).start()
+        self.show_instance(instances[0])
+        if not self.is_animating:
+            self.is_animating = True
+            self.trigger_animation()
+
+    def offer_resume(self):
+        """啟動時詢問是否繼續中斷的執行：是=從未完成的步驟繼續、否=捨棄、取消=下次再問"""
+        runs = incomplete_runs(self.model.journal_dir) if self.model.journal_dir else []
+        if not runs:
+            return
+        lines = "\n".join(f"• {run['flow']}{' ' + run['label'] if run['label'] else ''} (started {run['started']}, "
+                          f"{len(run['completed'])}/{run['steps']} steps done)" for run in runs)
+        answer = messagebox.askyesnocancel("Resume", f"{len(runs)} run(s) did not finish last time:\n\n{lines}\n\n"
+                                           "Yes: resume them from the unfinished steps\nNo: discard them\nCancel: ask again next time")
+        if answer is None:
+            return
+        instances = []
+        for run in runs:
+            if not answer:
+                discard(run["path"])
+                continue
+            try:
+                instances.append(self.model.resume_instance(run))
+            except ValueError as e:
+                discard(run["path"])
+                self.log_to_view(None, f"[{time.strftime('%H:%M:%S')}] [WARN] Cannot resume the run of {run['flow']} started {run['started']}: {e}\n")
+        if not instances:
+            return
+        for instance in instances:
+            threading.Thread(target=self.execute_workflow, args=(instance,), daemon=True).start()
+        self.show_instance(instances[0])
+        if not self.is_animating:
+            self.is_animating = True
+            self.trigger_animation()
+
+    def handle_instance_select(self, position):
+        instances = list(self.model.instances.values())
+        if position < len(instances):
+            self.show_instance(instances[position])
+
+    def show_instance(self, instance, redraw=True):
+        """切換畫面顯示的實例 (None 為編輯畫面)：畫布、節點狀態與日誌一併切換"""
+        self.model.show_instance(instance)
+        self.view.reset_line_styles()
+        events = instance.step_events if instance else {}
+        self.view.set_node_progresses({i: summary["progress"] for i, summary in list(events.items()) if "progress" in summary})
+        if redraw:
+            if instance is None:
+                self.draw_editor()
+            else:
+                self.view.draw_workflow(instance.graph, instance.step_states, instance.disabled_lines)
+        self.view.show_log()
+        self.refresh_instances()
+        if self.timeline_after_id:
+            self.view.root.after_cancel(self.timeline_after_id)
+            self.timeline_after_id = None
+        self._draw_timeline()
+
+    def refresh_instances(self):
+        instances = list(self.model.instances.values())
+        titles = [f"{instance.title}  [{instance.status}]" for instance in instances]
+        active = self.model.active_instance
+        self.view.set_instances(titles, instances.index(active) if active in instances else None)
+
+    def refresh_timeline(self, delay=0):
+        """delay 毫秒後重繪時間軸；已排定的重繪會合併，狀態頻繁變化時不必每次重畫"""
+        if self.timeline_after_id is None:
+            self.timeline_after_id = self.view.root.after(delay, self._draw_timeline)
+
+    def _draw_timeline(self):
+        self.timeline_after_id = None
+        instance = self.model.active_instance
+        if instance is None or instance.started_at is None:
+            self.view.draw_timeline([], 0)
+            return
+        now = time.time()
+        rows = []
+        for i, stats in sorted(list(instance.step_stats.items()), key=lambda item: item[1]["started"]):
+            rows.append((str(i + 1), stats["started"] - instance.started_at, stats.get("finished", now) - instance.started_at, instance.step_states[i]))
+        if instance.status == "running":
+            self.view.draw_timeline(rows, now - instance.started_at)
+            # 執行中步驟的長條隨時間變長
+            self.refresh_timeline(1000)
+        else:
+            self.view.draw_timeline(rows, max([end for _, _, end, _ in rows] + [0]))
 
     def trigger_animation(self):
-        self.view.animate_lines_step(self.active_line_idx, self.is_animating)
+        active = self.model.active_instance
+        self.view.animate_lines_step(active.active_lines if active else set(), self.is_animating)
     
-    def log_to_view(self, message):
-        """確保跨執行緒安全地更新 UI"""
-        self.view.root.after(0, lambda: self.view.write_log(message))
-
-    def handle_line_cancel(self, line_idx):
-        """處理取消線段"""
-        if self.model.is_running: return
-        self.model.disabled_lines.add(line_idx)
+    def log_to_view(self, instance, message):
+        """確保跨執行緒安全地更新 UI (經由 LogPump 批次寫入)"""
+        self.log_pump.put(message, instance.id if instance else None)
+
+    def _write_log(self, text, key):
+        """LogPump 的輸出端：顯示中的實例寫入日誌區，其他實例只寫入各自的緩衝區"""
+        instance = self.model.instances.get(key)
+        if instance is None or instance is self.model.active_instance:
+            self.view.write_log(text)
+        else:
+            instance.log_buffer.append(text)
+
+    def handle_line_cancel(self, edge):
+        """處理取消線段 (edge: 來源索引, 目標索引)"""
+        if self.model.active_instance is not None: return
+        self.model.disabled_lines.add(edge)
         # 立即重繪
-        self.view.draw_workflow(self.model.current_flow_steps, self.model.selected_start_idx)
+        self.draw_editor()
         self.view._perform_hide_icon() # 隱藏圖示
 
     def handle_help_click(self):
         """開啟說明書"""
+        # 設定檔未變動時取自快取，不必每次重新讀檔
         global_config = self.model.load_global_config()
         manual_text = global_config.get("manual", "")
         HelpView(self.view.root, manual_text, self.view.colors)
 
 
+    def handle_history_click(self):
+        """開啟歷史執行日誌"""
+        LogArchiveView(self.view.root, LogArchive(self.model.log_dir), self.view.colors)
+
     def handle_setting_click(self):
         """開啟設定視窗並在關閉後刷新狀態"""
         sv = SettingsView(self.view.root, self.view.colors)
         self.view.root.wait_window(sv)
-        
-        # 重新讀取設定
-        self.model.config = self.model.load_config_from_file()
-        self.model.global_config = self.model.load_global_config()
-        self.model.python_path = self.model.global_config.get("python_path", "python")
-        
-        # 更新下拉選單
-        current_flows = list(self.model.config.keys())
-        self.view.combo['values'] = current_flows
-        
-        # 檢查當前選擇的流程是否還存在
-        current_selection = self.view.combo.get()
-        if current_selection and current_selection in current_flows:
-            # 重新載入該流程 (因為步驟可能變了)
-            self.handle_flow_change(current_selection)
-        else:
-            # 若流程被刪除與重置
-            self.view.combo.set('')
+        self.reload_config()
+
+    def reload_config(self):
+        """
+        設定檔變動後 (檔案監看或設定視窗關閉) 只更新有變動的部分：
+        流程選單只重新索引有變動的流程，目前的流程有變動才重繪 (只重建變動的節點)。
+        執行中與已結束的實例保留建立時的設定。
+        """
+        try:
+            global_changed, added, removed, changed = self.model.reload_config()
+        except (OSError, ValueError) as e:
+            # 檔案寫到一半或格式錯誤：保留目前的設定，等下一次變動
+            self.log_to_view(None, f"[{time.strftime('%H:%M:%S')}] [WARN] Config not reloaded: {e}\n")
+            return
+        if global_changed:
+            self.log_pump.configure(**self.model.log_pump_settings)
+            self.config_watcher.poll_s = max(0.1, float(self.model.config_poll_s))
+        self.view.flow_picker.set_flows(self.model.flow_index)
+        parts = [f"{label}: {', '.join(keys)}" for label, keys in (("added", added), ("removed", removed)) if keys]
+        for key, steps in changed.items():
+            parts.append(f"changed: {key}" + (f" (steps {', '.join(str(i + 1) for i in sorted(steps))})" if steps else ""))
+        if global_changed:
+            parts.append("global settings")
+        if parts:
+            self.log_to_view(None, f"[{time.strftime('%H:%M:%S')}] Config reloaded ({'; '.join(parts)})\n")
+
+        flow_key = self.model.current_flow_key
+        if flow_key is None:
+            return
+        if flow_key in removed:
+            self.view.flow_picker.set('')
             self.view.msg_desc.config(text="Please select a flow...")
-            self.model.current_flow_steps = []
-            self.view.draw_workflow([], 0)
+            self.model.clear_flow()
+            if self.model.active_instance is None:
+                self.view.draw_workflow(self.model.flow_graph, [])
+        elif flow_key in changed:
+            self._refresh_current_flow(flow_key)
+
+    def _refresh_current_flow(self, flow_key):
+        """目前的流程設定有變動：保留仍然有效的起點與斬斷的連接線，在編輯畫面時重繪"""
+        try:
+            data = self.model.set_flow(flow_key)
+        except ValueError as e:
+            # 修改後的流程無效時繼續顯示修改前的版本
+            self.log_to_view(None, f"[{time.strftime('%H:%M:%S')}] [WARN] Flow '{flow_key}' not reloaded: {e}\n")
+            return
+        self.view.msg_desc.config(text=data.get("description", ""))
+        if self.model.selected_start_idx >= len(self.model.current_flow_steps):
+            self.model.selected_start_idx = 0
+        self.model.disabled_lines &= set(self.model.flow_graph.edges)
+        if self.model.active_instance is None:
+            self.draw_editor()
 
     def handle_stop_click(self):
-        """處理中止按鈕"""
-        if not self.model.is_running: return
-        
-        self.model.stop_requested = True
-        
-        current_idx = self.current_step_index
-        next_idx = current_idx + 1
-        
-        # 顯示 Log 提示
-        timestamp = time.strftime('%H:%M:%S')
-        self.log_to_view(f"[{timestamp}] Step {current_idx + 1} is running, user stop, will take effect from the next step, stop execution step {next_idx + 1} and later process\n")
+        """處理中止按鈕：停止顯示中的實例；在編輯畫面時停止所有執行中的實例"""
+        active = self.model.active_instance
+        targets = [active] if active is not None else self.model.running_instances()
+        for instance in targets:
+            if not instance.is_running:
+                continue
+            self.engine.stop(instance)
+            running = ", ".join(str(i + 1) for i in sorted(instance.running_tasks))
+            # 顯示 Log 提示
+            timestamp = time.strftime('%H:%M:%S')
+            self.log_to_view(instance, f"[{timestamp}] Step {running} is running, user stop, will take effect after the running steps finish, no further steps will be started\n")
 
     def handle_reset_click(self):
-        if self.model.is_running: return
         self.model.selected_start_idx = 0
         self.model.disabled_lines = set() # 重置禁用線段
+        self.show_instance(None, redraw=False)
         self.view.reset_view_state()
         if self.model.current_flow_steps:
-            self.view.draw_workflow(self.model.current_flow_steps, 0)
-
-    def execute_workflow(self):
-        self.model.is_running = True
-        self.model.stop_requested = False
-        self.is_animating = True
-        self.active_line_idx = -1 # 重置動畫線條索引，避免殘留上一回的狀態
-        self.trigger_animation()
-
-        steps = self.model.current_flow_steps
-        python_bin = self.model.python_path # 從 model 讀取路徑
-        error_occurred_at = -1 # 追蹤錯誤位置
-
-        startupinfo = None
-        if os.name == 'nt': # 僅在 Windows 系統執行
-            startupinfo = subprocess.STARTUPINFO()
-            # 使用 dwFlags 設定隱藏視窗
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = 0 # 0 代表 SW_HIDE (隱藏)
-
-        for i in range(self.model.selected_start_idx, len(steps)):
-            if self.model.stop_requested: 
-                # 提示流程已停止
-                self.log_to_view(f"[{time.strftime('%H:%M:%S')}] Step {i} is running, user stop, will take effect from the next step, stop execution step {next_idx + 1} and later process\n")
-                self.view.root.after(0, lambda: messagebox.showinfo("Stop", "Process stopped"))
-                break
-            
-            # 檢查前一條線是否被斬斷 (若不是起點)
-            if i > 0 and (i-1) in self.model.disabled_lines:
-                self.log_to_view(f"[{time.strftime('%H:%M:%S')}] Process stopped at step {i} because the previous line was cut off.\n")
-                break
-
-            if i == self.model.selected_start_idx:
-                self.active_line_idx = -1
-            else:
-                self.active_line_idx = i - 1
-            
-            self.current_step_index = i # 更新目前步驟索引
-            self.view.root.after(0, lambda idx=i: self.view.update_node_colors(idx, -1, self.model.selected_start_idx))
-            # 視圖自動跟隨目前的節點
-            self.view.root.after(0, lambda idx=i: self.view.center_on_node(idx))
-            
-            try:
-                script_path = os.path.join("tasks", f"{steps[i]['module']}.py")
-                
-                # 使用 -u 開啟無緩衝模式，確保 print 內容即時回傳
-                self.current_process = subprocess.Popen(
-                    [python_bin, "-u", script_path],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    encoding="cp950",
-                    errors="replace", # 若解碼失敗，用特殊符號代替而非報錯
-                    bufsize=1, # 行緩衝模式
-                    startupinfo=startupinfo
-                )
-
-                # 讀取輸出
-                while True:
-                    line = self.current_process.stdout.readline()
-                    if not line and self.current_process.poll() is not None:
-                        break
-                    if line:
-                        # 修正：line 本身帶有 \n，strip() 後再由 log_to_view 處理
-                        timestamp = time.strftime('%H:%M:%S')
-                        self.log_to_view(f"[{timestamp}] {line.strip()}\n")
-
-                return_code = self.current_process.wait()
-
-                if return_code != 0:
-                    raise RuntimeError(f"Script execution failed, exit code: {return_code}")
-                
-            except Exception as e:
-                error_occurred_at = i
-                timestamp = time.strftime('%H:%M:%S')
-                self.log_to_view(f"[{timestamp}] [ERROR] Step {i+1} failed: {str(e)}\n")
-                # 立即反應錯誤節點顏色 (紅色)
-                self.view.root.after(0, lambda idx=i: self.view.update_node_colors(-1, idx, self.model.selected_start_idx))
-                self.view.root.after(0, lambda m=str(e): messagebox.showerror("Error", f"Step {i+1} execution failed:\n{m}"))
-                break
-        else:
-            if not self.model.stop_requested:
-                self.view.root.after(0, lambda: messagebox.showinfo("Complete", "Process completed successfully!"))
-               
-        # 結束後的狀態清理
-        self.model.is_running = False
-        self.is_animating = False
-        self.view.root.after(0, lambda: self.view.btn_run.config(state="normal"))
-        self.view.root.after(0, lambda: self.view.toggle_combobox_state(True))
-        
-        # 修正：只有在沒有錯誤發生時，才重置節點顏色
-        if error_occurred_at == -1:
-            self.view.root.after(0, lambda: self.view.update_node_colors(-1, -1, self.model.selected_start_idx))
\ No newline at end of file
+            self.draw_editor()
+
+    def execute_workflow(self, instance):
+        """於背景執行緒執行一個實例"""
+        self.engine.run(instance)
+        self.view.root.after(0, lambda: self._on_instance_finished(instance))
+
+    def _on_instance_finished(self, instance):
+        # 下次顯示節點提示時重新讀取歷次耗時 (含這一次)
+        self.duration_history.pop(instance.flow_key, None)
+        if instance is self.model.active_instance:
+            if instance.stop_requested:
+                messagebox.showinfo("Stop", f"{instance.title}: Process stopped")
+            elif instance.status == "success":
+                messagebox.showinfo("Complete", f"{instance.title}: Process completed successfully!")
+
+    # --- 引擎回呼 (由執行緒呼叫，一律經 root.after 交給 Tk 主執行緒，只更新顯示中的實例) ---
+
+    def _on_status(self, instance):
+        def update():
+            self.refresh_instances()
+            if instance is self.model.active_instance:
+                self.refresh_timeline()
+            if not self.model.running_instances():
+                # 下一個動畫週期會停止並還原線條樣式
+                self.is_animating = False
+        self.view.root.after(0, update)
+
+    def _when_active(self, instance, action):
+        """在 Tk 主執行緒執行 action，但只在該實例正顯示於畫面時"""
+        def run():
+            if instance is self.model.active_instance:
+                action()
+        self.view.root.after(0, run)
+
+    def _on_states(self, instance, states):
+        self._when_active(instance, lambda: self.view.set_node_states(states))
+
+    def _on_state(self, instance, idx, state):
+        """只把這一筆狀態變化通知畫面"""
+        def update():
+            self.view.set_node_state(idx, state)
+            self.refresh_timeline(200)
+        self._when_active(instance, update)
+
+    def _on_step_start(self, instance, idx):
+        # 視圖自動跟隨最新開始的節點
+        self._when_active(instance, lambda: self.view.center_on_node(idx))
+
+    def _on_step_event(self, instance, idx, event):
+        """任務回報進度時更新節點的進度條 (其他事件在節點提示中顯示)"""
+        if event["type"] != "progress":
+            return
+        value = instance.step_events.get(idx, {}).get("progress")
+        if value is not None:
+            self._when_active(instance, lambda: self.view.set_node_progress(idx, value))
+
+    def _on_step_error(self, instance, idx, message):
+        self._when_active(instance, lambda: messagebox.showerror("Error", f"{instance.title}: Step {idx+1} execution failed:\n{message}"))
@@ -0,0 +1,277 @@
+"""
+把步驟分派到其他電腦上的 worker agent (引擎端)。
+
+agent 清單在 global_config.json：
+    "agents": [{"name": "build1", "host": "10.0.0.5", "port": 7701, "tags": ["gpu"], "slots": 4}],
+    "agent_secret_file": "configs/agent_secret.txt"     (空字串時使用環境變數 WORKFLOW_AGENT_SECRET)
+tags / slots 沒有設定時，第一次連線後採用 agent 自己回報的值。
+
+步驟以 "placement" 指定執行位置：
+    "local" (預設)、"remote" (任一 agent)、"any" (有空閒的 agent 就用，否則在本機執行)
+    {"agent": "build1" 或 [...], "tags": ["gpu"], "local": false}
+沒有空閒的 agent 時等待；無法連線的 agent 暫停使用 AGENT_RETRY_S 秒，改用其他 agent。
+agent 回覆 busy (slot 被其他引擎占用) 時視為暫時沒有空閒，AGENT_BUSY_S 秒後再試，不視為無法連線。
+協定見 worker_agent.py。
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import socket
+import threading
+import time
+
+from task_events import EVENTS_ENV, EVENT_TOKEN_ENV
+from worker_agent import HANDSHAKE_TIMEOUT_S, PROTOCOL_VERSION, Channel, sign
+
+AGENT_RETRY_S = 30 # 無法連線的 agent 多久後再嘗試
+AGENT_BUSY_S = 1 # 回覆 busy 的 agent 多久後再嘗試
+LOCAL_ONLY_ENV = ("PYTHONPATH", "WORKFLOW_ARTIFACTS") # 本機路徑，在 agent 上無效，不傳送
+
+
+def placement_rules(placement):
+    """把 placement 的簡寫轉成 {"agent", "tags", "local"}"""
+    if placement == "remote":
+        return {}
+    if placement == "any":
+        return {"local": True}
+    return placement
+
+
+class AgentBusy(Exception):
+    """agent 目前沒有空閒的 slot"""
+
+
+class RemoteAgent:
+    def __init__(self, config):
+        self.host = config["host"]
+        self.port = config["port"]
+        self.name = config.get("name") or f"{self.host}:{self.port}"
+        self.tags = set(config["tags"]) if "tags" in config else None # None：尚未連線取得
+        self.slots = config.get("slots")
+        self.configured = ("tags" in config, "slots" in config)
+        self.running = 0
+        self.down_until = 0.0
+        self.busy_until = 0.0
+        self.error = None
+
+    def limit(self):
+        # 尚未得知 agent 的 slots 前一次只送一個步驟
+        return self.slots or 1
+
+    def matches(self, names, tags):
+        return (not names or self.name in names) and (self.tags is None or tags <= self.tags)
+
+
+class RemoteTask:
+    """在遠端 agent 上執行的步驟；介面與 ProcessTask 相同 (lines / wait / terminate / kill_tree / usage)"""
+
+    def __init__(self, pool, agent, channel, events_env=None):
+        self.pool = pool
+        self.agent = agent
+        self.channel = channel
+        self.events_env = events_env # 轉送事件到本機事件通道
+        self.events_sock = None
+        self.return_code = None
+        self.usage = {}
+        self.released = False
+
+    def lines(self):
+        """逐行產生遠端的輸出，直到步驟結束或連線中斷；事件在讀取時轉送"""
+        while self.return_code is None:
+            try:
+                message = self.channel.receive()
+            except (OSError, ValueError):
+                message = None
+            if message is None:
+                self.return_code = -1
+                yield f"[ERROR] Lost connection to agent {self.agent.name}\n"
+                return
+            op = message.get("op")
+            if op == "out":
+                yield str(message.get("line", ""))
+            elif op == "event":
+                self._forward(message.get("event"))
+            elif op == "exit":
+                code = message.get("code")
+                self.return_code = code if isinstance(code, int) else -1
+                usage = message.get("usage") or {}
+                self.usage = {name: value for name, value in usage.items() if isinstance(value, (int, float))}
+
+    def _forward(self, event):
+        if not self.events_env or not isinstance(event, dict):
+            return
+        try:
+            if self.events_sock is None:
+                host, _, port = self.events_env[EVENTS_ENV].rpartition(":")
+                self.events_sock = socket.create_connection((host, int(port)), timeout=5)
+                self.events_sock.sendall(self.events_env[EVENT_TOKEN_ENV].encode("ascii") + b"\n")
+            self.events_sock.sendall(Channel.encode(event))
+        except OSError:
+            # 事件只是輔助資訊，轉送失敗不影響步驟
+            self.events_env = None
+
+    def wait(self):
+        for _ in self.lines():
+            pass
+        self.channel.close()
+        if self.events_sock:
+            self.events_sock.close()
+            self.events_sock = None
+        if not self.released:
+            self.released = True
+            self.pool.release(self.agent)
+        return self.return_code
+
+    def terminate(self):
+        try:
+            self.channel.send({"op": "kill"})
+        except OSError:
+            pass
+
+    def kill_tree(self):
+        # agent 端一律結束整個進程樹
+        self.terminate()
+
+
+class AgentPool:
+    """
+    global_config 的 agent 清單與各 agent 執行中的步驟數 (所有實例共用)。
+    每個步驟一條連線：握手、依雜湊同步腳本、送出執行要求後回傳 RemoteTask。
+    """
+
+    def __init__(self, agents, secret):
+        self.agents = [RemoteAgent(config) for config in agents]
+        self.secret = secret
+        self.cond = threading.Condition()
+        self.scripts = {} # 腳本路徑 -> ((修改時間, 大小), sha256)
+
+    def release(self, agent):
+        with self.cond:
+            agent.running -= 1
+            self.cond.notify_all()
+
+    def start(self, placement, script_path, args=(), env=None, cancelled=None, warn=None):
+        """
+        在符合 placement 的 agent 上啟動步驟；placement 允許本機執行且沒有空閒的 agent 時回傳 None。
+        沒有符合的 agent、全部無法連線，或等待期間 cancelled() 為真時拋出 RuntimeError。
+        """
+        rules = placement_rules(placement)
+        names = rules.get("agent") or []
+        names = [names] if isinstance(names, str) else names
+        tags = set(rules.get("tags", []))
+        allow_local = rules.get("local", False)
+        while True:
+            with self.cond:
+                candidates = [agent for agent in self.agents if agent.matches(names, tags)]
+                if not candidates:
+                    if allow_local:
+                        return None
+                    if not self.agents:
+                        raise RuntimeError("No remote agents are configured (\"agents\" in global_config.json)")
+                    raise RuntimeError(f"No remote agent matches placement {placement}")
+                now = time.monotonic()
+                up = [agent for agent in candidates if agent.down_until <= now]
+                free = [agent for agent in up if agent.running < agent.limit() and agent.busy_until <= now]
+                if not free:
+                    if allow_local:
+                        return None
+                    if not up:
+                        raise RuntimeError("No matching remote agent is reachable: "
+                                           + "; ".join(f"{agent.name}: {agent.error}" for agent in candidates))
+                    if cancelled and cancelled():
+                        raise RuntimeError("Stopped while waiting for a remote agent")
+                    self.cond.wait(0.5)
+                    continue
+                agent = min(free, key=lambda agent: agent.running / agent.limit())
+                agent.running += 1
+            if not self.secret:
+                self.release(agent)
+                raise RuntimeError("No shared secret for remote agents (set \"agent_secret_file\" or WORKFLOW_AGENT_SECRET)")
+            try:
+                task = self._start_on(agent, names, tags, script_path, args, env or {})
+            except AgentBusy:
+                self.release(agent)
+                with self.cond:
+                    agent.busy_until = time.monotonic() + AGENT_BUSY_S
+                continue
+            except (OSError, ValueError) as e:
+                self.release(agent)
+                with self.cond:
+                    agent.down_until = time.monotonic() + AGENT_RETRY_S
+                    agent.error = str(e) or type(e).__name__
+                if warn:
+                    warn(f"Agent {agent.name} unavailable, not used for {AGENT_RETRY_S}s: {agent.error}")
+                continue
+            if task is None:
+                # 第一次連線才得知 tags，且不符合：改用其他 agent
+                self.release(agent)
+                continue
+            return task
+
+    def _connect(self, agent):
+        """連線並互相驗證共用密鑰，回傳 (通道, agent 的自我介紹)"""
+        sock = socket.create_connection((agent.host, agent.port), timeout=HANDSHAKE_TIMEOUT_S)
+        channel = Channel(sock)
+        try:
+            hello = channel.receive()
+            if not hello or hello.get("version") != PROTOCOL_VERSION:
+                raise ValueError(f"unsupported agent protocol {hello.get('version') if hello else None}")
+            nonce = secrets.token_hex(16)
+            channel.send({"auth": sign(self.secret, "client", str(hello.get("nonce", "")), nonce), "nonce": nonce})
+            reply = channel.receive()
+            if not reply or not reply.get("ok"):
+                raise PermissionError((reply or {}).get("error", "connection closed during authentication"))
+            if not hmac.compare_digest(str(reply.get("auth", "")), sign(self.secret, "agent", nonce, str(hello.get("nonce", "")))):
+                raise PermissionError("the agent does not know the shared secret")
+        except Exception:
+            channel.close()
+            raise
+        return channel, hello
+
+    def _script_hash(self, script_path):
+        st = os.stat(script_path)
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self.scripts.get(script_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(script_path, "rb") as f:
+            sha = hashlib.sha256(f.read()).hexdigest()
+        self.scripts[script_path] = (signature, sha)
+        return sha
+
+    def _start_on(self, agent, names, tags, script_path, args, env):
+        """在指定的 agent 上啟動；agent 回報的 tags 不符合時回傳 None"""
+        sha = self._script_hash(script_path)
+        channel, hello = self._connect(agent)
+        try:
+            with self.cond:
+                if not agent.configured[0]:
+                    agent.tags = set(hello.get("tags") or [])
+                if not agent.configured[1]:
+                    agent.slots = max(1, int(hello.get("slots") or 1))
+                agent.error = None
+            if not agent.matches(names, tags):
+                channel.close()
+                return None
+            events_env = {name: env[name] for name in (EVENTS_ENV, EVENT_TOKEN_ENV) if name in env} or None
+            remote_env = {name: value for name, value in env.items()
+                          if name not in LOCAL_ONLY_ENV and name not in (EVENTS_ENV, EVENT_TOKEN_ENV)}
+            channel.send({"op": "run", "script": os.path.basename(script_path), "sha256": sha, "args": list(args),
+                          "env": remote_env, "events": bool(events_env)})
+            message = channel.receive()
+            if message and message.get("op") == "busy":
+                raise AgentBusy(agent.name)
+            if message and message.get("op") == "need_script":
+                with open(script_path, "rb") as f:
+                    data = f.read()
+                channel.send({"op": "script", "data": base64.b64encode(data).decode("ascii")})
+                message = channel.receive()
+            if not message or message.get("op") != "started":
+                raise OSError("the agent closed the connection before starting the step")
+            channel.sock.settimeout(None)
+        except Exception:
+            channel.close()
+            raise
+        return RemoteTask(self, agent, channel, events_env)
@@ -0,0 +1,196 @@
+"""
+不開啟視窗的命令列執行入口 (適合排程與 CI)：
+
+    python -m run_flow <flow> [--from-step N|id] [--cut SRC:DST ...]
+                              [--param KEY=VALUE ...] [--set LABEL ...]
+                              [--log-file PATH] [--summary PATH|-] [--profile] [--quiet] [--resume]
+    python -m run_flow --list
+
+流程宣告 param_sets 時，每組參數同時執行一個實例 (受 max_concurrent_flows 限制)。
+--resume：該流程有中斷的執行 (見 run_journal.py) 時從未完成的步驟繼續，沒有時正常執行。
+
+結束代碼：0 成功、1 步驟失敗、2 參數或流程設定錯誤、3 因斬斷連接線而未執行完、4 步驟逾時而中止、130 中止
+此路徑不會 import tkinter。
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+
+from engine import WorkflowEngine
+from model import WorkflowModel, parse_params
+from run_journal import discard, incomplete_runs
+
+EXIT_CODES = {"success": 0, "error": 1, "cut": 3, "timeout": 4, "stopped": 130}
+# 多個實例時，以最嚴重的結果作為整體結果
+SEVERITY = ["success", "cut", "stopped", "timeout", "error"]
+EXIT_USAGE = 2
+
+
+def _step_ref(text):
+    """命令列的步驟參照：數字為步驟編號，其餘為 id / module 名稱"""
+    return int(text) if text.isdigit() else text
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m run_flow", description="Run a workflow without the GUI.")
+    parser.add_argument("flow", nargs="?", help="flow key (see --list)")
+    parser.add_argument("--list", action="store_true", help="list the available flows and exit")
+    parser.add_argument("--from-step", metavar="STEP", help="start at this step (number or id/module) and run everything downstream of it")
+    parser.add_argument("--cut", metavar="SRC:DST", action="append", default=[], help="cut the line between two steps (repeatable)")
+    parser.add_argument("--param", metavar="KEY=VALUE", action="append", default=[], help="parameter passed to the tasks (repeatable)")
+    parser.add_argument("--set", metavar="LABEL", action="append", default=[], help="only run these param_sets of the flow (repeatable)")
+    parser.add_argument("--log-file", metavar="PATH", help="also append the log to this file")
+    parser.add_argument("--summary", metavar="PATH", help="write a JSON summary to PATH ('-' for stdout; the log then goes to stderr)")
+    parser.add_argument("--profile", action="store_true", help="run every step under cProfile (see python -m step_profile)")
+    parser.add_argument("--quiet", action="store_true", help="do not print the log to the console")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue interrupted runs of the flow from their unfinished steps (a normal run when there are none)")
+    return parser
+
+
+class ConsoleLog:
+    """把引擎日誌寫到主控台與檔案 (可從多個執行緒呼叫)"""
+
+    def __init__(self, stream, log_file):
+        self.stream = stream
+        self.file = open(log_file, "a", encoding="utf-8") if log_file else None
+        self.lock = threading.Lock()
+
+    def __call__(self, instance, message, prefix=False):
+        if prefix and instance is not None:
+            message = f"[{instance.label or '#' + str(instance.id)}] {message}"
+        with self.lock:
+            if self.stream:
+                self.stream.write(message)
+                self.stream.flush()
+            if self.file:
+                self.file.write(message)
+                self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def resume_instances(model, flow_key):
+    """該流程中斷的執行 (以保存的參數、起點與斬斷的連接線) 建立為實例；無法繼續的捨棄"""
+    instances = []
+    for run in incomplete_runs(model.journal_dir):
+        if run["flow"] != flow_key:
+            continue
+        try:
+            instances.append(model.resume_instance(run))
+        except ValueError as e:
+            print(f"warning: discarding interrupted run started {run['started']}: {e}", file=sys.stderr)
+            discard(run["path"])
+    return instances
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    model = WorkflowModel()
+
+    if args.list:
+        for key, data in model.flow_index.items():
+            print(f"{key}\t{data.get('description', '')}")
+        return 0
+    if not args.flow:
+        print("error: a flow name is required (see --list)", file=sys.stderr)
+        return EXIT_USAGE
+
+    try:
+        if not model.set_flow(args.flow):
+            print(f"error: unknown flow '{args.flow}'", file=sys.stderr)
+            return EXIT_USAGE
+        graph = model.flow_graph
+        if args.from_step:
+            model.selected_start_idx = graph.resolve(_step_ref(args.from_step))
+        for cut in args.cut:
+            src, sep, dst = cut.partition(":")
+            if not sep:
+                raise ValueError(f"--cut expects SRC:DST, got '{cut}'")
+            edge = (graph.resolve(_step_ref(src)), graph.resolve(_step_ref(dst)))
+            if edge not in graph.edges:
+                raise ValueError(f"there is no line from step {edge[0]+1} to step {edge[1]+1}")
+            model.disabled_lines.add(edge)
+        param_sets = model.param_sets(parse_params(args.param))
+        if args.set:
+            unknown = set(args.set) - {label for label, _ in param_sets}
+            if unknown:
+                raise ValueError(f"unknown param set(s): {', '.join(sorted(unknown))}")
+            param_sets = [(label, params) for label, params in param_sets if label in args.set]
+    except ValueError as e:
+        print(f"error: {args.flow}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    stream = None if args.quiet else (sys.stderr if args.summary == "-" else sys.stdout)
+    try:
+        log = ConsoleLog(stream, args.log_file)
+    except OSError as e:
+        print(f"error: cannot open log file: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    instances = resume_instances(model, args.flow) if args.resume else []
+    if not instances:
+        instances = [model.create_instance(params, label, args.profile) for label, params in param_sets]
+    # 多個實例同時執行時，每行前面加上實例標籤
+    engine = WorkflowEngine(model, log=lambda instance, message: log(instance, message, prefix=len(instances) > 1))
+    interrupted = []
+
+    def on_interrupt(signum, frame):
+        # 第一次：不再啟動新步驟；第二次：強制結束執行中的步驟
+        if interrupted:
+            log(None, "Interrupted again, terminating running steps\n")
+            for instance in instances:
+                engine.terminate_running(instance)
+        else:
+            interrupted.append(signum)
+            for instance in instances:
+                engine.stop(instance)
+            log(None, "Interrupted, no further steps will be started (press Ctrl+C again to terminate running steps)\n")
+
+    signal.signal(signal.SIGINT, on_interrupt)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_interrupt)
+
+    summaries = {}
+
+    def run(instance):
+        try:
+            summaries[instance.id] = engine.run(instance)
+        except Exception as e:
+            # 引擎本身的錯誤：仍然為這個實例產生摘要，不影響其他實例
+            log(instance, f"[ERROR] The run failed: {type(e).__name__}: {e}\n", prefix=len(instances) > 1)
+            summaries[instance.id] = {"instance": instance.id, "flow": instance.flow_key, "label": instance.label,
+                                      "params": instance.params, "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    threads = [threading.Thread(target=run, args=(instance,), daemon=True) for instance in instances]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # 以逾時輪詢 join，讓主執行緒能處理 Ctrl+C
+            while thread.is_alive():
+                thread.join(0.2)
+    finally:
+        engine.shutdown()
+        log.close()
+
+    results = [summaries[instance.id] for instance in instances]
+    if len(results) == 1:
+        summary = results[0]
+    else:
+        status = max((result["status"] for result in results), key=SEVERITY.index)
+        summary = {"flow": args.flow, "status": status, "instances": results}
+
+    if args.summary == "-":
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    elif args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return EXIT_CODES[summary["status"]]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+執行中流程的檢查點日誌 (journal)，程式或電腦當掉後可從未完成的步驟繼續。
+
+每個執行中的實例一個檔案：
+    runs/<時間>_<流程>_<pid>_<實例>.journal
+
+每次狀態轉換 (開始執行、步驟開始、步驟結束、執行結束) 附加一行 JSON 並 fsync，
+當機時最多只遺失正在寫入的那一行。執行正常結束 (不論成功或失敗) 後刪除檔案，
+因此留下來、且沒有被其他執行中的程式鎖住的檔案，就是中途中斷的執行。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from file_utils import try_lock
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def steps_digest(steps):
+    """流程步驟內容的雜湊；繼續執行前用來確認流程沒有被修改"""
+    return hashlib.sha256(json.dumps(steps, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    一個實例的檢查點日誌 (由引擎寫入，可從多個執行緒呼叫)。
+
+    執行期間持有檔案鎖，其他程式掃描時不會把仍在執行的流程當成中斷。
+    """
+
+    def __init__(self, journal_dir, instance):
+        os.makedirs(journal_dir, exist_ok=True)
+        flow = re.sub(r"[^\w.-]", "_", instance.flow_key)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{flow}_{os.getpid()}_{instance.id}"
+        self.path = os.path.join(journal_dir, name + JOURNAL_SUFFIX)
+        self.lock = threading.Lock()
+        # 先在暫存檔取得鎖並寫入第一筆紀錄再改名：其他程式掃描時不會看到空白或未上鎖的檔案
+        tmp_path = self.path + ".tmp"
+        self.file = open(tmp_path, "w", encoding="utf-8")
+        if not try_lock(self.file):
+            self.file.close()
+            raise OSError(f"cannot lock {tmp_path}")
+        self._write({
+            "event": "run",
+            "flow": instance.flow_key,
+            "label": instance.label,
+            "params": instance.params,
+            "start_step": instance.selected_start_idx,
+            "disabled_lines": sorted(instance.disabled_lines),
+            "profile": instance.profile,
+            "steps": len(instance.steps),
+            "digest": steps_digest(instance.steps),
+            "completed": sorted(instance.completed_steps),
+            "artifacts": instance.artifacts.path if instance.artifacts else None,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        try:
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Windows 無法改名開啟中的檔案：關閉後改名再重新上鎖
+            self.file.close()
+            os.replace(tmp_path, self.path)
+            self.file = open(self.path, "a", encoding="utf-8")
+            if not try_lock(self.file):
+                self.file.close()
+                raise OSError(f"cannot lock {self.path}")
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def step_started(self, idx):
+        self._write({"event": "start", "step": idx, "time": round(time.time(), 3)})
+
+    def step_finished(self, idx, state, exit_code=None, done=False):
+        """done：下游步驟可以執行 (成功、快取或逾時後繼續)，繼續執行時跳過這一步"""
+        self._write({"event": "finish", "step": idx, "state": state, "exit_code": exit_code, "done": done,
+                     "time": round(time.time(), 3)})
+
+    def close(self, status):
+        """執行結束：記錄結果後刪除檔案 (已結束的執行不需要繼續)"""
+        self._write({"event": "end", "status": status})
+        with self.lock:
+            self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _read_state(path, f):
+    state = None
+    for line in f:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # 當機時寫到一半的最後一行
+            break
+        event = record.get("event")
+        if event == "run":
+            state = {**record, "path": path, "completed": set(record.get("completed", [])), "running": set()}
+        elif state is None:
+            break
+        elif event == "start":
+            state["running"].add(record["step"])
+        elif event == "finish":
+            state["running"].discard(record["step"])
+            if record.get("done"):
+                state["completed"].add(record["step"])
+        elif event == "end":
+            return None
+    return state
+
+
+def incomplete_runs(journal_dir):
+    """
+    中途中斷的執行 (依開始時間排序)，每筆為 dict：
+    flow / label / params / start_step / disabled_lines / profile / steps / digest / started / artifacts (artifact 目錄)，
+    completed (已完成的步驟索引集合)、running (中斷時執行中的步驟) 與 path。
+    """
+    runs = []
+    try:
+        names = sorted(name for name in os.listdir(journal_dir) if name.endswith(JOURNAL_SUFFIX))
+    except FileNotFoundError:
+        return runs
+    for name in names:
+        path = os.path.join(journal_dir, name)
+        try:
+            with open(path, "r+", encoding="utf-8") as f:
+                if not try_lock(f):
+                    # 另一個程式仍在執行這個流程
+                    continue
+                f.seek(0)
+                state = _read_state(path, f)
+        except OSError:
+            continue
+        if state is None:
+            # 已結束但來不及刪除，或內容無法辨識
+            discard(path)
+            continue
+        runs.append(state)
+    return runs
+
+
+def discard(path):
+    """刪除中斷執行的檢查點 (不再繼續)"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
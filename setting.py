@@ -1,25 +1,25 @@
-import json
+import copy
 import os
 import shutil
 import sys
+from config_loader import GLOBAL_CONFIG_FILE, get_loader
+from step_cache import StepCache
 
 class SettingsManager:
     def __init__(self):
-        self.global_config_path = os.path.join("configs", "global_config.json")
-        self.flow_config_path = os.path.join("configs", "config.json")
+        # 與主程式共用同一個設定讀取器 (同一組路徑與快取)
+        self.loader = get_loader()
         self.tasks_dir = "tasks"
+        self.last_error = None # 最近一次儲存失敗的原因 (顯示給使用者)
 
         # 確保 tasks 資料夾存在
         if not os.path.exists(self.tasks_dir):
             os.makedirs(self.tasks_dir)
 
     def load_global_config(self):
-        """讀取全域設定"""
+        """讀取全域設定 (回傳可編輯的複本)"""
         try:
-            if not os.path.exists(self.global_config_path):
-                return {}
-            with open(self.global_config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return copy.deepcopy(self.loader.load(GLOBAL_CONFIG_FILE, {}))
         except Exception as e:
             print(f"Error loading global config: {e}")
             return {}
@@ -27,34 +27,43 @@ class SettingsManager:
     def save_global_config(self, data):
         """儲存全域設定"""
         try:
-            with open(self.global_config_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.loader.save(GLOBAL_CONFIG_FILE, data)
             return True
         except Exception as e:
             print(f"Error saving global config: {e}")
             return False
 
-    def load_flow_config(self):
-        """讀取流程設定"""
+    def load_flow_index(self):
+        """讀取流程索引 {key: 摘要} (不含流程內容)"""
         try:
-            if not os.path.exists(self.flow_config_path):
-                return {}
-            with open(self.flow_config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return copy.deepcopy(self.loader.flow_index())
         except Exception as e:
-            print(f"Error loading flow config: {e}")
+            print(f"Error loading flow index: {e}")
             return {}
 
-    def save_flow_config(self, data):
-        """儲存流程設定"""
+    def load_flow(self, key):
+        """讀取單一流程 (回傳可編輯的複本)"""
         try:
-            with open(self.flow_config_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            return copy.deepcopy(self.loader.flow_data(key))
+        except Exception as e:
+            print(f"Error loading flow '{key}': {e}")
+            return None
+
+    def save_flows(self, flows, deleted=(), order=None):
+        """只儲存有變動的流程 (flows: {key: 內容}) 與刪除的流程，並更新索引"""
+        try:
+            self.loader.save_flows(flows, deleted, order)
             return True
         except Exception as e:
             print(f"Error saving flow config: {e}")
+            self.last_error = str(e)
             return False
 
+    def clear_step_cache(self, flow_key=None):
+        """清除步驟結果快取 (指定 flow_key 時只清除該流程)，回傳清除的筆數"""
+        cache_dir = self.load_global_config().get("cache_dir", "cache")
+        return StepCache(cache_dir).invalidate(flow_key=flow_key)
+
     def import_script(self, source_path):
         """匯入 Python 腳本到 tasks 資料夾"""
         try:
@@ -0,0 +1,222 @@
+"""
+以內容定址的步驟結果快取。
+
+步驟在 config.json 宣告 cache 區塊即可啟用：
+    "cache": {"inputs": ["data/in.csv"], "params": {"date": "2024-01-01"}, "outputs": ["out/result.csv"]}
+
+指紋 (fingerprint) 由腳本內容、直譯器、步驟設定 (不含 name / overview)、命令列參數、
+實例參數以及所有輸入檔的內容雜湊組成。
+指紋與先前某次成功執行相同時，直接從快取還原輸出檔並略過該步驟。
+
+目錄結構：
+    cache/objects/ab/abcdef...   輸出檔內容 (以 sha256 命名，相同內容只存一份)
+    cache/entries/<fp>.json      指紋 -> 輸出檔對應、大小、最後使用時間
+    cache/hash_memo.json         (路徑, 大小, 修改時間) -> sha256，未變動的輸入檔不必重新計算
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from file_utils import read_json, write_json_atomic
+
+CHUNK = 1024 * 1024
+COSMETIC_KEYS = ("name", "overview") # 只影響顯示的步驟欄位，不列入指紋
+
+
+def _iter_files(path):
+    """檔案回傳自己；目錄則依排序回傳底下所有檔案"""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                yield os.path.join(root, name)
+    elif os.path.exists(path):
+        yield path
+    else:
+        raise FileNotFoundError(f"Cache path not found: {path}")
+
+
+class StepCache:
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.entries_dir = os.path.join(cache_dir, "entries")
+        self.memo_path = os.path.join(cache_dir, "hash_memo.json")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.memo = None
+
+    # --- 雜湊 ---
+
+    def _load_memo(self):
+        if self.memo is None:
+            self.memo = read_json(self.memo_path, {})
+        return self.memo
+
+    def hash_file(self, path):
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self.lock:
+            cached = self._load_memo().get(key)
+        if cached and cached[:2] == stamp:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self.lock:
+            self._load_memo()[key] = stamp + [value]
+        return value
+
+    def _save_memo(self):
+        with self.lock:
+            if self.memo is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                write_json_atomic(self.memo_path, self.memo)
+
+    def fingerprint(self, step, script_path, python_bin, instance_params=None, args=()):
+        """計算步驟指紋 (args 為代入參數後的命令列參數)；輸入檔不存在時拋出 FileNotFoundError"""
+        spec = step.get("cache", {})
+        digest = hashlib.sha256()
+        digest.update(b"script\0" + self.hash_file(script_path).encode())
+
+        interpreter = shutil.which(python_bin) or python_bin
+        digest.update(b"python\0" + os.path.abspath(interpreter).encode())
+        if os.path.exists(interpreter):
+            st = os.stat(interpreter)
+            digest.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+
+        # 整個步驟設定 (含 cache 的 params / outputs、executor 等)，任一選項不同的步驟不會互相沿用
+        definition = {key: value for key, value in step.items() if key not in COSMETIC_KEYS}
+        digest.update(b"step\0" + json.dumps(definition, sort_keys=True, ensure_ascii=False).encode())
+        digest.update(b"args\0" + json.dumps(list(args), ensure_ascii=False).encode())
+        if instance_params:
+            # 同一流程以不同參數執行 (例如不同站點) 時，結果不可互相沿用
+            digest.update(b"instance\0" + json.dumps(instance_params, sort_keys=True).encode())
+        for path in spec.get("inputs", []):
+            for file_path in _iter_files(path):
+                digest.update(b"input\0" + os.path.normpath(file_path).encode() + b"\0" + self.hash_file(file_path).encode())
+        self._save_memo()
+        return digest.hexdigest()
+
+    # --- 存取 ---
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def _entry_path(self, fingerprint):
+        return os.path.join(self.entries_dir, f"{fingerprint}.json")
+
+    def restore(self, fingerprint):
+        """指紋命中時還原所有輸出檔並回傳 True"""
+        entry = read_json(self._entry_path(fingerprint))
+        if not entry:
+            return False
+        files = entry["files"]
+        if not all(os.path.exists(self._object_path(sha)) for sha in files.values()):
+            # 物件已被清除，視為未命中
+            return False
+        for path, sha in files.items():
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            shutil.copyfile(self._object_path(sha), path)
+        entry["last_used"] = time.time()
+        with self.lock:
+            write_json_atomic(self._entry_path(fingerprint), entry)
+        return True
+
+    def store(self, fingerprint, step, flow_key):
+        """步驟成功後把輸出檔存入快取；輸出檔不存在時拋出 FileNotFoundError"""
+        spec = step.get("cache", {})
+        files = {}
+        sizes = {}
+        for path in spec.get("outputs", []):
+            for file_path in _iter_files(path):
+                sha = self.hash_file(file_path)
+                files[os.path.normpath(file_path)] = sha
+                sizes[sha] = os.path.getsize(file_path)
+
+        with self.lock:
+            for path, sha in files.items():
+                target = self._object_path(sha)
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copyfile(path, target + ".tmp")
+                    os.replace(target + ".tmp", target)
+            os.makedirs(self.entries_dir, exist_ok=True)
+            write_json_atomic(self._entry_path(fingerprint), {
+                "flow": flow_key,
+                "module": step.get("module", ""),
+                "files": files,
+                "sizes": sizes,
+                "created": time.time(),
+                "last_used": time.time(),
+            })
+        self._save_memo()
+        self.evict()
+
+    # --- 容量管理與失效 ---
+
+    def _load_entries(self):
+        entries = {}
+        if os.path.isdir(self.entries_dir):
+            for name in os.listdir(self.entries_dir):
+                if name.endswith(".json"):
+                    entry = read_json(os.path.join(self.entries_dir, name))
+                    if entry:
+                        entries[name[:-5]] = entry
+        return entries
+
+    def _collect_garbage(self, entries):
+        """刪除沒有任何 entry 參照的物件"""
+        referenced = {sha for entry in entries.values() for sha in entry["files"].values()}
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if name not in referenced:
+                    os.remove(os.path.join(prefix_dir, name))
+
+    def evict(self):
+        """依最後使用時間 (LRU) 淘汰 entry，直到總大小低於上限"""
+        with self.lock:
+            entries = self._load_entries()
+            sizes = {}
+            for entry in entries.values():
+                sizes.update(entry.get("sizes", {}))
+            total = sum(sizes.values())
+            if total <= self.max_bytes:
+                return
+            for fingerprint, entry in sorted(entries.items(), key=lambda item: item[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                os.remove(self._entry_path(fingerprint))
+                del entries[fingerprint]
+                still_used = {sha for e in entries.values() for sha in e["files"].values()}
+                for sha in set(entry["files"].values()) - still_used:
+                    total -= sizes.pop(sha, 0)
+            self._collect_garbage(entries)
+
+    def invalidate(self, flow_key=None, module=None):
+        """清除符合條件的快取 (皆為 None 時清除全部)，回傳清除的筆數"""
+        with self.lock:
+            entries = self._load_entries()
+            removed = 0
+            for fingerprint, entry in list(entries.items()):
+                if flow_key is not None and entry.get("flow") != flow_key:
+                    continue
+                if module is not None and entry.get("module") != module:
+                    continue
+                os.remove(self._entry_path(fingerprint))
+                del entries[fingerprint]
+                removed += 1
+            self._collect_garbage(entries)
+        return removed
@@ -0,0 +1,100 @@
+"""
+步驟 profile 的讀取與彙總。
+
+開啟 profile 的步驟以 cProfile 執行，結果存在日誌封存中：
+    logs/<run_id>/step_003/profile.pstats
+
+彙總最近一段時間某個流程的所有 profile，看時間花在哪些函式：
+    python -m step_profile <flow> [--days 7] [--top 30] [--step N]
+"""
+import argparse
+import os
+import pstats
+import sys
+import time
+
+from log_archive import LogArchive
+
+PROFILE_FILE = "profile.pstats"
+
+
+def _function_name(func):
+    filename, line, name = func
+    if filename == "~":
+        # 內建函式，例如 <built-in method time.sleep>
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def top_functions(paths, limit=10):
+    """
+    讀取一或多個 .pstats (多個時合併) 並依自身耗時排序，
+    回傳 [{"function", "calls", "own_s", "cum_s"}]。
+    """
+    stats = pstats.Stats(*paths)
+    rows = []
+    for func, (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({"function": _function_name(func), "calls": calls, "own_s": round(own, 4), "cum_s": round(cumulative, 4)})
+    rows.sort(key=lambda row: row["own_s"], reverse=True)
+    return rows[:limit]
+
+
+def format_rows(rows):
+    """top_functions 的結果排成文字表格的各行"""
+    return [f"{row['own_s']:>9.3f}s own {row['cum_s']:>9.3f}s cum {row['calls']:>9} calls  {row['function']}" for row in rows]
+
+
+def collect_profiles(log_dir, flow_key, since=None, step=None):
+    """流程在 since (epoch 秒) 之後各次執行留下的 .pstats：{步驟索引: [路徑]}"""
+    archive = LogArchive(log_dir)
+    profiles = {}
+    for run in archive.list_runs():
+        if run.get("flow") != flow_key:
+            continue
+        if since is not None and time.mktime(time.strptime(run["started"], "%Y-%m-%d %H:%M:%S")) < since:
+            continue
+        for idx, step_dir in archive.list_steps(run["run_id"]):
+            if step is not None and idx != step:
+                continue
+            path = os.path.join(log_dir, run["run_id"], step_dir, PROFILE_FILE)
+            if os.path.exists(path):
+                profiles.setdefault(idx, []).append(path)
+    return profiles
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m step_profile", description="Aggregate the step profiles of a flow across runs.")
+    parser.add_argument("flow", help="flow key (see python -m run_flow --list)")
+    parser.add_argument("--days", type=float, default=7, help="only runs started in the last N days (default 7, 0 for all)")
+    parser.add_argument("--top", type=int, default=30, help="number of functions to show (default 30)")
+    parser.add_argument("--step", type=int, metavar="N", help="only this step number")
+    parser.add_argument("--log-dir", default=None, help="log archive directory (default: log_dir from global_config.json)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log_dir = args.log_dir
+    if log_dir is None:
+        from model import WorkflowModel
+        log_dir = WorkflowModel().log_dir
+    since = time.time() - args.days * 86400 if args.days else None
+    profiles = collect_profiles(log_dir, args.flow, since, args.step - 1 if args.step else None)
+    if not profiles:
+        print(f"No profiles found for flow '{args.flow}'", file=sys.stderr)
+        return 1
+
+    all_paths = [path for paths in profiles.values() for path in paths]
+    print(f"{args.flow}: {len(all_paths)} profile(s)\n")
+    print("Time per step (sum of own time):")
+    for idx in sorted(profiles):
+        total = sum(pstats.Stats(path).total_tt for path in profiles[idx])
+        print(f"  step {idx+1:>3}  {total:>9.3f}s  ({len(profiles[idx])} run(s))")
+    print(f"\nTop {args.top} functions by own time:")
+    for line in format_rows(top_functions(all_paths, args.top)):
+        print("  " + line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
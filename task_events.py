@@ -0,0 +1,217 @@
+"""
+任務到引擎的結構化事件通道 (與 stdout 日誌分開)。
+
+引擎啟動一個只接受本機連線的 TCP socket (所有執行器與 Windows 都能使用)，
+每個執行中的步驟註冊一個隨機 token，經由環境變數傳給任務：
+    WORKFLOW_EVENTS=127.0.0.1:<port>
+    WORKFLOW_EVENT_TOKEN=<token>
+
+協定 (UTF-8，每行一筆)：
+- 連線後第一行為 token，token 不符 (或步驟已結束) 時直接斷線
+- 之後每行一個 JSON 物件，至少含 "type"，例如
+  {"type": "progress", "value": 0.42, "message": "table 3/7"}
+  {"type": "counter", "name": "rows", "inc": 5000}
+  {"type": "metric", "name": "rows_per_s", "value": 81234.5}
+  {"type": "artifact", "name": "prices", "size": 8000000}
+
+任務端使用 workflow_task.progress / count / metric / emit。
+"""
+import json
+import os
+import secrets
+import selectors
+import socket
+import threading
+import time
+
+HOST = "127.0.0.1"
+MAX_LINE = 64 * 1024 # 單筆事件的長度上限，超過時斷線
+EVENTS_ENV = "WORKFLOW_EVENTS"
+EVENT_TOKEN_ENV = "WORKFLOW_EVENT_TOKEN"
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class StepEvents:
+    """
+    一個步驟收到的事件：彙總在 summary，並逐筆寫入 path (events.jsonl，第一筆事件時才建立)。
+    summary：{"progress": 0~1, "message", "counters": {名稱: 合計}, "metrics": {名稱: 最新值}, "artifacts": {名稱: 大小}}
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.file = None
+        self.summary = {}
+
+    def add(self, event):
+        kind = event["type"]
+        name = event.get("name")
+        if kind == "progress" and _number(event.get("value")):
+            self.summary["progress"] = min(max(float(event["value"]), 0.0), 1.0)
+            if isinstance(event.get("message"), str):
+                self.summary["message"] = event["message"]
+        elif kind == "counter" and isinstance(name, str):
+            inc = event.get("inc", 1)
+            counters = self.summary.setdefault("counters", {})
+            counters[name] = counters.get(name, 0) + (inc if _number(inc) else 0)
+        elif kind == "metric" and isinstance(name, str):
+            self.summary.setdefault("metrics", {})[name] = event.get("value")
+        elif kind == "artifact" and isinstance(name, str):
+            self.summary.setdefault("artifacts", {})[name] = event.get("size")
+        # 其他型別只寫入事件紀錄
+        if self.path:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(json.dumps({"time": round(time.time(), 3), **event}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class _Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.token = None
+        self.buffer = b""
+
+
+class EventServer:
+    """
+    在背景執行緒接收所有步驟的事件，依 token 呼叫註冊時的 on_event(event)。
+    on_event 在接收執行緒 (或 unregister 的呼叫端) 上呼叫，不可阻塞太久。
+    """
+
+    def __init__(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind((HOST, 0))
+        self.listener.listen(64)
+        self.listener.setblocking(False)
+        self.address = f"{HOST}:{self.listener.getsockname()[1]}"
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.lock = threading.Lock() # 接收執行緒與 unregister 不會同時處理同一個連線
+        self.handlers = {} # token -> on_event
+        self.connections = {} # socket -> _Connection
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def register(self, on_event):
+        """登記一個步驟，回傳傳給任務的環境變數"""
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.handlers[token] = on_event
+        return {EVENTS_ENV: self.address, EVENT_TOKEN_ENV: token}
+
+    def unregister(self, env):
+        """
+        步驟結束：先處理任務結束前送出、尚未讀取的事件，再中斷該步驟的連線。
+        任務已結束，送出的資料都在 socket 緩衝區中，不需要等待。
+        """
+        token = env[EVENT_TOKEN_ENV]
+        with self.lock:
+            self._accept()
+            for conn in list(self.connections.values()):
+                if conn.token in (None, token):
+                    self._read(conn)
+            for conn in list(self.connections.values()):
+                if conn.token == token:
+                    self._close(conn)
+            self.handlers.pop(token, None)
+
+    def _run(self):
+        while not self.closed:
+            try:
+                ready = self.selector.select(0.5)
+            except (OSError, ValueError):
+                # 關閉時 selector 已失效
+                return
+            with self.lock:
+                if self.closed:
+                    return
+                for key, _ in ready:
+                    if key.fileobj is self.listener:
+                        self._accept()
+                    else:
+                        conn = self.connections.get(key.fileobj)
+                        if conn:
+                            self._read(conn)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            sock.setblocking(False)
+            self.connections[sock] = _Connection(sock)
+            self.selector.register(sock, selectors.EVENT_READ)
+
+    def _read(self, conn):
+        """讀取目前可讀的資料並處理完整的行；對方關閉或協定錯誤時斷線"""
+        while True:
+            try:
+                data = conn.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self._handle_lines(conn, final=True)
+                self._close(conn)
+                return
+            conn.buffer += data
+            if not self._handle_lines(conn):
+                self._close(conn)
+                return
+
+    def _handle_lines(self, conn, final=False):
+        """處理緩衝區中完整的行，回傳連線是否仍然有效"""
+        *lines, conn.buffer = conn.buffer.split(b"\n")
+        if final and conn.buffer:
+            lines.append(conn.buffer)
+            conn.buffer = b""
+        if len(conn.buffer) > MAX_LINE:
+            return False
+        for line in lines:
+            if not line.strip():
+                continue
+            if conn.token is None:
+                token = line.decode("ascii", "replace").strip()
+                if token not in self.handlers:
+                    return False
+                conn.token = token
+                continue
+            handler = self.handlers.get(conn.token)
+            if handler is None:
+                return False
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and isinstance(event.get("type"), str):
+                handler(event)
+        return True
+
+    def _close(self, conn):
+        self.connections.pop(conn.sock, None)
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for conn in list(self.connections.values()):
+                self._close(conn)
+            self.selector.close()
+            self.listener.close()
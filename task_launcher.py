@@ -0,0 +1,577 @@
+import asyncio
+import codecs
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+
+from task_worker import SENTINEL, usage_fields
+
+OUTPUT_ENCODING = "cp950"
+READ_CHUNK = 64 * 1024 # async 執行器每次讀取的位元組數
+PROC_SAMPLE_S = 0.5 # async 執行器取樣 /proc 資源用量的間隔 (秒)
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "task_worker.py")
+FORK_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fork_server.py")
+
+
+def hidden_startupinfo():
+    """Windows 下隱藏子進程的主控台視窗，其他系統回傳 None"""
+    if os.name != 'nt':
+        return None
+    startupinfo = subprocess.STARTUPINFO()
+    # 使用 dwFlags 設定隱藏視窗
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo.wShowWindow = 0 # 0 代表 SW_HIDE (隱藏)
+    return startupinfo
+
+
+def popen_python(python_bin, args, **kwargs):
+    """以無緩衝模式啟動 python，stdout/stderr 合併為文字串流"""
+    # 使用 -u 開啟無緩衝模式，確保 print 內容即時回傳
+    return subprocess.Popen(
+        [python_bin, "-u"] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding=OUTPUT_ENCODING,
+        errors="replace", # 若解碼失敗，用特殊符號代替而非報錯
+        bufsize=1, # 行緩衝模式
+        startupinfo=hidden_startupinfo(),
+        **kwargs
+    )
+
+
+def proc_usage(pid):
+    """由 /proc 讀取子進程目前的 CPU 時間與峰值記憶體 (僅 Linux)；讀不到時回傳 None"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # 第 2 欄 (程式名稱) 可能含空白，從最後一個 ")" 之後開始算
+            fields = f.read().rsplit(b")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        usage = {"user_s": round(int(fields[11]) / ticks, 3), "sys_s": round(int(fields[12]) / ticks, 3)}
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    usage["max_rss_kb"] = int(line.split()[1])
+        return usage
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _child_pids():
+    """POSIX：{父進程: [子進程]} (Linux 讀 /proc，其他系統使用 ps)"""
+    children = {}
+    if os.path.exists("/proc/self/stat"):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "r") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # 第 2 欄 (程式名稱) 可能含空白，從最後一個 ")" 之後解析
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+    else:
+        output = subprocess.run(["ps", "-A", "-o", "pid=,ppid="], capture_output=True, text=True).stdout
+        for line in output.splitlines():
+            pid, ppid = map(int, line.split())
+            children.setdefault(ppid, []).append(pid)
+    return children
+
+
+def kill_tree(pid):
+    """強制結束 pid 及其所有子孫進程 (腳本自己啟動的子進程也一併結束，才不會繼續占用輸出管線)"""
+    if os.name == 'nt':
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       startupinfo=hidden_startupinfo())
+        return
+    try:
+        # 先暫停，列舉子孫進程期間不會再產生新的子進程
+        os.kill(pid, signal.SIGSTOP)
+    except (ProcessLookupError, PermissionError):
+        return
+    children = _child_pids()
+    tree, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            tree.append(child)
+            stack.append(child)
+    for target in [pid] + tree:
+        try:
+            os.kill(target, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def script_command(script_path, args=(), profile=None):
+    """子進程的 python 參數；profile 為 .pstats 路徑時經由 task_worker 以 cProfile 執行"""
+    if profile:
+        return [WORKER_SCRIPT, "--profile", profile, script_path] + list(args)
+    return [script_path] + list(args)
+
+
+class ProcessTask:
+    """每個步驟一個全新子進程 (預設模式)"""
+
+    def __init__(self, python_bin, script_path, args=(), env=None, profile=None):
+        self.process = popen_python(python_bin, script_command(script_path, args, profile), env={**os.environ, **env} if env else None)
+        self.usage = {} # 結束後的資源用量 (user_s / sys_s / max_rss_kb)
+
+    def lines(self):
+        """逐行產生輸出，直到輸出管線關閉"""
+        # 不在此 poll()，子進程留給 wait() 以 wait4 回收才取得到資源用量
+        for line in iter(self.process.stdout.readline, ""):
+            yield line
+
+    def wait(self):
+        if hasattr(os, "wait4") and self.process.returncode is None:
+            try:
+                _, status, rusage = os.wait4(self.process.pid, 0)
+                self.process.returncode = os.waitstatus_to_exitcode(status)
+                self.usage = usage_fields(rusage)
+            except ChildProcessError:
+                # 已被其他呼叫 (例如 terminate) 回收，結束碼由 Popen 取得
+                pass
+        return self.process.wait()
+
+    def terminate(self):
+        self.process.terminate()
+
+    def kill_tree(self):
+        if self.process.returncode is None:
+            kill_tree(self.process.pid)
+
+
+class _Worker:
+    def __init__(self, python_bin):
+        self.process = popen_python(python_bin, [WORKER_SCRIPT], stdin=subprocess.PIPE)
+        self.tasks_run = 0
+        self.broken = False
+
+    def alive(self):
+        return not self.broken and self.process.poll() is None
+
+    def shutdown(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class WorkerTask:
+    """在常駐 worker 直譯器中執行的步驟，介面與 ProcessTask 相同"""
+
+    def __init__(self, pool, worker, script_path, args=(), env=None, profile=None):
+        self.pool = pool
+        self.worker = worker
+        self.return_code = None
+        self.usage = {}
+        self.released = False
+        command = {"script": script_path, "cwd": os.getcwd(), "args": list(args), "env": env or {}, "profile": profile}
+        try:
+            worker.process.stdin.write(json.dumps(command) + "\n")
+            worker.process.stdin.flush()
+        except OSError:
+            # worker 已經掛掉，交由 lines() 取得其結束碼
+            worker.broken = True
+
+    def lines(self):
+        process = self.worker.process
+        while not self.worker.broken:
+            line = process.stdout.readline()
+            if not line:
+                # 在完成訊號之前 EOF：worker 當掉 (例如腳本呼叫了 os._exit)
+                self.worker.broken = True
+                break
+            pos = line.find(SENTINEL)
+            if pos >= 0:
+                if pos > 0:
+                    yield line[:pos]
+                code, _, usage = line[pos + len(SENTINEL):].strip().partition(" ")
+                self.return_code = int(code)
+                self.usage = json.loads(usage) if usage else {}
+                return
+            yield line
+        if self.return_code is None:
+            code = process.wait()
+            self.return_code = code if code != 0 else 1
+
+    def wait(self):
+        if self.return_code is None:
+            for _ in self.lines():
+                pass
+        if not self.released:
+            self.released = True
+            self.pool.release(self.worker)
+        return self.return_code
+
+    def terminate(self):
+        self.worker.broken = True
+        self.worker.process.kill()
+
+    def kill_tree(self):
+        # worker 直譯器連同腳本啟動的子進程一起結束，之後由 pool 補上新的 worker
+        self.worker.broken = True
+        kill_tree(self.worker.process.pid)
+
+
+class WorkerPool:
+    """
+    常駐 worker 直譯器池。
+
+    省去每個步驟的直譯器啟動與重複 import (pandas、DB driver 等) 成本。
+    worker 在當掉或執行滿 max_tasks 個任務後會被回收並重新啟動。
+    """
+
+    def __init__(self, python_bin, size=4, max_tasks=50):
+        self.python_bin = python_bin
+        self.size = max(1, size)
+        self.max_tasks = max_tasks
+        self.idle = []
+        self.busy = 0
+        self.cond = threading.Condition()
+
+    def _acquire(self):
+        with self.cond:
+            while True:
+                while self.idle:
+                    worker = self.idle.pop()
+                    if worker.alive():
+                        self.busy += 1
+                        return worker
+                    worker.shutdown()
+                if self.busy < self.size:
+                    self.busy += 1
+                    break
+                self.cond.wait()
+        try:
+            return _Worker(self.python_bin)
+        except Exception:
+            with self.cond:
+                self.busy -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, worker):
+        worker.tasks_run += 1
+        recycle = not worker.alive() or worker.tasks_run >= self.max_tasks
+        if recycle:
+            worker.shutdown()
+        with self.cond:
+            self.busy -= 1
+            if not recycle:
+                self.idle.append(worker)
+            self.cond.notify()
+
+    def run(self, script_path, args=(), env=None, profile=None):
+        worker = self._acquire()
+        return WorkerTask(self, worker, script_path, args, env, profile)
+
+    def shutdown(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+        for worker in idle:
+            worker.shutdown()
+
+
+class ForkTask:
+    """由 fork server 分出的子進程，介面與 ProcessTask 相同"""
+
+    def __init__(self, server, script_path, args=(), env=None, profile=None):
+        self.pid = None
+        self.return_code = None
+        self.usage = {}
+        self.done = threading.Event()
+        read_fd, write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, "r", encoding=OUTPUT_ENCODING, errors="replace")
+        try:
+            server.submit(self, script_path, write_fd, args, env, profile)
+        except Exception:
+            self.stdout.close()
+            raise
+        finally:
+            # 寫入端已交給子進程，本地關閉後子進程結束時才會讀到 EOF
+            os.close(write_fd)
+
+    def lines(self):
+        yield from self.stdout
+
+    def finish(self, return_code, usage=None):
+        self.return_code = return_code
+        self.usage = usage or {}
+        self.done.set()
+
+    def wait(self):
+        self.done.wait()
+        self.stdout.close()
+        return self.return_code
+
+    def terminate(self):
+        if self.pid:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def kill_tree(self):
+        # 尚未收到 fork server 回報結束時 pid 仍屬於這個步驟
+        if self.pid and not self.done.is_set():
+            kill_tree(self.pid)
+
+
+class ForkServer:
+    """
+    預先 import 重量級模組的 fork server (僅 POSIX)。
+
+    與 WorkerPool 不同，每個步驟仍是全新的子進程，模組層級的狀態不會在步驟間殘留，
+    但已載入的模組透過 copy-on-write 共用，不必重新 import。
+    """
+
+    def __init__(self, python_bin, preload_modules):
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock = parent_sock
+        self.process = subprocess.Popen(
+            [python_bin, "-u", FORK_SERVER_SCRIPT, str(child_sock.fileno()), json.dumps(list(preload_modules))],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            pass_fds=[child_sock.fileno()]
+        )
+        child_sock.close()
+        self.lock = threading.Lock()
+        self.tasks = {} # request id -> ForkTask
+        self.next_id = 0
+
+        ready = self.process.stdout.readline()
+        if not ready:
+            raise RuntimeError(f"Fork server failed to start, exit code: {self.process.wait()}")
+        self.preload_errors = json.loads(ready).get("failed", {})
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def submit(self, task, script_path, out_fd, args=(), env=None, profile=None):
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+            self.tasks[request_id] = task
+        request = {"id": request_id, "script": script_path, "cwd": os.getcwd(), "args": list(args), "env": env or {}, "profile": profile}
+        try:
+            socket.send_fds(self.sock, [json.dumps(request).encode()], [out_fd])
+        except OSError:
+            with self.lock:
+                self.tasks.pop(request_id, None)
+            raise
+
+    def _read_replies(self):
+        for line in self.process.stdout:
+            message = json.loads(line)
+            with self.lock:
+                task = self.tasks.get(message.get("id"))
+                if task is None:
+                    continue
+                if "pid" in message:
+                    task.pid = message["pid"]
+                if "exit" in message:
+                    del self.tasks[message["id"]]
+            if "exit" in message:
+                task.finish(message["exit"], message.get("usage"))
+        # fork server 意外結束：等待中的步驟全部視為失敗
+        with self.lock:
+            orphans, self.tasks = list(self.tasks.values()), {}
+        for task in orphans:
+            task.finish(-1)
+
+    def shutdown(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class AsyncLoop:
+    """
+    單一執行緒上的 asyncio 事件迴圈。
+
+    所有 "async" 步驟的子進程都在這個迴圈上等待輸出與結束，
+    同時執行數百個步驟也不需要數百個讀取執行緒。
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        if sys.version_info < (3, 12) and hasattr(asyncio, "PidfdChildWatcher") and hasattr(os, "pidfd_open"):
+            # 3.11 以前預設的 ThreadedChildWatcher 每個子進程一條等待執行緒，改用 pidfd 在迴圈上等待
+            try:
+                os.close(os.pidfd_open(os.getpid()))
+                watcher = asyncio.PidfdChildWatcher()
+                watcher.attach_loop(self.loop)
+                asyncio.set_child_watcher(watcher)
+            except OSError:
+                pass
+        ready.set()
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """可從任何執行緒呼叫，回傳 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class AsyncProcessTask:
+    """在 AsyncLoop 上執行的子進程；輸出以區塊讀取後切成行，整批交給 on_lines"""
+
+    def __init__(self, loop, python_bin, script_path, args=(), env=None, profile=None):
+        self.loop = loop
+        self.command = [python_bin, "-u"] + script_command(script_path, args, profile)
+        self.env = {**os.environ, **env} if env else None
+        self.process = None
+        self.terminated = False
+        self.usage = {}
+
+    def _sample_usage(self):
+        # 峰值記憶體取歷次取樣的最大值 (子進程結束後 /proc 不再提供)
+        usage = proc_usage(self.process.pid)
+        if usage:
+            usage["max_rss_kb"] = max(usage.get("max_rss_kb", 0), self.usage.get("max_rss_kb", 0))
+            self.usage = usage
+
+    async def _sample_loop(self):
+        while True:
+            self._sample_usage()
+            await asyncio.sleep(PROC_SAMPLE_S)
+
+    async def run(self, on_lines):
+        """執行到子進程結束並回傳結束碼 (只能在 AsyncLoop 上 await)"""
+        kwargs = {"startupinfo": hidden_startupinfo()} if os.name == 'nt' else {}
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self.env,
+            **kwargs
+        )
+        if self.terminated:
+            self._terminate()
+        # 子進程由 child watcher 回收，拿不到 wait4 的 rusage，改為定期取樣 /proc
+        sampler = self.loop.create_task(self._sample_loop()) if os.path.exists("/proc/self/stat") else None
+        try:
+            decoder = codecs.getincrementaldecoder(OUTPUT_ENCODING)(errors="replace")
+            partial = "" # 尚未收到換行的尾段
+            while True:
+                chunk = await self.process.stdout.read(READ_CHUNK)
+                if not chunk:
+                    break
+                lines = (partial + decoder.decode(chunk)).split("\n")
+                partial = lines.pop()
+                if lines:
+                    on_lines([line.rstrip("\r") for line in lines])
+            partial += decoder.decode(b"", final=True)
+            if partial:
+                on_lines([partial.rstrip("\r")])
+        finally:
+            if sampler:
+                sampler.cancel()
+                # 輸出關閉時子進程多半已結束但尚未回收，此時的 CPU 時間即為最終值
+                self._sample_usage()
+        return await self.process.wait()
+
+    def terminate(self):
+        """可從任何執行緒呼叫"""
+        self.terminated = True
+        self.loop.call_soon_threadsafe(self._terminate)
+
+    def _terminate(self):
+        if self.process is None or self.process.returncode is not None:
+            return
+        if os.name == 'nt':
+            self.process.terminate()
+            return
+        # Popen.terminate() 會先以 waitpid 檢查，可能搶先回收子進程，使 child watcher 取不到結束碼
+        try:
+            os.kill(self.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def kill_tree(self):
+        """可從任何執行緒呼叫"""
+        if self.process is not None and self.process.returncode is None:
+            kill_tree(self.process.pid)
+
+
+class TaskLauncher:
+    """依步驟設定 (`executor`) 選擇啟動方式"""
+
+    def __init__(self, python_bin, worker_pool_size=4, worker_max_tasks=50, preload_modules=(), log=None):
+        self.python_bin = python_bin
+        self.worker_pool = WorkerPool(python_bin, worker_pool_size, worker_max_tasks)
+        self.preload_modules = list(preload_modules)
+        self.fork_server = None
+        self.fork_lock = threading.Lock()
+        self.async_loop = None
+        self.async_lock = threading.Lock()
+        self.log = log or (lambda message: None)
+
+    def get_fork_server(self):
+        """第一次使用時才啟動 fork server；若已結束則重新啟動"""
+        with self.fork_lock:
+            if self.fork_server is None or not self.fork_server.alive():
+                self.fork_server = ForkServer(self.python_bin, self.preload_modules)
+                for name, error in self.fork_server.preload_errors.items():
+                    self.log(f"[WARN] Fork server could not preload '{name}': {error}\n")
+            return self.fork_server
+
+    def get_async_loop(self):
+        """第一次使用時才啟動 async 執行器的事件迴圈"""
+        with self.async_lock:
+            if self.async_loop is None:
+                self.async_loop = AsyncLoop()
+            return self.async_loop
+
+    def start_async(self, script_path, args=(), env=None, profile=None):
+        """建立 "async" 步驟的任務，由呼叫端在 get_async_loop() 上 await task.run()"""
+        return AsyncProcessTask(self.get_async_loop().loop, self.python_bin, script_path, args, env, profile)
+
+    def start(self, step, script_path, args=(), env=None, profile=None):
+        """args：附加在腳本後的命令列參數；env：額外的環境變數；profile：以 cProfile 執行並寫出的 .pstats 路徑"""
+        executor = step.get("executor", "process")
+        if executor == "async":
+            raise ValueError("The 'async' executor runs on the event loop, use start_async()")
+        if executor == "worker":
+            return self.worker_pool.run(script_path, args, env, profile)
+        if executor == "fork":
+            # Windows 沒有 fork，退回一般子進程
+            if hasattr(os, "fork"):
+                return ForkTask(self.get_fork_server(), script_path, args, env, profile)
+            return ProcessTask(self.python_bin, script_path, args, env, profile)
+        if executor != "process":
+            raise ValueError(f"Unknown executor '{executor}'")
+        return ProcessTask(self.python_bin, script_path, args, env, profile)
+
+    def shutdown(self):
+        self.worker_pool.shutdown()
+        if self.fork_server:
+            self.fork_server.shutdown()
+        if self.async_loop:
+            self.async_loop.shutdown()
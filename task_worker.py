@@ -0,0 +1,115 @@
+"""
+常駐的 Python worker 直譯器 (由 task_launcher.WorkerPool 啟動，不直接執行)。
+
+協定：
+- stdin 每行一個 JSON 指令：{"script": "tasks/xxx.py", "cwd": "...", "args": [...], "env": {...}}
+- 腳本以 runpy 方式執行，輸出直接寫到 stdout
+- 腳本結束後輸出一行 `<SENTINEL><exit code> <資源用量 JSON>` 代表該任務完成
+- 指令帶有 "profile" (.pstats 路徑) 時以 cProfile 執行腳本
+
+`python task_worker.py --profile <out.pstats> <script> [args...]` 則是單次執行：
+以 cProfile 執行一個腳本後以其結束碼離開 (一般子進程模式的 profile 使用)。
+"""
+import cProfile
+import json
+import os
+import runpy
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError: # Windows 沒有 resource 模組
+    resource = None
+
+SENTINEL = "\x1e__WORKFLOW_TASK_DONE__"
+
+
+def usage_fields(rusage, before=None):
+    """rusage -> {"user_s", "sys_s", "max_rss_kb"}；before 為任務開始時的 rusage，CPU 時間取差值"""
+    user, system = rusage.ru_utime, rusage.ru_stime
+    if before is not None:
+        user -= before.ru_utime
+        system -= before.ru_stime
+    # macOS 的 ru_maxrss 單位是 bytes，Linux 是 KB
+    max_rss = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+    return {"user_s": round(user, 3), "sys_s": round(system, 3), "max_rss_kb": max_rss}
+
+
+def run_task(script, cwd, args=(), env=None, profile=None):
+    """執行腳本並回傳結束碼；profile 為 .pstats 路徑時以 cProfile 執行並寫出結果"""
+    saved_argv = sys.argv[:]
+    saved_environ = dict(os.environ)
+    saved_path = sys.path[:]
+    saved_stdin = sys.stdin
+    saved_stdout = sys.stdout
+    saved_cwd = os.getcwd()
+    task_stdin = open(os.devnull, "r")
+    profiler = cProfile.Profile() if profile else None
+    exit_code = 0
+    try:
+        os.chdir(cwd)
+        sys.argv = [script] + list(args)
+        # 實例參數 (環境變數) 只在此任務期間生效
+        os.environ.update(env or {})
+        # 與 `python script.py` 一致：腳本所在目錄放在 sys.path 第一位
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        # stdin 是指令通道，不能讓腳本讀到
+        sys.stdin = task_stdin
+        if profiler:
+            profiler.enable()
+        try:
+            runpy.run_path(script, run_name="__main__")
+        finally:
+            if profiler:
+                profiler.disable()
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        if profiler:
+            try:
+                profiler.dump_stats(profile)
+            except OSError as e:
+                print(f"[WARN] Could not write profile: {e}", file=sys.stderr)
+        task_stdin.close()
+        sys.stdin = saved_stdin
+        # 腳本若替換了 stdout / stderr，還原後才能送出完成訊號
+        sys.stdout = sys.stderr = saved_stdout
+        sys.argv = saved_argv
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        sys.path[:] = saved_path
+        os.chdir(saved_cwd)
+    return exit_code
+
+
+def main():
+    # 任務的 stderr 與 stdout 合併，與一般子進程模式相同
+    sys.stderr = sys.stdout
+    command_stream = sys.stdin
+    for raw in command_stream:
+        if not raw.strip():
+            continue
+        command = json.loads(raw)
+        before = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+        exit_code = run_task(command["script"], command.get("cwd", os.getcwd()), command.get("args", []), command.get("env"), command.get("profile"))
+        # CPU 時間為本任務的用量；峰值記憶體是 worker 進程至今的峰值
+        usage = usage_fields(resource.getrusage(resource.RUSAGE_SELF), before) if resource else {}
+        sys.stdout.flush()
+        sys.stdout.write(f"{SENTINEL}{exit_code} {json.dumps(usage)}\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "--profile":
+        sys.exit(run_task(sys.argv[3], os.getcwd(), sys.argv[4:], profile=sys.argv[2]))
+    main()
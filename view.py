@@ -1,9 +1,25 @@
 import tkinter as tk
 import time, os
-from tkinter import scrolledtext
 from tkinter import ttk
-from ctypes import windll
+from tkinter import font as tkfont
+try:
+    from ctypes import windll
+except ImportError: # 非 Windows (例如在 Xvfb 下跑效能測試) 沒有 windll
+    windll = None
 from resource_helper import get_resource_path
+from view_flow_picker import FlowPicker
+
+# 畫布縮放範圍與低細節 (只畫矩形、不畫文字) 的門檻
+MIN_ZOOM = 0.1
+MAX_ZOOM = 3.0
+LOD_ZOOM = 0.6
+# 可視範圍裁切用的空間索引格子大小 (版面座標)
+GRID_CELL_W = 260
+GRID_CELL_H = 120
+# 時間軸 (Gantt) 面板
+TIMELINE_WIDTH = 360
+TIMELINE_ROW_H = 26
+TIMELINE_LABEL_W = 48
 
 class WorkflowView:
     def __init__(self, root, presenter):
@@ -14,17 +30,35 @@ class WorkflowView:
         self.colors = {
             "bg": "#FFFFFF", "sidebar": "#F5F5F5", "accent": "#002F6C", "text": "#333333",
             "node_start": "#002F6C", "node_pending": "#00DEB6", "node_finished": "#FFFFFF", 
-            "node_running": "#002F6C", "node_skipped": "#E0E0E0", "node_error": "#F78C9C", "line": "#333333"
+            "node_running": "#002F6C", "node_skipped": "#E0E0E0", "node_error": "#F78C9C", "node_cached": "#D6E4F0", "node_timeout": "#F5A623", "line": "#333333"
         } 
         
-        self.node_ids = []
-        self.text_ids = []
-        self.line_ids = []
+        self.node_items = {} # 步驟索引 -> 畫布物件 (只包含可視範圍內的節點)
+        self.line_ids = {} # (來源, 目標) -> 連接線物件
+        self.item_owner = {} # 畫布物件 -> ("node", 步驟索引) / ("edge", 連接線)
+        self.edge_lod = {} # 連接線 -> 建立時是否為低細節
+        self.node_states = {} # 步驟索引 -> 狀態 (不論是否在可視範圍)
+        self.node_progress = {} # 步驟索引 -> 執行中步驟回報的進度 (0~1)
+        self.scene = {"positions": {}, "labels": {}, "edges": {}, "grid_nodes": {}, "grid_edges": {}, "bounds": (0, 0, 1, 1)}
+        self.viewport_sync_pending = False
         self.hover_tooltip = None
         self.dash_offset = 0
+        self.animation_after_id = None
         self.cancel_icon_id = None # 取消圖示 ID
         self.hover_line_id = None # 當前 hover 的線段 ID
 
+        # 節點狀態顏色: (背景, 文字)
+        self.status_colors = {
+            "start": (self.colors["node_start"], "#FFFFFF"),
+            "running": (self.colors["node_running"], "#FFFFFF"),
+            "finished": (self.colors["node_finished"], self.colors["text"]),
+            "pending": (self.colors["node_pending"], self.colors["text"]),
+            "skipped": (self.colors["node_skipped"], "#999999"),
+            "cached": (self.colors["node_cached"], self.colors["text"]),
+            "timeout": (self.colors["node_timeout"], "#FFFFFF"),
+            "error": (self.colors["node_error"], "#FFFFFF")
+        }
+
         self._setup_high_dpi()
         self._apply_styles()
         self.is_welcome_mode = False # 是否在歡迎畫面模式
@@ -78,15 +112,32 @@ class WorkflowView:
         self.icon = self.icon.subsample(20, 20) # 縮小icon
         ttk.Label(sidebar, text="  Workflow Engine", image=self.icon, compound="left", font=('Microsoft JhengHei', 20, 'bold'), background=self.colors["sidebar"]).pack(anchor="w", pady=(0, 10))
         
-        self.combo = ttk.Combobox(sidebar, state="readonly", font=('Microsoft JhengHei', 18, 'bold'), justify='center')
-        self.combo.pack(fill="x", pady=(5, 25))
-        self.combo.bind("<<ComboboxSelected>>", lambda e: self.presenter.handle_flow_change(self.combo.get()))
+        # 流程選單：輸入文字即時搜尋 key、標題與描述
+        self.flow_picker = FlowPicker(sidebar, self.presenter.handle_flow_change, self.colors,
+                                      font=('Microsoft JhengHei', 18, 'bold'), justify='center')
+        self.flow_picker.pack(fill="x", pady=(5, 25))
 
         self.msg_desc = tk.Message(sidebar, text="Please select a flow...", width=200, bg=self.colors["sidebar"], fg=self.colors["text"], font=('Microsoft JhengHei', 18))
         self.msg_desc.pack(fill="x", pady=10)
 
         self.btn_run = ttk.Button(sidebar, text="▶ Start", style='big_Button.TButton', command=self.presenter.handle_run_click)
         self.btn_run.pack(side="bottom", fill="x")
+
+        # 執行參數 (key=value，以空白分隔)，每次按下 Start 建立新的實例
+        ttk.Label(sidebar, text="Params", font=('Microsoft JhengHei', 14, 'bold'), background=self.colors["sidebar"]).pack(anchor="w")
+        self.var_params = tk.StringVar()
+        ttk.Entry(sidebar, textvariable=self.var_params, font=('Microsoft JhengHei', 14)).pack(fill="x", pady=(5, 5))
+        # 勾選後本次執行的所有步驟以 cProfile 執行
+        self.var_profile = tk.BooleanVar(value=False)
+        tk.Checkbutton(sidebar, text="Profile steps", variable=self.var_profile, font=('Microsoft JhengHei', 12),
+                       bg=self.colors["sidebar"], fg=self.colors["text"], activebackground=self.colors["sidebar"]).pack(anchor="w", pady=(0, 15))
+
+        # 執行中 / 已結束的實例，點選後切換畫布與日誌
+        ttk.Label(sidebar, text="Runs", font=('Microsoft JhengHei', 14, 'bold'), background=self.colors["sidebar"]).pack(anchor="w")
+        self.instance_list = tk.Listbox(sidebar, height=6, font=('Microsoft JhengHei', 12), exportselection=False, activestyle="none",
+                                        bg=self.colors["bg"], fg=self.colors["text"], selectbackground=self.colors["accent"], relief="flat")
+        self.instance_list.pack(fill="both", expand=True, pady=(5, 20))
+        self.instance_list.bind("<<ListboxSelect>>", lambda e: self._on_instance_selected())
         
         # 畫布與日誌區 (右側)
         right_panel = ttk.Frame(self.root, padding=(0, 0, 40, 40))
@@ -94,6 +145,7 @@ class WorkflowView:
         right_panel.rowconfigure(0, weight=3) # 畫布比例
         right_panel.rowconfigure(1, weight=1) # 日誌區比例
         right_panel.columnconfigure(0, weight=1)
+        right_panel.columnconfigure(1, weight=0) # 時間軸固定寬度
 
         # 畫布區
         self.canvas = tk.Canvas(right_panel, bg=self.colors["bg"], highlightthickness=0)
@@ -109,6 +161,17 @@ class WorkflowView:
         self.canvas.bind("<MouseWheel>", self._on_zoom)
         self.current_zoom = 1.0
 
+        # 視窗大小改變時重新計算可視範圍；節點 / 連接線事件以 tag 綁定
+        self.canvas.bind("<Configure>", lambda e: self._schedule_viewport_sync())
+        self._bind_canvas_items()
+
+        # 時間軸 (畫布右側)：顯示中實例每個步驟的開始與結束時間
+        self.timeline = tk.Canvas(right_panel, width=TIMELINE_WIDTH, bg=self.colors["sidebar"], highlightthickness=0)
+        self.timeline.grid(row=0, column=1, sticky="ns", pady=(40, 20), padx=(20, 0))
+        self.timeline.bind("<Configure>", lambda e: self.draw_timeline(*self.timeline_data))
+        self.timeline.bind("<MouseWheel>", lambda e: self.timeline.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.timeline_data = ([], 0)
+
         # 在 right_panel 中建立重置按鈕
         self.btn_reset_canvas = ttk.Button(
         right_panel, 
@@ -147,11 +210,27 @@ class WorkflowView:
         # x=-150 代表從 relx=0.98 的位置往左偏移 150px
         self.btn_help.place(relx=0.98, rely=0.02, x=-150, anchor="ne", width=40, height=40)
 
+        # 建立歷史日誌按鈕 (在說明書按鈕左邊)
+        self.btn_history = ttk.Button(
+            right_panel,
+            text="📜",
+            command=self.presenter.handle_history_click,
+            style='small_Button.TButton'
+        )
+        self.btn_history.place(relx=0.98, rely=0.02, x=-200, anchor="ne", width=40, height=40)
+
         # 執行回饋視窗 (日誌區)
-        self.log_area = scrolledtext.ScrolledText(
-            right_panel, 
+        # 內容存放在 model 的環狀緩衝區，Text 只呈現目前可見的幾行
+        log_frame = ttk.Frame(right_panel)
+        log_frame.grid(row=1, column=0, columnspan=2, sticky="nsew")
+        log_frame.rowconfigure(0, weight=1)
+        log_frame.columnconfigure(0, weight=1)
+
+        self.log_font = tkfont.Font(font=('Microsoft JhengHei', 12))
+        self.log_area = tk.Text(
+            log_frame, 
             height=10, 
-            font=('Microsoft JhengHei', 12), 
+            font=self.log_font, 
             bg=self.colors["bg"], 
             fg=self.colors["text"],
             padx=15, 
@@ -159,17 +238,24 @@ class WorkflowView:
             borderwidth=1,
             relief="flat"
         )
-        self.log_area.grid(row=1, column=0, sticky="nsew")
+        self.log_area.grid(row=0, column=0, sticky="nsew")
         self.log_area.config(state="disabled") # 預設唯讀
+
+        self.log_scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self._on_log_scroll, style='NoArrow.Vertical.TScrollbar')
+        self.log_scrollbar.grid(row=0, column=1, sticky="ns")
+        self.log_area.bind("<MouseWheel>", self._on_log_wheel)
+        self.log_area.bind("<Configure>", lambda e: self.render_log())
+        self.log_top_seq = 0 # 可見區第一行的序號
+        self.log_follow = True # 是否自動跟隨最新輸出
         
         # 設定捲軸標籤顏色 (選用)
         self.log_area.tag_config("info", foreground="#5D5D5D")
         self.log_area.tag_config("error", foreground=self.colors["node_error"])
         self.log_area.tag_config("success", foreground="#4CAF50")
 
-    def create_rounded_rect(self, x1, y1, x2, y2, radius=25, **kwargs):
-        """繪製圓角矩形 (利用 polygon + smooth=True)"""
-        points = [
+    def _rounded_rect_points(self, x1, y1, x2, y2, radius=25):
+        """圓角矩形的 polygon 頂點 (搭配 smooth=True)"""
+        return [
             x1+radius, y1,
             x1+radius, y1,
             x2-radius, y1,
@@ -191,47 +277,243 @@ class WorkflowView:
             x1, y1+radius,
             x1, y1
         ]
-        return self.canvas.create_polygon(points, **kwargs, smooth=True)
 
-    def draw_workflow(self, steps, selected_idx):
-        """繪製流程圖"""
+    def create_rounded_rect(self, x1, y1, x2, y2, radius=25, **kwargs):
+        """繪製圓角矩形 (利用 polygon + smooth=True)"""
+        return self.canvas.create_polygon(self._rounded_rect_points(x1, y1, x2, y2, radius), **kwargs, smooth=True)
+
+    def _layout_nodes(self, graph):
+        """依相依圖層級計算節點中心座標，同層節點水平並排"""
+        rows = {}
+        for i in range(len(graph.steps)):
+            rows.setdefault(graph.levels[i], []).append(i)
+        positions = {}
+        for level, members in rows.items():
+            for k, i in enumerate(members):
+                x = 250 + (k - (len(members) - 1) / 2) * 260
+                y = 100 + level * 120
+                positions[i] = (x, y)
+        return positions
+
+    def _clear_scene(self):
+        """清空畫布與保留的場景資料"""
         self.canvas.delete("all")
-        self.node_ids, self.text_ids, self.line_ids = [], [], []
-        x = 250
-        for i, step in enumerate(steps):
-            y = 100 + (i * 120)
-            if i < len(steps) - 1:
-                # 檢查是否被禁用
-                if i not in self.presenter.model.disabled_lines:
-                    line_id = self.canvas.create_line(x, y+35, x, y+85, arrow=tk.LAST, width=4, fill=self.colors["line"])
-                    self.line_ids.append(line_id)
-                    
-                    # 綁定 Hover 事件顯示取消按鈕
-                    self.canvas.tag_bind(line_id, "<Enter>", lambda e, lid=i, item_id=line_id: self.show_cancel_icon(lid, item_id))
-                    self.canvas.tag_bind(line_id, "<Leave>", lambda e: self.hide_cancel_icon_delayed())
+        self.node_items, self.line_ids, self.item_owner, self.edge_lod = {}, {}, {}, {}
+
+    def _bind_canvas_items(self):
+        """以 tag 統一綁定節點與連接線事件，物件建立 / 刪除時不必逐一綁定"""
+        self.canvas.tag_bind("node_body", "<Button-1>", lambda e: self._on_item_event(e, "click"))
+        self.canvas.tag_bind("node_label", "<Button-1>", lambda e: self._on_item_event(e, "click"))
+        self.canvas.tag_bind("node_body", "<Enter>", lambda e: self._on_item_event(e, "enter"))
+        self.canvas.tag_bind("node_body", "<Leave>", lambda e: self._on_item_event(e, "leave"))
+        self.canvas.tag_bind("edge", "<Enter>", lambda e: self._on_item_event(e, "enter"))
+        self.canvas.tag_bind("edge", "<Leave>", lambda e: self.hide_cancel_icon_delayed())
+
+    def _on_item_event(self, event, action):
+        current = self.canvas.find_withtag("current")
+        if not current or current[0] not in self.item_owner: return
+        item_id = current[0]
+        kind, key = self.item_owner[item_id]
+        if kind == "edge":
+            self.show_cancel_icon(key, item_id)
+        elif action == "click":
+            self.presenter.handle_node_click(key)
+        else:
+            self.presenter.handle_hover(event, key, action == "enter")
+
+    def draw_workflow(self, graph, states, disabled=()):
+        """
+        繪製流程圖 (保留式場景 + 可視範圍裁切)。
+
+        版面資料 (座標、文字、連接線) 與空間索引保存在 self.scene，
+        只有與可視範圍相交的節點與連接線才會建立畫布物件 (見 _sync_viewport)。
+        重繪時只刪除位置或文字有變動的物件，其餘保留。
+        disabled 為被斬斷 (不畫出) 的連接線。
+        """
+        positions = self._layout_nodes(graph)
+        labels = {i: f"{i+1}. {step['name']}" for i, step in enumerate(graph.steps)}
+        edges = {}
+        for src, dst in graph.edges:
+            # 檢查是否被禁用
+            if (src, dst) in disabled:
+                continue
+            x1, y1 = positions[src]
+            x2, y2 = positions[dst]
+            edges[(src, dst)] = (x1, y1+35, x2, y2-35)
+
+        # 有變動的物件先刪除，稍後由 _sync_viewport 依新資料重建
+        old = self.scene
+        for idx in list(self.node_items):
+            if positions.get(idx) != old["positions"].get(idx) or labels.get(idx) != old["labels"].get(idx):
+                self._drop_node(idx)
+        for edge in list(self.line_ids):
+            if edges.get(edge) != old["edges"].get(edge):
+                self._drop_edge(edge)
+
+        # 空間索引：格子 -> 節點 / 連接線
+        grid_nodes, grid_edges = {}, {}
+        for i, (x, y) in positions.items():
+            for cell in self._cells(x-110, y-30, x+110, y+30):
+                grid_nodes.setdefault(cell, []).append(i)
+        for edge, (x1, y1, x2, y2) in edges.items():
+            for cell in self._cells(min(x1, x2), y1, max(x1, x2), y2):
+                grid_edges.setdefault(cell, []).append(edge)
+
+        if positions:
+            bounds = (min(x for x, _ in positions.values()) - 160, min(y for _, y in positions.values()) - 80,
+                      max(x for x, _ in positions.values()) + 160, max(y for _, y in positions.values()) + 80)
+        else:
+            bounds = (0, 0, 1, 1)
+        self.scene = {"positions": positions, "labels": labels, "edges": edges,
+                      "grid_nodes": grid_nodes, "grid_edges": grid_edges, "bounds": bounds}
+        self._update_scrollregion()
+        self._sync_viewport()
+        self.set_node_states(states)
+
+    def _cells(self, x1, y1, x2, y2):
+        """矩形 (版面座標) 覆蓋到的格子"""
+        for cx in range(int(x1 // GRID_CELL_W), int(x2 // GRID_CELL_W) + 1):
+            for cy in range(int(y1 // GRID_CELL_H), int(y2 // GRID_CELL_H) + 1):
+                yield (cx, cy)
+
+    def _update_scrollregion(self):
+        z = self.current_zoom
+        x1, y1, x2, y2 = self.scene["bounds"]
+        self.canvas.config(scrollregion=(x1*z, y1*z, x2*z, y2*z))
+
+    def _schedule_viewport_sync(self):
+        """平移 / 縮放時合併多次事件，閒置時再同步一次"""
+        if not self.viewport_sync_pending:
+            self.viewport_sync_pending = True
+            self.root.after_idle(self._sync_viewport)
+
+    def _sync_viewport(self):
+        """只為可視範圍 (含緩衝邊界) 內的節點與連接線建立畫布物件，其餘刪除"""
+        self.viewport_sync_pending = False
+        if self.is_welcome_mode: return
+        z = self.current_zoom
+        lod = z < LOD_ZOOM
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        margin_x, margin_y = width / 2, height / 2
+        x1 = (self.canvas.canvasx(0) - margin_x) / z
+        y1 = (self.canvas.canvasy(0) - margin_y) / z
+        x2 = (self.canvas.canvasx(width) + margin_x) / z
+        y2 = (self.canvas.canvasy(height) + margin_y) / z
+
+        visible_nodes, visible_edges = set(), set()
+        for cell in self._cells(x1, y1, x2, y2):
+            visible_nodes.update(self.scene["grid_nodes"].get(cell, ()))
+            visible_edges.update(self.scene["grid_edges"].get(cell, ()))
+
+        for idx in list(self.node_items):
+            if idx not in visible_nodes:
+                self._drop_node(idx)
+        for edge in list(self.line_ids):
+            if edge not in visible_edges:
+                self._drop_edge(edge)
+
+        for edge in visible_edges:
+            line_id = self.line_ids.get(edge)
+            if line_id and self.edge_lod.get(edge) != lod:
+                self._drop_edge(edge)
+                line_id = None
+            coords = [c * z for c in self.scene["edges"][edge]]
+            if line_id is None:
+                if lod:
+                    line_id = self.canvas.create_line(*coords, width=1, fill=self.colors["line"], tags="edge")
                 else:
-                    self.line_ids.append(None) # 佔位，保持 index 一致
-            
+                    line_id = self.canvas.create_line(*coords, arrow=tk.LAST, width=4, fill=self.colors["line"], tags="edge")
+                self.line_ids[edge] = line_id
+                self.item_owner[line_id] = ("edge", edge)
+                self.edge_lod[edge] = lod
+            elif self.canvas.coords(line_id) != coords:
+                self.canvas.coords(line_id, *coords)
+
+        for idx in visible_nodes:
+            node = self.node_items.get(idx)
+            if node and node["lod"] != lod:
+                self._drop_node(idx)
+                node = None
+            if node is None:
+                self._create_node(idx, lod)
+            elif node["zoom"] != z:
+                self._place_node(idx)
+
+        # 讓節點蓋在線的上方
+        if self.line_ids and self.node_items:
+            self.canvas.tag_raise("node", "edge")
+
+    def _node_rect(self, idx):
+        z = self.current_zoom
+        x, y = self.scene["positions"][idx]
+        return (x-110)*z, (y-30)*z, (x+110)*z, (y+30)*z
+
+    def _create_node(self, idx, lod):
+        x1, y1, x2, y2 = self._node_rect(idx)
+        bg_color, txt_color = self.status_colors.get(self.node_states.get(idx, "pending"), self.status_colors["pending"])
+        if lod:
+            # 低細節：單純矩形，不畫文字
+            rect = self.canvas.create_rectangle(x1, y1, x2, y2, fill=bg_color, outline="#F5F5F5", width=1, tags=("node", "node_body"))
+            text_id = None
+        else:
             # 使用圓角矩形，預設半徑 20
-            rect = self.create_rounded_rect(x-110, y-30, x+110, y+30, radius=20, fill=self.colors["node_pending"], outline="#333333", width=1)
-            text_id = self.canvas.create_text(x, y, text=f"{i+1}. {step['name']}", font=('Microsoft JhengHei', 16), fill=self.colors["text"])
-            
-            # 綁定事件回傳給 Presenter
-            self.canvas.tag_bind(rect, "<Button-1>", lambda e, idx=i: self.presenter.handle_node_click(idx))
-            self.canvas.tag_bind(rect, "<Enter>", lambda e, idx=i: self.presenter.handle_hover(e, idx, True))
-            self.canvas.tag_bind(rect, "<Leave>", lambda e, idx=i: self.presenter.handle_hover(e, idx, False))
-            self.canvas.tag_bind(text_id, "<Button-1>", lambda e, idx=i: self.presenter.handle_node_click(idx))
-            
-            self.node_ids.append(rect)
-            self.text_ids.append(text_id)
-        
-        # 重繪後重置縮放比例與捲動範圍，避免狀態不同步
-        self.current_zoom = 1.0
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
-        
-        self.update_node_colors(selected_idx, -1, selected_idx)
-        
-    def show_cancel_icon(self, line_idx, line_item_id):
+            rect = self.create_rounded_rect(x1, y1, x2, y2, radius=20*self.current_zoom, fill=bg_color, outline="#F5F5F5", width=1, tags=("node", "node_body"))
+            text_id = self.canvas.create_text((x1+x2)/2, (y1+y2)/2, text=self.scene["labels"][idx], font=('Microsoft JhengHei', 16), fill=txt_color, tags=("node", "node_label"))
+            self.item_owner[text_id] = ("node", idx)
+        self.item_owner[rect] = ("node", idx)
+        self.node_items[idx] = {"rect": rect, "text": text_id, "bar": None, "lod": lod, "zoom": self.current_zoom}
+        self._draw_progress(idx)
+
+    def _place_node(self, idx):
+        """縮放後更新節點座標 (不重建物件)"""
+        node = self.node_items[idx]
+        x1, y1, x2, y2 = self._node_rect(idx)
+        if node["lod"]:
+            self.canvas.coords(node["rect"], x1, y1, x2, y2)
+        else:
+            self.canvas.coords(node["rect"], *self._rounded_rect_points(x1, y1, x2, y2, 20*self.current_zoom))
+            self.canvas.coords(node["text"], (x1+x2)/2, (y1+y2)/2)
+        node["zoom"] = self.current_zoom
+        self._draw_progress(idx)
+
+    def _draw_progress(self, idx):
+        """執行中且有回報進度的節點在底部畫進度條，其他情況移除"""
+        node = self.node_items.get(idx)
+        if node is None:
+            return
+        value = self.node_progress.get(idx) if self.node_states.get(idx) == "running" else None
+        if value is None:
+            for item_id in node["bar"] or ():
+                self.canvas.delete(item_id)
+            node["bar"] = None
+            return
+        z = self.current_zoom
+        x1, y1, x2, y2 = self._node_rect(idx)
+        left, right, top, bottom = x1 + 16*z, x2 - 16*z, y2 - 12*z, y2 - 6*z
+        if node["bar"] is None:
+            # disabled：不攔截滑鼠事件，點選與提示仍由節點本體處理
+            track = self.canvas.create_rectangle(left, top, right, bottom, fill="#4D6D9A", width=0, state="disabled", tags="node")
+            fill = self.canvas.create_rectangle(left, top, left, bottom, fill=self.colors["node_pending"], width=0, state="disabled", tags="node")
+            node["bar"] = (track, fill)
+        track, fill = node["bar"]
+        self.canvas.coords(track, left, top, right, bottom)
+        self.canvas.coords(fill, left, top, left + (right - left) * value, bottom)
+
+    def _drop_node(self, idx):
+        node = self.node_items.pop(idx)
+        for item_id in (node["rect"], node["text"], *(node["bar"] or ())):
+            if item_id:
+                self.canvas.delete(item_id)
+                self.item_owner.pop(item_id, None)
+
+    def _drop_edge(self, edge):
+        line_id = self.line_ids.pop(edge)
+        self.canvas.delete(line_id)
+        self.item_owner.pop(line_id, None)
+        self.edge_lod.pop(edge, None)
+
+    def show_cancel_icon(self, edge, line_item_id):
         """在線段上顯示取消圖示"""
         try:
             coords = self.canvas.coords(line_item_id)
@@ -246,7 +528,7 @@ class WorkflowView:
             self.canvas.delete(self.cancel_icon_id)
             
         self.cancel_icon_id = self.canvas.create_text(mid_x + 15, mid_y, text="❌", font=('Arial', 14), fill="red")
-        self.canvas.tag_bind(self.cancel_icon_id, "<Button-1>", lambda e: self.presenter.handle_line_cancel(line_idx))
+        self.canvas.tag_bind(self.cancel_icon_id, "<Button-1>", lambda e: self.presenter.handle_line_cancel(edge))
         # 讓滑鼠移到 icon 上也不會消失
         self.canvas.tag_bind(self.cancel_icon_id, "<Enter>", lambda e: self.cancel_hide_timer())
         self.canvas.tag_bind(self.cancel_icon_id, "<Leave>", lambda e: self.hide_cancel_icon_delayed())
@@ -275,6 +557,7 @@ class WorkflowView:
         if getattr(self, 'is_welcome_mode', False): return
         # gain=1 代表 1:1 移動，移動感最自然
         self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self._schedule_viewport_sync()
 
     def _on_zoom(self, event):
         """處理畫布放大縮小"""
@@ -289,20 +572,31 @@ class WorkflowView:
 
         # 2. 限制縮放範圍 (避免過大或消失)
         new_zoom = self.current_zoom * zoom_factor
-        if not (0.5 < new_zoom < 3.0):
+        if not (MIN_ZOOM < new_zoom < MAX_ZOOM):
             return
-        self.current_zoom = new_zoom
 
-        # 3. 取得目前滑鼠在畫布上的座標 (Canvas Coordinates)
+        # 3. 取得目前滑鼠在畫布上的座標 (Canvas Coordinates)，換算成版面座標
         # 這非常重要，canvasx/y 會考量到目前的捲動偏移量
-        x = self.canvas.canvasx(event.x)
-        y = self.canvas.canvasy(event.y)
+        x = self.canvas.canvasx(event.x) / self.current_zoom
+        y = self.canvas.canvasy(event.y) / self.current_zoom
+        self.current_zoom = new_zoom
 
-        # 4. 對畫布上所有標籤為 "all" 的物件進行縮放
-        self.canvas.scale("all", x, y, zoom_factor, zoom_factor)
-        
-        # 5. 更新捲動範圍，確保縮放後拖拉依然正常
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
+        # 4. 不再對所有物件 scale，只更新捲動範圍並讓滑鼠下的點維持不動，
+        #    可視範圍內的物件由 _sync_viewport 依新倍率重新定位
+        self._update_scrollregion()
+        self._scroll_canvas_to(x * new_zoom - event.x, y * new_zoom - event.y)
+        self._schedule_viewport_sync()
+
+    def _scroll_canvas_to(self, left, top):
+        """捲動畫布，使畫布座標 (left, top) 位於可視區左上角"""
+        sr = self.canvas.config("scrollregion")[4]
+        if not sr: return
+        sr = [float(v) for v in sr.split()] # x1, y1, x2, y2
+        sr_width = sr[2] - sr[0]
+        sr_height = sr[3] - sr[1]
+        if sr_width == 0 or sr_height == 0: return
+        self.canvas.xview_moveto((left - sr[0]) / sr_width)
+        self.canvas.yview_moveto((top - sr[1]) / sr_height)
 
     def reset_view_state(self):
         """將畫布視角歸零"""
@@ -312,93 +606,80 @@ class WorkflowView:
         self.canvas.xview_moveto(0)
         self.canvas.yview_moveto(0)
         # 重設縮放變換，最安全的方法是清空後由 presenter 觸發重繪
-        self.canvas.delete("all")
+        self._clear_scene()
         self.clear_log() # 清空Log
 
-    def update_node_colors(self, current_idx, error_idx, start_idx):
-        """更新節點顏色"""
-        # 定義狀態顏色: (背景, 文字)
-        STATUS_COLORS = {
-            "start": (self.colors["node_start"], "#FFFFFF"),
-            "running": (self.colors["node_running"], "#FFFFFF"),
-            "finished": (self.colors["node_finished"], self.colors["text"]),
-            "pending": (self.colors["node_pending"], self.colors["text"]),
-            "skipped": (self.colors["node_skipped"], "#999999"),
-            "error": (self.colors["node_error"], "#FFFFFF")
-        }
-
-        for i, rect in enumerate(self.node_ids):
-            bg_color, txt_color = STATUS_COLORS["pending"] # 預設
-
-            if i == error_idx: 
-                bg_color, txt_color = STATUS_COLORS["error"]
-            elif i == current_idx: 
-                bg_color, txt_color = STATUS_COLORS["running"]
-            elif i < start_idx: 
-                bg_color, txt_color = STATUS_COLORS["skipped"]
-            elif i < current_idx and current_idx != -1: # i 在 start與current之間 -> Finished
-                bg_color, txt_color = STATUS_COLORS["finished"]
-            elif i == start_idx and current_idx == -1: # 還沒開始 -> Start
-                bg_color, txt_color = STATUS_COLORS["start"]
-            else:
-                bg_color, txt_color = STATUS_COLORS["pending"]
-            
-            self.canvas.itemconfig(rect, fill=bg_color, outline="#F5F5F5", width=1)
-            # 更新對應的文字顏色
-            if i < len(self.text_ids):
-                self.canvas.itemconfig(self.text_ids[i], fill=txt_color)
+    def set_node_state(self, idx, state):
+        """更新單一節點狀態；狀態未變或節點不在可視範圍時不操作畫布"""
+        if self.node_states.get(idx) == state:
+            return
+        self.node_states[idx] = state
+        node = self.node_items.get(idx)
+        if node is None:
+            return
+        bg_color, txt_color = self.status_colors.get(state, self.status_colors["pending"])
+        self.canvas.itemconfig(node["rect"], fill=bg_color)
+        # 更新對應的文字顏色
+        if node["text"]:
+            self.canvas.itemconfig(node["text"], fill=txt_color)
+        self._draw_progress(idx)
+
+    def set_node_progress(self, idx, value):
+        """更新執行中步驟的進度條 (value 0~1)"""
+        self.node_progress[idx] = value
+        self._draw_progress(idx)
+
+    def set_node_progresses(self, progress):
+        """切換實例時套用整組進度 ({步驟索引: 0~1})"""
+        changed = set(self.node_progress) | set(progress)
+        self.node_progress = dict(progress)
+        for idx in changed:
+            self._draw_progress(idx)
+
+    def set_node_states(self, states):
+        """套用整組節點狀態，只有變動的節點會被修改"""
+        for i, state in enumerate(states):
+            self.set_node_state(i, state)
 
     def center_on_node(self, node_idx):
         """將視角移動到指定節點，並保持置中"""
-        if node_idx < 0 or node_idx >= len(self.node_ids): return
-        
-        # 1. 取得目標節點的邊界框 (bbox 會自動考慮目前的 zoom)
-        rect_id = self.node_ids[node_idx]
-        bbox = self.canvas.bbox(rect_id) # (x1, y1, x2, y2)
-        if not bbox: return
-        
-        node_center_x = (bbox[0] + bbox[2]) / 2
-        node_center_y = (bbox[1] + bbox[3]) / 2
-
-        # 2. 取得目前畫布的可視區域大小
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-        
-        # 3. 取得目前的捲動範圍 (scrollregion)
-        sr = self.canvas.config("scrollregion")[4]
-        if not sr: return
-        sr = [float(x) for x in sr.split()] # x1, y1, x2, y2
-        sr_width = sr[2] - sr[0]
-        sr_height = sr[3] - sr[1]
-        
-        if sr_width == 0 or sr_height == 0: return
-
-        # 4. 計算要捲動到的目標位置 (fraction 0.0 ~ 1.0)
-        # 目標: 讓 node_center 位於視窗正中央
-        # view_left = node_center - (canvas_width / 2)
-        target_left = node_center_x - (canvas_width / 2)
-        target_top = node_center_y - (canvas_height / 2)
-
-        # 5. 轉換成比例 (相對於 scrollregion) (需扣除 sr 起始偏移)
-        x_fraction = (target_left - sr[0]) / sr_width
-        y_fraction = (target_top - sr[1]) / sr_height
-        
-        # 6. 執行捲動
-        self.canvas.xview_moveto(x_fraction)
-        self.canvas.yview_moveto(y_fraction)
-
-    def animate_lines_step(self, active_line_idx, is_animating):
-        """流程線設定"""
+        position = self.scene["positions"].get(node_idx)
+        if position is None: return
+
+        # 以版面座標 x 縮放倍率計算節點中心，節點不在畫面上 (尚未建立物件) 也能定位
+        node_center_x = position[0] * self.current_zoom
+        node_center_y = position[1] * self.current_zoom
+
+        # 讓 node_center 位於視窗正中央
+        target_left = node_center_x - (self.canvas.winfo_width() / 2)
+        target_top = node_center_y - (self.canvas.winfo_height() / 2)
+        self._scroll_canvas_to(target_left, target_top)
+        self._schedule_viewport_sync()
+
+    def reset_line_styles(self):
+        for lid in self.line_ids.values():
+            self.canvas.itemconfig(lid, dash=(), width=1, fill=self.colors["line"])
+
+    def animate_lines_step(self, active_lines, is_animating):
+        """流程線設定 (active_lines: 通往執行中步驟的連接線)"""
+        # 同一時間只保留一個動畫週期
+        if self.animation_after_id:
+            self.root.after_cancel(self.animation_after_id)
+            self.animation_after_id = None
         if not is_animating:
-            for lid in self.line_ids:
-                self.canvas.itemconfig(lid, dash=(), width=1, fill=self.colors["line"])
+            self.reset_line_styles()
             return
         
         self.dash_offset = (self.dash_offset + 1) % 20
-        if 0 <= active_line_idx < len(self.line_ids):
-            line_id = self.line_ids[active_line_idx]
-            self.canvas.itemconfig(line_id, dash=(8, 4), dashoffset=self.dash_offset, fill=self.colors["accent"], width=4)
-        self.root.after(50, lambda: self.presenter.trigger_animation())
+        for edge in active_lines:
+            line_id = self.line_ids.get(edge)
+            if line_id:
+                self.canvas.itemconfig(line_id, dash=(8, 4), dashoffset=self.dash_offset, fill=self.colors["accent"], width=4)
+        self.animation_after_id = self.root.after(50, self._next_animation_step)
+
+    def _next_animation_step(self):
+        self.animation_after_id = None
+        self.presenter.trigger_animation()
 
     def show_tooltip(self, event, text=None):
         """顯示 Tooltip"""
@@ -412,29 +693,127 @@ class WorkflowView:
             self.hover_tooltip.wm_geometry(f"+{x}+{y}")
             tk.Label(self.hover_tooltip, text=text, bg=self.colors["text"], fg="#FFFFFF", padx=12, pady=8, font=('Microsoft JhengHei', 14)).pack()
 
+    def draw_timeline(self, rows, span):
+        """
+        繪製時間軸 (Gantt)。
+
+        rows 為 [(標籤, 開始秒數, 結束秒數, 狀態)]，秒數相對於實例開始執行的時間；
+        span 為橫軸涵蓋的秒數。長條顏色與節點狀態相同。
+        """
+        self.timeline_data = (rows, span)
+        c = self.timeline
+        c.delete("all")
+        width = max(c.winfo_width(), TIMELINE_WIDTH)
+        if not rows:
+            c.create_text(width / 2, 30, text="Start a run to see its timeline", fill="#999999", font=('Microsoft JhengHei', 12))
+            c.config(scrollregion=(0, 0, width, 1))
+            return
+
+        left, right, top = TIMELINE_LABEL_W, width - 15, 30
+        scale = (right - left) / max(span, 0.001)
+        c.create_text(left, 12, text="0s", anchor="w", fill=self.colors["text"], font=('Microsoft JhengHei', 10))
+        c.create_text(right, 12, text=f"{span:.1f}s", anchor="e", fill=self.colors["text"], font=('Microsoft JhengHei', 10))
+        for row, (label, start, end, state) in enumerate(rows):
+            y = top + row * TIMELINE_ROW_H
+            c.create_text(left - 8, y + TIMELINE_ROW_H / 2, text=label, anchor="e", fill=self.colors["text"], font=('Microsoft JhengHei', 10))
+            x1 = left + start * scale
+            x2 = max(x1 + 2, left + end * scale) # 極短的步驟仍畫出可見的寬度
+            bg_color = self.status_colors.get(state, self.status_colors["pending"])[0]
+            c.create_rectangle(x1, y + 4, x2, y + TIMELINE_ROW_H - 4, fill=bg_color, outline=self.colors["accent"])
+        c.config(scrollregion=(0, 0, width, top + len(rows) * TIMELINE_ROW_H + 10))
+
     def write_log(self, message):
-        """更新 Log 的方法"""
-        self.log_area.config(state="normal")
-        self.log_area.insert(tk.END, message)
-        self.log_area.see(tk.END) # 自動捲動到底部
-        self.log_area.config(state="disabled")
+        """更新 Log 的方法 (寫入緩衝區後只重繪可見範圍)"""
+        self.presenter.model.log_buffer.append(message)
+        self.render_log()
 
     def clear_log(self):
         """清空 Log 區域"""
+        self.presenter.model.log_buffer.clear()
+        self.log_top_seq = 0
+        self.log_follow = True
+        self.render_log()
+
+    def _log_visible_rows(self):
+        height = self.log_area.winfo_height() - 2 * int(self.log_area.cget("pady"))
+        return max(1, height // self.log_font.metrics("linespace"))
+
+    def render_log(self):
+        """只把可見的幾行放進 Text，成本與累積的輸出量無關"""
+        buffer = self.presenter.model.log_buffer
+        rows = self._log_visible_rows()
+        total = len(buffer)
+        max_top = max(0, total - rows)
+        if self.log_follow:
+            top = max_top
+        else:
+            top = min(max(0, self.log_top_seq - buffer.first_seq), max_top)
+        self.log_top_seq = buffer.first_seq + top
+
+        lines = buffer.get_range(top, rows)
         self.log_area.config(state="normal")
         self.log_area.delete(1.0, tk.END)
+        self.log_area.insert(tk.END, "\n".join(lines))
+        if self.log_follow:
+            self.log_area.see(tk.END) # 自動捲動到底部 (長行換行時仍看得到最後一行)
         self.log_area.config(state="disabled")
 
-    def toggle_combobox_state(self, enabled):
-        """切換下拉選單狀態 (避免執行時被修改)"""
-        state = "readonly" if enabled else "disabled"
-        self.combo.config(state=state)
+        if total:
+            self.log_scrollbar.set(top / total, (top + len(lines)) / total)
+        else:
+            self.log_scrollbar.set(0, 1)
+
+    def _scroll_log_to(self, top):
+        buffer = self.presenter.model.log_buffer
+        max_top = max(0, len(buffer) - self._log_visible_rows())
+        top = min(max(0, top), max_top)
+        self.log_follow = top >= max_top
+        self.log_top_seq = buffer.first_seq + top
+        self.render_log()
+
+    def _on_log_scroll(self, *args):
+        """捲軸拖拉 / 點擊：向緩衝區取出對應位置的行"""
+        buffer = self.presenter.model.log_buffer
+        top = self.log_top_seq - buffer.first_seq
+        if args[0] == "moveto":
+            top = int(float(args[1]) * len(buffer))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self._log_visible_rows()
+            top += amount
+        self._scroll_log_to(top)
+
+    def _on_log_wheel(self, event):
+        buffer = self.presenter.model.log_buffer
+        top = self.log_top_seq - buffer.first_seq
+        self._scroll_log_to(top + (-3 if event.delta > 0 else 3))
+        return "break" # 避免 Text 自行捲動
+
+    def show_log(self):
+        """日誌來源切換後 (例如切換實例) 從最新一行重新顯示"""
+        self.log_follow = True
+        self.render_log()
+
+    def set_instances(self, titles, selected):
+        """更新實例清單；selected 為目前顯示的實例在清單中的位置 (None 代表編輯畫面)"""
+        self.instance_list.delete(0, tk.END)
+        for title in titles:
+            self.instance_list.insert(tk.END, title)
+        if selected is not None:
+            self.instance_list.selection_set(selected)
+            self.instance_list.see(selected)
+
+    def _on_instance_selected(self):
+        sel = self.instance_list.curselection()
+        if sel:
+            self.presenter.handle_instance_select(sel[0])
 
     def start_welcome_animation(self):
         """開始歡迎畫面動畫"""
         self.stop_welcome_animation() # 確保先停止舊的
         self.is_welcome_mode = True
-        self.canvas.delete("all")
+        self._clear_scene()
         self.canvas.config(scrollregion=(0,0,1,1)) # 鎖定捲動
 
         # 初始繪製 (位置稍後由 OnResize 修正)
@@ -451,13 +830,14 @@ class WorkflowView:
         )
 
         # 綁定大小改變事件以即時置中
-        self.welcome_resize_bind = self.canvas.bind("<Configure>", self._on_welcome_resize)
+        self.welcome_resize_bind = self.canvas.bind("<Configure>", self._on_welcome_resize, add="+")
         
         self.welcome_step = 0
         self._animate_welcome_step()
 
     def stop_welcome_animation(self):
         """停止歡迎畫面動畫"""
+        was_welcome = self.is_welcome_mode
         self.is_welcome_mode = False
         if hasattr(self, 'welcome_anim_id') and self.welcome_anim_id:
             self.root.after_cancel(self.welcome_anim_id)
@@ -466,8 +846,12 @@ class WorkflowView:
         if hasattr(self, 'welcome_resize_bind'):
             self.canvas.unbind("<Configure>", self.welcome_resize_bind)
             del self.welcome_resize_bind
+            # unbind 會一併移除其他 <Configure> 綁定，需重新綁定可視範圍更新
+            self.canvas.bind("<Configure>", lambda e: self._schedule_viewport_sync())
 
-        self.canvas.delete("all")
+        # 只有歡迎畫面需要清除，流程圖的保留式場景不受影響
+        if was_welcome:
+            self._clear_scene()
 
     def _on_welcome_resize(self, event):
         """當畫布大小改變時，重新置中歡迎畫面元素"""
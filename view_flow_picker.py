@@ -0,0 +1,169 @@
+import tkinter as tk
+from tkinter import ttk
+from flow_search import FlowSearchIndex
+
+MAX_RESULTS = 50 # 下拉清單最多列出幾個符合的流程
+POPUP_ROWS = 12
+
+
+class FlowPicker(ttk.Frame):
+    """
+    可輸入搜尋的流程選單 (取代唯讀下拉選單)。
+
+    輸入時即時列出 key、標題或描述含有輸入文字的流程 (見 FlowSearchIndex)，
+    只建立前 MAX_RESULTS 筆的清單項目；上下鍵移動、Enter 選取、Esc 取消。
+    選取後呼叫 on_select(key)。
+    """
+
+    def __init__(self, parent, on_select, colors, font, justify="left", width=None):
+        super().__init__(parent)
+        self.on_select = on_select
+        self.colors = colors
+        self.font = font
+        self.index = FlowSearchIndex()
+        self.selected = "" # 目前選取的流程 key
+        self.results = [] # 清單中各列對應的 key
+        self.popup = None
+        self.listbox = None
+        self.lbl_more = None
+        self.close_after_id = None
+
+        self.var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.var, font=font, justify=justify, width=width)
+        self.entry.pack(fill="x")
+        self.entry.bind("<KeyRelease>", self._on_key)
+        self.entry.bind("<Down>", lambda e: self._move(1))
+        self.entry.bind("<Up>", lambda e: self._move(-1))
+        self.entry.bind("<Return>", lambda e: self._choose())
+        self.entry.bind("<Escape>", lambda e: self._cancel())
+        self.entry.bind("<FocusIn>", self._on_focus_in)
+        self.entry.bind("<FocusOut>", lambda e: self._schedule_close())
+        self.entry.bind("<Button-1>", lambda e: self._show_results())
+
+    def set_flows(self, flow_index):
+        """更新可選的流程 ({key: 摘要})，只重新索引有變動的流程"""
+        self.index.update(flow_index)
+        if self.selected and self.selected not in self.index.positions:
+            self.set("")
+        if self.popup is not None:
+            self._show_results()
+
+    def get(self):
+        return self.selected
+
+    def set(self, key):
+        self.selected = key
+        self.var.set(key)
+
+    def _title(self, key):
+        title = self.index.summaries[key].get("title", "")
+        return f"{key}  —  {title}" if title and title != key else key
+
+    def _on_focus_in(self, event):
+        self.entry.select_range(0, tk.END)
+        self._show_results()
+
+    def _on_key(self, event):
+        if event.keysym in ("Up", "Down", "Return", "KP_Enter", "Escape", "Tab"):
+            return
+        self._show_results()
+
+    def _show_results(self):
+        """依輸入文字列出符合的流程 (輸入與目前選取的相同時列出全部的開頭)"""
+        query = self.var.get()
+        if query == self.selected:
+            query = ""
+        self.results, total = self.index.search(query, MAX_RESULTS)
+        self._open_popup()
+        self.listbox.delete(0, tk.END)
+        for key in self.results:
+            self.listbox.insert(tk.END, self._title(key))
+        self.listbox.configure(height=max(1, min(POPUP_ROWS, len(self.results))))
+        if self.results:
+            self.listbox.selection_set(0)
+        if total > len(self.results):
+            self.lbl_more.config(text=f"{len(self.results)} of {total} flows, keep typing to narrow down")
+            self.lbl_more.pack(fill="x")
+        elif not self.results:
+            self.lbl_more.config(text="No matching flow")
+            self.lbl_more.pack(fill="x")
+        else:
+            self.lbl_more.pack_forget()
+        self._place_popup()
+
+    def _open_popup(self):
+        if self.popup is not None:
+            return
+        self.popup = tk.Toplevel(self)
+        self.popup.overrideredirect(True)
+        self.popup.transient(self.winfo_toplevel())
+        frame = tk.Frame(self.popup, bg=self.colors["line"], bd=1)
+        frame.pack(fill="both", expand=True)
+        self.listbox = tk.Listbox(frame, font=self.font, activestyle="none", exportselection=False, takefocus=0,
+                                  bg=self.colors["bg"], fg=self.colors["text"], selectbackground=self.colors["accent"],
+                                  highlightthickness=0, bd=0)
+        self.listbox.pack(fill="both", expand=True)
+        self.listbox.bind("<ButtonPress-1>", lambda e: self._keep_open())
+        self.listbox.bind("<ButtonRelease-1>", self._on_click)
+        self.lbl_more = tk.Label(frame, font=('Microsoft JhengHei', 10), bg=self.colors["bg"], fg=self.colors["text"], anchor="w")
+
+    def _place_popup(self):
+        self.update_idletasks()
+        x = self.entry.winfo_rootx()
+        y = self.entry.winfo_rooty() + self.entry.winfo_height()
+        self.popup.geometry(f"{max(self.entry.winfo_width(), 300)}x{self.popup.winfo_reqheight()}+{x}+{y}")
+        self.popup.lift()
+
+    def _close_popup(self):
+        self._keep_open()
+        if self.popup is not None:
+            self.popup.destroy()
+            self.popup = self.listbox = self.lbl_more = None
+
+    def _schedule_close(self):
+        # 離開輸入框時延後關閉，讓點選清單的事件先處理；未選取時恢復原本的流程
+        if self.close_after_id is None:
+            self.close_after_id = self.after(150, self._cancel)
+
+    def _keep_open(self):
+        # 點選清單時輸入框可能失去焦點，取消排定的關閉
+        if self.close_after_id is not None:
+            self.after_cancel(self.close_after_id)
+            self.close_after_id = None
+
+    def _move(self, delta):
+        if self.popup is None:
+            self._show_results()
+            return "break"
+        if not self.results:
+            return "break"
+        sel = self.listbox.curselection()
+        idx = min(max((sel[0] if sel else -1) + delta, 0), len(self.results) - 1)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(idx)
+        self.listbox.see(idx)
+        return "break"
+
+    def _on_click(self, event):
+        if self.results:
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(self.listbox.nearest(event.y))
+            self._choose()
+
+    def _choose(self):
+        sel = self.listbox.curselection() if self.popup is not None else ()
+        if not sel:
+            return "break"
+        key = self.results[sel[0]]
+        self._close_popup()
+        self.set(key)
+        self.entry.icursor(tk.END)
+        self.on_select(key)
+        return "break"
+
+    def _cancel(self):
+        """Esc 或離開輸入框：關閉清單並恢復目前選取的流程"""
+        self.close_after_id = None
+        self._close_popup()
+        self.var.set(self.selected)
+        return "break"
@@ -0,0 +1,126 @@
+import tkinter as tk
+from tkinter import ttk
+
+PAGE_LINES = 500 # 每頁顯示行數
+
+class LogArchiveView(tk.Toplevel):
+    def __init__(self, parent, archive, colors):
+        super().__init__(parent)
+        self.title("Run History")
+        self.geometry("1200x800")
+        self.colors = colors
+        self.archive = archive
+
+        self.runs = []
+        self.steps = []
+        self.reader = None
+        self.run_id = None # 目前瀏覽的執行 (離開時刪除它的解壓快取)
+        self.page_start = 0
+
+        self._setup_ui()
+        self._load_runs()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # 讓視窗置中即頂層
+        self.transient(parent)
+
+    def _setup_ui(self):
+        self.configure(bg=self.colors["bg"])
+
+        frame = ttk.Frame(self, padding=20)
+        frame.pack(fill="both", expand=True)
+        frame.columnconfigure(2, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        ttk.Label(frame, text="Runs", font=('Microsoft JhengHei', 14, 'bold')).grid(row=0, column=0, sticky="w")
+        ttk.Label(frame, text="Steps", font=('Microsoft JhengHei', 14, 'bold')).grid(row=0, column=1, sticky="w")
+
+        self.runs_listbox = tk.Listbox(frame, width=36, font=('Microsoft JhengHei', 12), exportselection=False)
+        self.runs_listbox.grid(row=1, column=0, sticky="ns", padx=(0, 10))
+        self.runs_listbox.bind("<<ListboxSelect>>", self._on_run_selected)
+
+        self.steps_listbox = tk.Listbox(frame, width=28, font=('Microsoft JhengHei', 12), exportselection=False)
+        self.steps_listbox.grid(row=1, column=1, sticky="ns", padx=(0, 10))
+        self.steps_listbox.bind("<<ListboxSelect>>", self._on_step_selected)
+
+        self.text_area = tk.Text(
+            frame,
+            font=('Microsoft JhengHei', 12),
+            bg=self.colors["bg"],
+            fg=self.colors["text"],
+            padx=10,
+            pady=10,
+            wrap="none",
+            borderwidth=1,
+            relief="solid"
+        )
+        self.text_area.grid(row=1, column=2, sticky="nsew")
+        self.text_area.config(state="disabled")
+
+        # 分頁控制
+        nav = ttk.Frame(frame)
+        nav.grid(row=2, column=2, sticky="e", pady=(10, 0))
+        ttk.Button(nav, text="◀ Prev", command=lambda: self._show_page(self.page_start - PAGE_LINES), style='small_Button.TButton').pack(side="left", padx=2)
+        self.lbl_page = ttk.Label(nav, text="", font=('Microsoft JhengHei', 12))
+        self.lbl_page.pack(side="left", padx=10)
+        ttk.Button(nav, text="Next ▶", command=lambda: self._show_page(self.page_start + PAGE_LINES), style='small_Button.TButton').pack(side="left", padx=2)
+        ttk.Button(nav, text="⏭ Last", command=lambda: self._show_page(self._last_page_start()), style='small_Button.TButton').pack(side="left", padx=2)
+
+    def _load_runs(self):
+        self.runs = self.archive.list_runs()
+        self.runs_listbox.delete(0, tk.END)
+        for run in self.runs:
+            self.runs_listbox.insert(tk.END, f"{run['started']}  {run['flow']}  [{run['status']}]")
+
+    def _on_run_selected(self, event):
+        sel = self.runs_listbox.curselection()
+        if not sel: return
+        run = self.runs[sel[0]]
+        self._release_run()
+        self.run_id = run["run_id"]
+        self.steps = self.archive.list_steps(run["run_id"])
+        names = run.get("steps", [])
+        self.steps_listbox.delete(0, tk.END)
+        for idx, _ in self.steps:
+            name = names[idx]["name"] if idx < len(names) else ""
+            self.steps_listbox.insert(tk.END, f"{idx+1}. {name}")
+        self.reader = None
+        self._set_text("")
+
+    def _on_step_selected(self, event):
+        run_sel = self.runs_listbox.curselection()
+        sel = self.steps_listbox.curselection()
+        if not run_sel or not sel: return
+        run_id = self.runs[run_sel[0]]["run_id"]
+        self.reader = self.archive.open_step(run_id, self.steps[sel[0]][1])
+        self._show_page(0)
+
+    def _release_run(self):
+        if self.run_id:
+            self.reader = None
+            self.archive.release_run(self.run_id)
+            self.run_id = None
+
+    def _on_close(self):
+        self._release_run()
+        self.destroy()
+
+    def _last_page_start(self):
+        if not self.reader: return 0
+        return max(0, (self.reader.total_lines - 1) // PAGE_LINES * PAGE_LINES)
+
+    def _show_page(self, start):
+        if not self.reader: return
+        self.reader.reload() # 執行中的步驟可能仍在寫入
+        self.page_start = min(max(0, start), self._last_page_start())
+        lines = self.reader.read_lines(self.page_start, PAGE_LINES)
+        self._set_text("\n".join(lines))
+        total = self.reader.total_lines
+        end = self.page_start + len(lines)
+        self.lbl_page.config(text=f"{self.page_start + 1 if lines else 0}-{end} / {total}")
+
+    def _set_text(self, text):
+        self.text_area.config(state="normal")
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert(tk.END, text)
+        self.text_area.config(state="disabled")
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import shutil
 from setting import SettingsManager
+from config_loader import flow_summary
+from view_flow_picker import FlowPicker
 from resource_helper import get_resource_path
 import os
 
@@ -18,7 +20,10 @@ class SettingsView(tk.Toplevel):
         
         # 暫存資料
         self.global_config = self.manager.load_global_config()
-        self.flow_config = self.manager.load_flow_config()
+        self.flow_index = self.manager.load_flow_index() # 流程 key -> 摘要 (依顯示順序)
+        self.flow_config = {} # 已開啟過的流程內容 (選取時才讀取)
+        self.dirty_flows = set() # 有修改、尚未儲存的流程
+        self.deleted_flows = set()
         
         self.current_flow_key = None
         self.current_steps = []
@@ -96,8 +101,12 @@ class SettingsView(tk.Toplevel):
         self.manual_editor.insert(tk.END, self.global_config.get("manual", ""))
         
         # 儲存按鈕
-        btn_save = ttk.Button(frame, text="💾 Save", command=self._save_global, style='big_Button.TButton')
-        btn_save.pack(anchor="e")
+        btn_frame = ttk.Frame(frame, style="Setting.TFrame")
+        btn_frame.pack(fill="x")
+        btn_save = ttk.Button(btn_frame, text="💾 Save", command=self._save_global, style='big_Button.TButton')
+        btn_save.pack(side="right")
+        btn_clear_cache = ttk.Button(btn_frame, text="🗑 Clear Step Cache", command=lambda: self._clear_cache(None), style='small_Button.TButton')
+        btn_clear_cache.pack(side="left")
 
     def _browse_python_path(self):
         path = filedialog.askopenfilename(title="Browse python.exe", filetypes=[("Executable", "*.exe"), ("All Files", "*.*")])
@@ -113,6 +122,16 @@ class SettingsView(tk.Toplevel):
         else:
             messagebox.showerror("Error", "Failed to save settings")
 
+    def _clear_cache(self, flow_key):
+        target = f"flow '{flow_key}'" if flow_key else "all flows"
+        if not messagebox.askyesno("Confirmation", f"Clear cached step results of {target}?"):
+            return
+        try:
+            removed = self.manager.clear_step_cache(flow_key)
+            messagebox.showinfo("Success", f"{removed} cached result(s) removed")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to clear cache:\n{e}")
+
     # --- 流程管理 UI 與邏輯 ---
 
     def _setup_flow_tab(self):
@@ -125,12 +144,12 @@ class SettingsView(tk.Toplevel):
         
         ttk.Label(top_bar, text="Select Flow:", style="Setting.TLabel").pack(side="left", padx=(0, 10))
         
-        self.combo_flows = ttk.Combobox(top_bar, state="readonly", font=('Microsoft JhengHei', 14), width=30)
-        self.combo_flows.pack(side="left", padx=(0, 10))
-        self.combo_flows.bind("<<ComboboxSelected>>", self._on_flow_selected)
+        self.flow_picker = FlowPicker(top_bar, lambda key: self._on_flow_selected(None), self.colors, font=('Microsoft JhengHei', 14), width=30)
+        self.flow_picker.pack(side="left", padx=(0, 10))
         
         ttk.Button(top_bar, text="➕ Add Flow", command=self._add_new_flow, style='small_Button.TButton').pack(side="left", padx=5)
         ttk.Button(top_bar, text="➖ Delete Flow", command=self._delete_current_flow, style='small_Button.TButton').pack(side="left", padx=5)
+        ttk.Button(top_bar, text="🗑 Clear Flow Cache", command=lambda: self.current_flow_key and self._clear_cache(self.current_flow_key), style='small_Button.TButton').pack(side="left", padx=5)
         
         # 流程詳細設定區域
         self.flow_detail_frame = ttk.Frame(main_layout, style="Setting.TFrame")
@@ -199,14 +218,13 @@ class SettingsView(tk.Toplevel):
         self._refresh_flow_list()
         
     def _refresh_flow_list(self):
-        flows = list(self.flow_config.keys())
-        self.combo_flows['values'] = flows
+        self.flow_picker.set_flows(self.flow_index)
         
-        if self.current_flow_key and self.current_flow_key in flows:
-            self.combo_flows.set(self.current_flow_key)
+        if self.current_flow_key and self.current_flow_key in self.flow_index:
+            self.flow_picker.set(self.current_flow_key)
             self._on_flow_selected(None)
         else:
-            self.combo_flows.set('')
+            self.flow_picker.set('')
             self.current_flow_key = None
             self._clear_flow_editor()
 
@@ -222,12 +240,14 @@ class SettingsView(tk.Toplevel):
             self.is_loading = False
     
     def _on_flow_selected(self, event):
-        key = self.combo_flows.get()
+        key = self.flow_picker.get()
         if not key: return
         
         self.is_loading = True
         try:
             self.current_flow_key = key
+            if key not in self.flow_config:
+                self.flow_config[key] = self.manager.load_flow(key) or {"title": "", "description": "", "steps": []}
             data = self.flow_config[key]
             
             self.var_flow_title.set(data.get("title", ""))
@@ -276,12 +296,15 @@ class SettingsView(tk.Toplevel):
         self.steps_listbox.selection_set(idx)
         # 同步回 current_steps 資料
         self.current_steps[idx]["name"] = new_name
+        self.dirty_flows.add(self.current_flow_key)
 
     def _sync_flow_data(self, *args):
         """即時同步流程標題與描述"""
         if self.is_loading or not self.current_flow_key: return
         self.flow_config[self.current_flow_key]["title"] = self.var_flow_title.get()
         self.flow_config[self.current_flow_key]["description"] = self.var_flow_desc.get()
+        self.flow_index[self.current_flow_key] = flow_summary(self.flow_config[self.current_flow_key])
+        self.dirty_flows.add(self.current_flow_key)
 
     def _sync_step_data(self, *args):
         """即時同步步驟詳細資料"""
@@ -292,12 +315,13 @@ class SettingsView(tk.Toplevel):
         if idx < len(self.current_steps):
             self.current_steps[idx]["module"] = self.var_step_module.get()
             self.current_steps[idx]["overview"] = self.var_step_overview.get()
+            self.dirty_flows.add(self.current_flow_key)
 
     def _add_new_flow(self):
         # 簡單輸入框索取 Key
         key = tk.simpledialog.askstring("Add New Flow", "Please enter the unique identifier (Key) for the new flow:")
         if key:
-            if key in self.flow_config:
+            if key in self.flow_index:
                 messagebox.showerror("Error", "The key already exists")
                 return
             self.flow_config[key] = {
@@ -305,17 +329,25 @@ class SettingsView(tk.Toplevel):
                 "description": "",
                 "steps": []
             }
+            self.flow_index[key] = flow_summary(self.flow_config[key])
+            self.dirty_flows.add(key)
+            self.deleted_flows.discard(key)
             self.current_flow_key = key
             self._refresh_flow_list()
 
     def _delete_current_flow(self):
         if not self.current_flow_key: return
         if messagebox.askyesno("Confirmation", f"Are you sure you want to delete flow '{self.current_flow_key}'?"):
-            del self.flow_config[self.current_flow_key]
+            key = self.current_flow_key
+            del self.flow_index[key]
+            self.flow_config.pop(key, None)
+            self.dirty_flows.discard(key)
+            self.deleted_flows.add(key)
             self.current_flow_key = None
             self._refresh_flow_list()
 
     def _add_step(self):
+        if self.current_flow_key: self.dirty_flows.add(self.current_flow_key)
         self.current_steps.append({
             "name": "New Step",
             "module": "",
@@ -337,6 +369,7 @@ class SettingsView(tk.Toplevel):
         if not sel: return
         idx = sel[0]
         del self.current_steps[idx]
+        self.dirty_flows.add(self.current_flow_key)
         self._refresh_steps_listbox()
         self._clear_step_editor()
 
@@ -376,7 +409,12 @@ class SettingsView(tk.Toplevel):
         self.flow_config[self.current_flow_key]["description"] = self.var_flow_desc.get()
         self.flow_config[self.current_flow_key]["steps"] = self.current_steps
         
-        if self.manager.save_flow_config(self.flow_config):
+        # 只寫入有修改的流程 (各自一個檔案) 與刪除的流程
+        self.dirty_flows.add(self.current_flow_key)
+        dirty = {key: self.flow_config[key] for key in self.dirty_flows if key in self.flow_config}
+        if self.manager.save_flows(dirty, self.deleted_flows, list(self.flow_index)):
+            self.dirty_flows.clear()
+            self.deleted_flows.clear()
             messagebox.showinfo("Success", "Flow settings saved successfully")
         else:
-            messagebox.showerror("Error", "Failed to save settings")
+            messagebox.showerror("Error", f"Failed to save settings:\n{self.manager.last_error}")
@@ -0,0 +1,299 @@
+"""
+遠端 worker agent：在其他電腦上執行流程步驟 (只使用標準函式庫)。
+
+    python worker_agent.py --port 7701 --name build1 --tags gpu,linux --slots 4
+
+共用密鑰由 --secret-file 或環境變數 WORKFLOW_AGENT_SECRET 提供，必須與引擎端相同。
+部署時把本程式目錄 (至少 worker_agent.py、task_launcher.py、task_worker.py、workflow_task.py) 複製到該電腦。
+
+協定 (TCP，每行一個 JSON 訊息，每個步驟一條連線)：
+1. agent -> {"agent", "version", "nonce", "tags", "slots"}
+   引擎 -> {"auth": HMAC(密鑰, "client" + agent nonce + 引擎 nonce), "nonce"}
+   agent -> {"ok": true, "auth": HMAC(密鑰, "agent" + 引擎 nonce + agent nonce)}，雙方都確認對方知道密鑰
+2. 引擎 -> {"op": "run", "script": 檔名, "sha256", "args", "env", "events"}
+   agent 沒有空閒的 slot 時立即回 {"op": "busy"} 並斷線 (不排隊，由引擎改用其他 agent 或稍後再試)；
+   沒有這個雜湊的腳本時回 {"op": "need_script"}，引擎送 {"op": "script", "data": base64}
+3. agent -> {"op": "started"}，之後 {"op": "out", "line"} / {"op": "event", "event"}，最後 {"op": "exit", "code", "usage"}
+   執行期間引擎可送 {"op": "kill"}；連線中斷時 agent 強制結束該步驟的整個進程樹
+
+腳本依內容雜湊快取在 <work-dir>/scripts/，內容不變時不會重送；步驟以 <work-dir> 為工作目錄執行。
+連線沒有加密，只在可信任的網路上使用 (或經由 SSH 通道)。
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+
+from task_launcher import ProcessTask
+
+PROTOCOL_VERSION = 1
+SECRET_ENV = "WORKFLOW_AGENT_SECRET"
+MAX_MESSAGE = 64 * 1024 * 1024 # 單一訊息 (含 base64 的腳本) 的長度上限
+HANDSHAKE_TIMEOUT_S = 10
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def sign(secret, *parts):
+    return hmac.new(secret, "".join(parts).encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def load_secret(path=None):
+    """共用密鑰：檔案內容 (去除前後空白) 或環境變數 WORKFLOW_AGENT_SECRET；沒有設定時回傳 None"""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            secret = f.read().strip()
+    else:
+        secret = os.environ.get(SECRET_ENV, "").strip()
+    return secret.encode("utf-8") if secret else None
+
+
+class Channel:
+    """以換行分隔的 JSON 訊息通道 (兩端共用)；send 可從多個執行緒呼叫"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile("rb")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def encode(message):
+        return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def send(self, message):
+        data = self.encode(message)
+        with self.lock:
+            self.sock.sendall(data)
+
+    def receive(self):
+        """下一個訊息；連線關閉時回傳 None"""
+        line = self.rfile.readline(MAX_MESSAGE + 1)
+        if not line:
+            return None
+        if len(line) > MAX_MESSAGE:
+            raise ValueError("message too large")
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.rfile.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def _connected(sock):
+    """引擎是否仍然連線 (不阻塞地檢查對方是否已關閉連線)"""
+    sock.setblocking(False)
+    try:
+        return sock.recv(1, socket.MSG_PEEK) != b""
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.setblocking(True)
+
+
+class _EventRelay:
+    """
+    轉送步驟的事件 (workflow_task.progress 等) 給引擎：
+    在 agent 本機開一個事件埠給任務連線，收到的每行事件包成 {"op": "event"} 送回引擎。
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.token = secrets.token_hex(16)
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(4)
+        self.env = {"WORKFLOW_EVENTS": f"127.0.0.1:{self.listener.getsockname()[1]}", "WORKFLOW_EVENT_TOKEN": self.token}
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._forward, args=(sock,), daemon=True).start()
+
+    def _forward(self, sock):
+        with sock, sock.makefile("rb") as f:
+            if f.readline().strip().decode("ascii", "replace") != self.token:
+                return
+            for line in f:
+                try:
+                    self.channel.send({"op": "event", "event": json.loads(line)})
+                except (ValueError, OSError):
+                    continue
+
+    def close(self):
+        self.listener.close()
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        agent = self.server.agent
+        channel = Channel(self.request)
+        try:
+            self.request.settimeout(HANDSHAKE_TIMEOUT_S)
+            if not agent.authenticate(channel):
+                return
+            request = channel.receive()
+            if not request or request.get("op") != "run":
+                return
+            if not agent.slot_sem.acquire(blocking=False):
+                # 例如與其他引擎共用、或引擎設定的 slots 比實際多：立即回覆，不讓引擎等待
+                channel.send({"op": "busy", "slots": agent.slots})
+                return
+            try:
+                script = agent.fetch_script(channel, request)
+                self.request.settimeout(None)
+                agent.run(channel, script, request)
+            finally:
+                agent.slot_sem.release()
+        except (OSError, ValueError) as e:
+            agent.log(f"{self.client_address[0]}: {e}")
+        finally:
+            channel.close()
+
+
+class WorkerAgent:
+    def __init__(self, name, secret, tags=(), slots=4, python_bin=sys.executable, work_dir="agent_work"):
+        self.name = name
+        self.secret = secret
+        self.tags = list(tags)
+        self.slots = slots
+        self.slot_sem = threading.BoundedSemaphore(slots)
+        self.python_bin = python_bin
+        self.work_dir = os.path.abspath(work_dir)
+        self.script_dir = os.path.join(self.work_dir, "scripts")
+        self.script_lock = threading.Lock()
+        os.makedirs(self.script_dir, exist_ok=True)
+
+    def log(self, message):
+        print(f"[{self.name}] {message}", flush=True)
+
+    def authenticate(self, channel):
+        nonce = secrets.token_hex(16)
+        channel.send({"agent": self.name, "version": PROTOCOL_VERSION, "nonce": nonce, "tags": self.tags, "slots": self.slots})
+        reply = channel.receive()
+        client_nonce = str((reply or {}).get("nonce", ""))
+        if not reply or not client_nonce or not hmac.compare_digest(str(reply.get("auth", "")), sign(self.secret, "client", nonce, client_nonce)):
+            channel.send({"ok": False, "error": "authentication failed"})
+            self.log("rejected a connection: authentication failed")
+            return False
+        channel.send({"ok": True, "auth": sign(self.secret, "agent", client_nonce, nonce)})
+        return True
+
+    def fetch_script(self, channel, request):
+        """依雜湊取得快取的腳本，沒有時向引擎索取；回傳腳本路徑"""
+        sha = str(request.get("sha256", ""))
+        if len(sha) != 64 or any(c not in "0123456789abcdef" for c in sha):
+            raise ValueError("invalid script hash")
+        name = os.path.basename(str(request.get("script", "task.py"))) or "task.py"
+        path = os.path.join(self.script_dir, sha[:16], name)
+        if not os.path.exists(path):
+            channel.send({"op": "need_script"})
+            message = channel.receive()
+            if not message or message.get("op") != "script":
+                raise ValueError("expected the script")
+            data = base64.b64decode(message["data"])
+            if hashlib.sha256(data).hexdigest() != sha:
+                raise ValueError("script does not match its hash")
+            with self.script_lock:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        return path
+
+    def run(self, channel, script, request):
+        """執行步驟 (呼叫端已取得 slot)"""
+        if not _connected(channel.sock):
+            self.log(f"engine disconnected before {os.path.basename(script)} started")
+            return
+        env = {key: str(value) for key, value in (request.get("env") or {}).items()}
+        # 引擎端的路徑在這台電腦上無效：workflow_task 由 agent 的程式目錄提供
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")]))
+        relay = _EventRelay(channel) if request.get("events") else None
+        if relay:
+            env.update(relay.env)
+        task = ProcessTask(self.python_bin, script, [str(arg) for arg in request.get("args", [])], env)
+        self.log(f"started {os.path.basename(script)} (pid {task.process.pid})")
+        channel.send({"op": "started", "pid": task.process.pid})
+        watcher = threading.Thread(target=self._watch_connection, args=(channel, task), daemon=True)
+        watcher.start()
+        code = None
+        try:
+            for line in task.lines():
+                channel.send({"op": "out", "line": line})
+        except OSError:
+            # 引擎斷線
+            task.kill_tree()
+        finally:
+            code = task.wait()
+            if relay:
+                relay.close()
+        self.log(f"finished {os.path.basename(script)} with exit code {code}")
+        channel.send({"op": "exit", "code": code, "usage": task.usage})
+
+    def _watch_connection(self, channel, task):
+        """執行期間讀取引擎的訊息：收到 kill 或連線中斷時結束整個進程樹"""
+        try:
+            while True:
+                message = channel.receive()
+                if message is None or message.get("op") == "kill":
+                    break
+        except (OSError, ValueError):
+            pass
+        if task.process.returncode is None:
+            task.kill_tree()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run workflow steps sent by a remote engine.")
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on (default: all interfaces)")
+    parser.add_argument("--port", type=int, default=7701)
+    parser.add_argument("--name", default=socket.gethostname(), help="agent name used in placement and logs")
+    parser.add_argument("--tags", default="", help="comma-separated tags for placement constraints, e.g. gpu,linux")
+    parser.add_argument("--slots", type=int, default=os.cpu_count() or 1, help="steps run at the same time")
+    parser.add_argument("--python", default=sys.executable, help="interpreter for the steps")
+    parser.add_argument("--work-dir", default="agent_work", help="working directory of the steps and the script cache")
+    parser.add_argument("--secret-file", help=f"file with the shared secret (default: ${SECRET_ENV})")
+    args = parser.parse_args(argv)
+
+    secret = load_secret(args.secret_file)
+    if not secret:
+        print(f"error: no shared secret (use --secret-file or set {SECRET_ENV})", file=sys.stderr)
+        return 2
+    tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+    agent = WorkerAgent(args.name, secret, tags, max(1, args.slots), args.python, args.work_dir)
+    os.chdir(agent.work_dir)
+    server = _Server((args.host, args.port), AgentHandler)
+    server.agent = agent
+    agent.log(f"listening on {args.host}:{server.server_address[1]} (tags: {', '.join(tags) or '-'}, slots: {agent.slots})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+任務腳本 (tasks/*.py) 使用的輔助函式。
+
+回報進度與統計 (經由事件通道送給引擎，與 stdout 日誌分開，見 task_events.py)：
+
+    import workflow_task
+
+    for n, table in enumerate(tables, 1):
+        rows = load(table)
+        workflow_task.count("rows", len(rows))
+        workflow_task.progress(n, len(tables), message=table)
+    workflow_task.metric("rows_per_s", total / elapsed)
+
+進度顯示在節點上的進度條，計數、指標與 artifact 記錄在該次執行的 run.json；
+不是由流程引擎執行時 (例如直接執行腳本) 這些函式不做任何事。
+
+map 步驟 (每個輸入項目執行一次腳本) 中取得目前的項目，以及由上游步驟提供項目清單：
+
+    table = workflow_task.current_item()             # 下游 map 步驟
+    workflow_task.publish_items("tables", names)     # 上游步驟，map 設定 "items_artifact": "tables"
+
+步驟間交換大型資料 (artifact)：
+
+    import workflow_task
+
+    # 上游步驟：已知大小時直接寫進映射的記憶體，不經過額外的緩衝區
+    with workflow_task.create_artifact("prices", n * 8) as buf:
+        numpy.frombuffer(buf, dtype="f8")[:] = values
+    # 或一次寫入現成的 bytes / memoryview
+    workflow_task.publish_artifact("header", header_bytes)
+
+    # 下游步驟：唯讀的記憶體映射，資料不複製
+    with workflow_task.open_artifact("prices") as buf:
+        values = numpy.frombuffer(buf, dtype="f8")
+
+artifact 是本次執行 artifact 目錄 (環境變數 WORKFLOW_ARTIFACTS) 中的檔案，
+寫完才改名成正式名稱，下游步驟不會讀到寫到一半的內容。執行結束後由引擎刪除。
+需要檔名的函式庫 (numpy.memmap、pyarrow 等) 可使用 artifact_path。
+"""
+import json
+import mmap
+import os
+import re
+import socket
+import time
+
+ARTIFACTS_ENV = "WORKFLOW_ARTIFACTS"
+EVENTS_ENV = "WORKFLOW_EVENTS"
+EVENT_TOKEN_ENV = "WORKFLOW_EVENT_TOKEN"
+PROGRESS_INTERVAL_S = 0.1 # 進度事件的最短間隔，迴圈中頻繁呼叫 progress 也不會塞滿通道
+_NAME = re.compile(r"[\w-][\w.-]*")
+
+_channel = None # (token, socket)；worker 執行器中模組跨任務保留，token 不同時重新連線
+_last_progress = 0.0
+
+
+def _connect():
+    global _channel
+    token = os.environ.get(EVENT_TOKEN_ENV)
+    address = os.environ.get(EVENTS_ENV)
+    if _channel is not None and _channel[0] == token:
+        return _channel[1]
+    if _channel is not None:
+        _channel[1].close()
+        _channel = None
+    if not token or not address:
+        return None
+    host, _, port = address.rpartition(":")
+    sock = socket.create_connection((host, int(port)), timeout=5)
+    sock.sendall(token.encode("ascii") + b"\n")
+    _channel = (token, sock)
+    return sock
+
+
+def emit(type, **fields):
+    """送出一筆事件 (fields 需可轉為 JSON)；引擎無法接收時靜默忽略，不影響任務本身"""
+    global _channel
+    try:
+        sock = _connect()
+        if sock is not None:
+            sock.sendall(json.dumps({"type": type, **fields}, ensure_ascii=False).encode("utf-8") + b"\n")
+    except OSError:
+        if _channel is not None:
+            _channel[1].close()
+            _channel = None
+
+
+def progress(done, total=None, message=None):
+    """
+    回報進度：progress(0.42) 或 progress(42, 100)；message 為顯示在節點提示的說明。
+    距離上一次送出不到 PROGRESS_INTERVAL_S 秒的呼叫會略過 (達到 100% 時一律送出)。
+    """
+    global _last_progress
+    value = done / total if total else done
+    now = time.monotonic()
+    if value < 1 and now - _last_progress < PROGRESS_INTERVAL_S:
+        return
+    _last_progress = now
+    emit("progress", value=value, **({"message": message} if message is not None else {}))
+
+
+def count(name, inc=1):
+    """累加計數器 (例如處理的列數)；每次呼叫送出一筆事件，迴圈中請批次累加"""
+    emit("counter", name=name, inc=inc)
+
+
+def metric(name, value):
+    """記錄指標的最新值 (例如吞吐量)"""
+    emit("metric", name=name, value=value)
+
+
+def current_item():
+    """map 步驟中目前的項目 (WORKFLOW_ITEM 的 JSON)；不是 map 步驟時回傳 None"""
+    value = os.environ.get("WORKFLOW_ITEM")
+    return json.loads(value) if value is not None else None
+
+
+def publish_items(name, items):
+    """以 JSON 清單發佈 artifact，作為下游 map 步驟的輸入 ("items_artifact": name)"""
+    publish_artifact(name, json.dumps(list(items), ensure_ascii=False).encode("utf-8"))
+
+
+def artifact_path(name):
+    """artifact 的檔案路徑 (不檢查是否存在)；不是由流程引擎執行時拋出 RuntimeError"""
+    directory = os.environ.get(ARTIFACTS_ENV)
+    if not directory:
+        raise RuntimeError(f"{ARTIFACTS_ENV} is not set; artifacts are only available to steps run by the workflow engine")
+    if not _NAME.fullmatch(name):
+        raise ValueError(f"Invalid artifact name '{name}' (use letters, digits, '_', '-' and '.')")
+    return os.path.join(directory, name)
+
+
+def artifact_names():
+    """本次執行目前已發佈的 artifact"""
+    directory = os.environ.get(ARTIFACTS_ENV)
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if not name.startswith("."))
+
+
+class _ArtifactWriter:
+    """create_artifact 的 context manager：正常離開時發佈，發生例外時丟棄"""
+
+    def __init__(self, name, size):
+        self.path = artifact_path(name)
+        self.tmp_path = os.path.join(os.path.dirname(self.path), f".{name}.{os.getpid()}.tmp")
+        self.size = size
+        self.file = None
+        self.buffer = None
+
+    def __enter__(self):
+        self.file = open(self.tmp_path, "w+b")
+        self.file.truncate(self.size)
+        # 長度 0 的檔案無法映射
+        self.buffer = mmap.mmap(self.file.fileno(), self.size) if self.size else bytearray()
+        return self.buffer
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.flush()
+            self.buffer.close()
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+            emit("artifact", name=os.path.basename(self.path), size=self.size)
+        else:
+            os.remove(self.tmp_path)
+        return False
+
+
+def create_artifact(name, size):
+    """
+    建立大小為 size 位元組的 artifact，回傳 context manager；with 區塊內取得可寫入的 mmap，
+    離開區塊時發佈 (同名的 artifact 會被取代)。
+    """
+    if size < 0:
+        raise ValueError("Artifact size must not be negative")
+    return _ArtifactWriter(name, size)
+
+
+def publish_artifact(name, data):
+    """以現成的 bytes-like 物件發佈 artifact"""
+    view = memoryview(data).cast("B")
+    with create_artifact(name, view.nbytes) as buf:
+        buf[:] = view
+
+
+def open_artifact(name):
+    """
+    開啟 artifact，回傳唯讀的 mmap (可用 with 關閉，或交給 memoryview / numpy.frombuffer)；
+    不存在時拋出 FileNotFoundError。
+    """
+    path = artifact_path(name)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _EmptyArtifact()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _EmptyArtifact(bytes):
+    """長度 0 的 artifact (無法映射)：與 mmap 一樣可用 with"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass